@@ -0,0 +1,69 @@
+"""
+Track cold-start import time of the computational core
+
+Runs each import in a fresh interpreter with `python -X importtime`, reports
+the cumulative time and checks that no UI/plotting stack was pulled in.
+
+Usage:
+    python benchmarks/import_time.py [--repeat 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module -> heavy packages it must not import eagerly
+TARGETS = {
+    'hemodynamic_analyzer': ['streamlit', 'pandas', 'numpy', 'plotly', 'matplotlib', 'fpdf', 'PIL'],
+    'hemodynamic_analyzer.exports': ['streamlit', 'plotly', 'matplotlib', 'fpdf', 'PIL'],
+    'hemodynamic_analyzer.charts': ['streamlit', 'plotly', 'matplotlib', 'PIL'],
+    'hemodynamic_analyzer.batch': ['streamlit', 'plotly', 'matplotlib', 'fpdf'],
+    'hemodynamic_analyzer.cohort': ['streamlit', 'plotly', 'matplotlib', 'fpdf', 'PIL'],
+    'hemodynamic_analyzer.stream': ['streamlit', 'pandas', 'plotly', 'matplotlib', 'fpdf', 'PIL'],
+    'hemodynamic_analyzer.service': ['streamlit', 'pandas', 'numpy', 'plotly', 'matplotlib', 'fpdf', 'PIL'],
+    'hemodynamic_analyzer.longitudinal': ['streamlit', 'pandas', 'numpy', 'plotly', 'matplotlib', 'fpdf', 'PIL'],
+    'hemodynamic_analyzer.trends': ['streamlit', 'pandas', 'plotly', 'matplotlib', 'fpdf', 'PIL'],
+    'hemodynamic_analyzer.archive': ['streamlit', 'plotly', 'matplotlib', 'fpdf', 'PIL'],
+    'hemodynamic_analyzer.bundle': ['streamlit', 'plotly', 'matplotlib', 'fpdf', 'PIL'],
+    'hemodynamic_analyzer.cli': ['streamlit', 'plotly', 'matplotlib', 'fpdf', 'PIL'],
+}
+
+def measure_import(module):
+    """Return (cumulative microseconds, set of top-level modules imported) for one cold import"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    total_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        imported.add(name.split('.')[0])
+        if name == module:
+            # The target's cumulative time includes everything it imported
+            total_us = int(cumulative)
+    return total_us, imported
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='cold imports per module (best is reported)')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module, forbidden in TARGETS.items():
+        runs = [measure_import(module) for _ in range(args.repeat)]
+        best_us = min(total for total, _ in runs)
+        leaked = sorted(set(forbidden) & runs[0][1])
+        status = 'OK' if not leaked else f"LEAKS {', '.join(leaked)}"
+        failed = failed or bool(leaked)
+        print(f"{module:<32} {best_us / 1000:8.1f} ms  {status}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
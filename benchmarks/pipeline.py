@@ -0,0 +1,227 @@
+"""
+Time every stage of the analysis pipeline on fixed-seed synthetic vitals
+
+Each stage is run on batches of 1, 10, 100, ... records up to --max-size
+(1M by default). Stages that write files or render charts stop at their
+own cap (see STAGES) so a full run stays within minutes. Every batch is
+timed best-of --repeat, and batches shorter than MIN_SECONDS are looped.
+The report shows seconds per batch and microseconds per record.
+
+Results can be saved as a JSON baseline and later compared against it; a
+stage/size that is slower per record than the baseline by more than
+--threshold is flagged and the exit status is 1.
+
+Usage:
+    python benchmarks/pipeline.py [--max-size 1000000] [--repeat 3] [--stage NAME ...]
+    python benchmarks/pipeline.py --save benchmarks/baseline.json
+    python benchmarks/pipeline.py --compare benchmarks/baseline.json [--threshold 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from hemodynamic_analyzer.batch import analyze_vitals_batch
+from hemodynamic_analyzer.cache import get_export_cache
+from hemodynamic_analyzer.charts import create_chart_image, create_vitals_chart
+from hemodynamic_analyzer.core import (
+    build_patient_record,
+    calculate_all_parameters,
+    classify_parameters,
+    classify_statuses,
+    generate_clinical_report,
+)
+from hemodynamic_analyzer.exports import save_report_as_csv, save_report_as_pdf, save_report_as_txt
+
+
+SEED = 20240101
+SIZES = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000]
+# Batches faster than this are run repeatedly and averaged
+MIN_SECONDS = 0.05
+DEFAULT_THRESHOLD = 0.25
+TIMESTAMP = "2024-01-01 08:00:00"
+
+def synthetic_vitals(n, seed=SEED):
+    """(heart_rate, systolic_bp, diastolic_bp) integer arrays; the same n and seed give the same vitals"""
+    rng = np.random.default_rng(seed)
+    heart_rate = rng.integers(40, 161, n)
+    systolic_bp = rng.integers(70, 201, n)
+    diastolic_bp = np.minimum(rng.integers(40, 121, n), systolic_bp - 10)
+    return heart_rate, systolic_bp, diastolic_bp
+
+# ============================================================================
+# STAGES
+# ============================================================================
+
+def _rows(vitals, directory):
+    return list(zip(*(column.tolist() for column in vitals)))
+
+def _calculated_rows(vitals, directory):
+    return [(h, s, d, calculate_all_parameters(h, s, d)) for h, s, d in _rows(vitals, directory)]
+
+def _records(vitals, directory):
+    records = []
+    for i, (h, s, d, calculated) in enumerate(_calculated_rows(vitals, directory)):
+        status = classify_statuses(h, s, d, calculated)
+        records.append(build_patient_record(f"PAT-{i + 1:04d}", f"Patient {i + 1}", TIMESTAMP, 40,
+                                            h, s, d, calculated, status))
+    return records
+
+def _report_files(extension, with_text):
+    def prepare(vitals, directory):
+        return [(generate_clinical_report(record) if with_text else record,
+                 os.path.join(directory, f"{record['patient_id']}.{extension}"))
+                for record in _records(vitals, directory)]
+    return prepare
+
+def run_calculate(rows):
+    for h, s, d in rows:
+        calculate_all_parameters(h, s, d)
+
+def run_classify(rows):
+    for h, s, d, calculated in rows:
+        classify_parameters(h, s, d, calculated)
+
+def run_report(records):
+    for record in records:
+        generate_clinical_report(record)
+
+def _run_save(save):
+    def run(items):
+        for data, filename in items:
+            save(data, filename)
+    return run
+
+def run_chart_image(records):
+    # Charts are cached per record; time the rendering, not the cache
+    get_export_cache().clear()
+    for record in records:
+        create_chart_image(record)
+
+def run_vitals_chart(records):
+    for record in records:
+        create_vitals_chart(record)
+
+def run_batch(vitals):
+    analyze_vitals_batch(*vitals)
+
+# name -> (prepare(vitals, directory), run(prepared), largest batch size)
+STAGES = {
+    'calculate_all_parameters': (_rows, run_calculate, 1_000_000),
+    'classify_parameters': (_calculated_rows, run_classify, 1_000_000),
+    'generate_clinical_report': (_records, run_report, 100_000),
+    'save_report_as_txt': (_report_files('txt', True), _run_save(save_report_as_txt), 10_000),
+    'save_report_as_csv': (_report_files('csv', False), _run_save(save_report_as_csv), 10_000),
+    'save_report_as_pdf': (_report_files('pdf', True), _run_save(save_report_as_pdf), 1_000),
+    'create_chart_image': (_records, run_chart_image, 10),
+    'create_vitals_chart': (_records, run_vitals_chart, 100),
+    'analyze_vitals_batch': (lambda vitals, directory: vitals, run_batch, 1_000_000),
+}
+
+# ============================================================================
+# TIMING AND BASELINES
+# ============================================================================
+
+def time_batch(run, prepared, repeat):
+    """Best seconds per call of run(prepared) over repeat rounds"""
+    best = float('inf')
+    for _ in range(repeat):
+        loops = 0
+        start = time.perf_counter()
+        while True:
+            run(prepared)
+            loops += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_SECONDS:
+                break
+        best = min(best, elapsed / loops)
+    return best
+
+def run_benchmarks(stages, max_size, repeat, report=print):
+    """{stage: {size: {'seconds', 'us_per_record'}}} for every stage and size up to its cap"""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench-') as directory:
+        for name in stages:
+            prepare, run, cap = STAGES[name]
+            results[name] = {}
+            # Untimed warm-up so lazy imports and first-use setup are not billed to size 1
+            run(prepare(synthetic_vitals(1), directory))
+            for size in SIZES:
+                if size > min(cap, max_size):
+                    break
+                prepared = prepare(synthetic_vitals(size), directory)
+                seconds = time_batch(run, prepared, repeat)
+                del prepared
+                results[name][str(size)] = {'seconds': seconds, 'us_per_record': seconds / size * 1e6}
+                report(f"{name:<26} {size:>9,}  {seconds:10.4f} s  {seconds / size * 1e6:10.2f} us/record")
+    return results
+
+def environment():
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': SEED,
+    }
+
+def compare(results, baseline, threshold):
+    """Print per-record changes against a baseline; return the list of regressed (stage, size)"""
+    regressions = []
+    print(f"\n{'stage':<26} {'size':>9}  {'baseline':>12}  {'current':>12}  change")
+    for name, sizes in results.items():
+        for size, current in sizes.items():
+            previous = baseline.get(name, {}).get(size)
+            if previous is None:
+                print(f"{name:<26} {int(size):>9,}  {'-':>12}  {current['us_per_record']:12.2f}  new")
+                continue
+            change = current['us_per_record'] / previous['us_per_record'] - 1
+            flag = '  REGRESSION' if change > threshold else ''
+            if flag:
+                regressions.append((name, int(size)))
+            print(f"{name:<26} {int(size):>9,}  {previous['us_per_record']:12.2f}  "
+                  f"{current['us_per_record']:12.2f}  {change:+6.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stage', action='append', choices=list(STAGES), help='stage to run (repeatable; default: all)')
+    parser.add_argument('--max-size', type=int, default=SIZES[-1], help='largest batch size for any stage')
+    parser.add_argument('--repeat', type=int, default=3, help='timing rounds per batch (best is kept)')
+    parser.add_argument('--save', metavar='FILE', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a saved JSON baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown per record flagged as a regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = run_benchmarks(args.stage or list(STAGES), args.max_size, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+        print(f"\nbaseline written to {args.save}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%} "
+                  f"(baseline from {baseline['environment']['date']})")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Measure memory held per stored patient record
+
+Builds N records with varied vitals and reports the bytes allocated per
+record (tracemalloc) for PatientRecord and for the equivalent plain dict
+with every message, alert and color materialized.
+
+Usage:
+    python benchmarks/record_memory.py [--records 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hemodynamic_analyzer.core import build_patient_record, calculate_all_parameters, classify_statuses
+
+
+def make_inputs(n, seed=0):
+    rng = random.Random(seed)
+    inputs = []
+    for i in range(n):
+        heart_rate, systolic_bp = rng.randint(40, 160), rng.randint(70, 200)
+        diastolic_bp = rng.randint(40, systolic_bp - 10)
+        inputs.append((f"PAT-{i + 1:04d}", f"Patient {i + 1}", "2024-01-01 08:00:00", rng.randint(18, 90),
+                       heart_rate, systolic_bp, diastolic_bp))
+    return inputs
+
+def build(inputs, as_dict):
+    records = []
+    for patient_id, name, timestamp, age, heart_rate, systolic_bp, diastolic_bp in inputs:
+        calculated = calculate_all_parameters(heart_rate, systolic_bp, diastolic_bp)
+        status = classify_statuses(heart_rate, systolic_bp, diastolic_bp, calculated)
+        record = build_patient_record(patient_id, name, timestamp, age, heart_rate, systolic_bp,
+                                      diastolic_bp, calculated, status)
+        records.append(dict(record) if as_dict else record)
+    return records
+
+def measure(inputs, as_dict):
+    """Bytes still allocated per record once the records are built"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = build(inputs, as_dict)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(records)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    inputs = make_inputs(args.records)
+    as_dict = measure(inputs, as_dict=True)
+    as_record = measure(inputs, as_dict=False)
+    print(f"dict with messages   {as_dict:8.0f} B/record")
+    print(f"PatientRecord        {as_record:8.0f} B/record  ({as_record / as_dict:.0%})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
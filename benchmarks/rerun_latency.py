@@ -0,0 +1,181 @@
+"""
+Measure per-keystroke latency of the Streamlit app
+
+Starts the app headless on a local port and talks to it the way the browser
+does (protobuf messages over the websocket): one patient is analyzed, then
+the Heart Rate input is changed --keystrokes times. Each change is timed
+from sending the new value to the end of the rerun it causes. When the input
+sits in a fragment the change is sent as a rerun of that fragment, exactly
+as the browser sends it; otherwise it reruns the whole script.
+
+The history database is a temporary file seeded with --history-rows rows.
+
+Usage:
+    python benchmarks/rerun_latency.py [--keystrokes 30] [--history-rows 10000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hemodynamic_analyzer.core import build_patient_record, calculate_all_parameters, classify_statuses
+from hemodynamic_analyzer.store import HistoryStore
+
+
+APP = os.path.join(ROOT, 'bio_hemodynamic_stability_analyzer.py')
+INPUT_LABEL = 'Heart Rate'
+ANALYZE_LABEL = 'Analyze'
+STARTUP_TIMEOUT = 60
+
+def seed_history(path, rows, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        heart_rate, systolic_bp = rng.randint(40, 160), rng.randint(80, 200)
+        diastolic_bp = rng.randint(40, systolic_bp - 10)
+        calculated = calculate_all_parameters(heart_rate, systolic_bp, diastolic_bp)
+        status = classify_statuses(heart_rate, systolic_bp, diastolic_bp, calculated)
+        records.append(build_patient_record(f"PAT-{i + 1:04d}", f"Patient {i % 500}",
+                                            f"2024-01-{1 + i // 1440 % 28:02d} {i // 60 % 24:02d}:{i % 60:02d}:00",
+                                            rng.randint(18, 90), heart_rate, systolic_bp, diastolic_bp,
+                                            calculated, status))
+    store = HistoryStore(path)
+    store.insert_records(records)
+    store.close()
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(port, db_path):
+    env = dict(os.environ, HEMODYNAMIC_DB_PATH=db_path)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', APP, '--server.headless', 'true',
+         '--server.port', str(port), '--browser.gatherUsageStats', 'false'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Streamlit server did not start")
+
+async def connect(url):
+    """(send, receive, close) coroutines for a websocket; newer Streamlit ships websockets, older tornado"""
+    try:
+        from websockets.asyncio.client import connect as websockets_connect
+    except ImportError:
+        from tornado.websocket import websocket_connect
+
+        connection = await websocket_connect(url, max_message_size=None)
+
+        async def close():
+            connection.close()
+        return (lambda data: connection.write_message(data, binary=True)), connection.read_message, close
+    connection = await websockets_connect(url, max_size=None)
+    return connection.send, connection.recv, connection.close
+
+class BrowserSession:
+    """Minimal websocket client speaking the Streamlit browser protocol"""
+
+    def __init__(self, send, receive):
+        self.send = send
+        self.receive = receive
+        # label -> (widget id, fragment id or '') for number inputs and buttons
+        self.widgets = {}
+
+    async def rerun(self, widget_states=(), fragment_id=''):
+        """Send one rerun request; returns seconds until the run finished"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.fragment_id = fragment_id
+        for widget_id, field, value in widget_states:
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            setattr(state, field, value)
+
+        start = time.perf_counter()
+        await self.send(message.SerializeToString())
+        while True:
+            data = await self.receive()
+            if data is None:
+                raise RuntimeError("connection closed by the server")
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type in ('number_input', 'button'):
+                    widget = getattr(element, element_type)
+                    self.widgets[widget.label] = (widget.id, forward.delta.fragment_id)
+            elif kind == 'script_finished':
+                return time.perf_counter() - start
+
+    def find(self, label):
+        return next(value for name, value in self.widgets.items() if label in name)
+
+async def measure(port, keystrokes):
+    send, receive, close = await connect(f"ws://127.0.0.1:{port}/_stcore/stream")
+    session = BrowserSession(send, receive)
+    try:
+        await session.rerun()
+        analyze_id, analyze_fragment = session.find(ANALYZE_LABEL)
+        await session.rerun([(analyze_id, 'trigger_value', True)], analyze_fragment)
+        # A button click inside a fragment can rerun the whole app; let it settle
+        await session.rerun()
+
+        input_id, fragment_id = session.find(INPUT_LABEL)
+        timings = []
+        for i in range(keystrokes):
+            value = 60 + i % 40
+            timings.append(await session.rerun([(input_id, 'double_value', value)], fragment_id))
+        return timings, bool(fragment_id)
+    finally:
+        await close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keystrokes', type=int, default=30)
+    parser.add_argument('--history-rows', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='latency-') as directory:
+        db_path = os.path.join(directory, 'history.sqlite3')
+        seed_history(db_path, args.history_rows)
+        port = free_port()
+        server = start_server(port, db_path)
+        try:
+            timings, fragment = asyncio.run(measure(port, args.keystrokes))
+        finally:
+            server.terminate()
+            server.wait()
+
+    timings_ms = sorted(t * 1000 for t in timings)
+    scope = 'fragment rerun' if fragment else 'full script rerun'
+    print(f"{len(timings_ms)} keystrokes on '{INPUT_LABEL}' ({scope}), {args.history_rows:,} history rows")
+    print(f"median {statistics.median(timings_ms):8.1f} ms")
+    print(f"p95    {timings_ms[int(0.95 * (len(timings_ms) - 1))]:8.1f} ms")
+    print(f"max    {timings_ms[-1]:8.1f} ms")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
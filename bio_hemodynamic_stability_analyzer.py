@@ -1,16 +1,46 @@
 # bio_hemodynamic_stability_analyzer.py
 import streamlit as st
 import pandas as pd
-import numpy as np
 from datetime import datetime
-import os
-import base64
-from fpdf import FPDF
-import csv
-import plotly.graph_objects as go
-import plotly.express as px
-import matplotlib.pyplot as plt
-from io import BytesIO
+import functools
+import uuid
+
+from hemodynamic_analyzer import (
+    build_patient_record,
+    calculate_all_parameters,
+    classify_statuses,
+    generate_clinical_report,
+    get_thresholds,
+    patient_key,
+)
+from hemodynamic_analyzer.archive import (
+    CSV_FORMATS,
+    HISTORY_FORMATS,
+    history_bytes,
+    history_chunks,
+    history_csv_bytes,
+    read_history,
+)
+from hemodynamic_analyzer.batch import process_csv_in_chunks
+from hemodynamic_analyzer.bundle import bundle_bytes, get_render_pool
+from hemodynamic_analyzer.cache import get_export_cache
+from hemodynamic_analyzer.charts import CHART_DPI, create_vitals_chart
+from hemodynamic_analyzer.cohort import build_cohort_pdf
+from hemodynamic_analyzer.exports import export_report
+from hemodynamic_analyzer.history import DEFAULT_SESSION_BUDGET, PatientHistory, get_session_registry
+from hemodynamic_analyzer.longitudinal import ROLLING_VISITS, LongitudinalTracker
+from hemodynamic_analyzer.profiling import (
+    profile_dump,
+    is_recording,
+    profile_summary,
+    stage,
+    start_profile,
+    start_recording,
+    stop_profile,
+    stop_recording,
+)
+from hemodynamic_analyzer.store import HistoryStore
+from hemodynamic_analyzer.trends import create_trend_chart, downsample_trends
 
 
 # Page configuration
@@ -218,13 +248,97 @@ st.markdown('<h1 class="main-header">🫀 Biomedical Hemodynamic Analyzer</h1>',
 st.markdown('<p class="sub-header">Advanced Patient Hemodynamic Monitoring & Risk Assessment System</p>', unsafe_allow_html=True)
 
 # Initialize session state
-if 'history' not in st.session_state:
-    st.session_state.history = []
 if 'patient_id_counter' not in st.session_state:
     st.session_state.patient_id_counter = 1
 if 'current_patient' not in st.session_state:
     st.session_state.current_patient = None
 
+# Active threshold table (compiled once per process)
+thresholds = get_thresholds()
+
+# Opt-in profiling of this rerun (sidebar); reported in the sidebar panel at the end of the script
+if st.session_state.get('profiling_enabled'):
+    start_recording()
+if st.session_state.pop('profile_next_rerun', False):
+    start_profile()
+
+def profiled_fragment(panel):
+    """
+    Record a fragment's own reruns while profiling is on
+    A full rerun already records the whole script, fragments included. A
+    fragment rerun does not run the script, so it gets its own recording,
+    kept in session state by panel name; a fragment cannot write to the
+    sidebar, so these show up in the profiling panel on the next full rerun.
+    """
+    @functools.wraps(panel)
+    def wrapper(*args, **kwargs):
+        if is_recording() or not st.session_state.get('profiling_enabled'):
+            return panel(*args, **kwargs)
+        start_recording()
+        try:
+            return panel(*args, **kwargs)
+        finally:
+            st.session_state.setdefault('fragment_timings', {})[panel.__name__] = stop_recording()
+    return wrapper
+
+# Vitals shown in the Analysis Results tab before any patient is analyzed
+SAMPLE_PREVIEW_VITALS = {
+    'heart_rate': 72,
+    'systolic_bp': 120,
+    'diastolic_bp': 80,
+    'map': 93.33,
+    'hr_status': 'NORMAL',
+    'map_status': 'NORMAL',
+    'patient_name': 'Sample Patient',
+    'patient_id': 'PAT-0000'
+}
+
+# History export choices: label -> key of archive.HISTORY_FORMATS
+HISTORY_EXPORT_FORMATS = {
+    'CSV': 'csv',
+    'CSV (gzip)': 'csv.gz',
+    'Parquet': 'parquet',
+    'Arrow IPC': 'arrow',
+}
+# Most history rows put in one ZIP bundle from the history table (newest first).
+# Streamlit holds a download whole in memory, at roughly 250 KB per patient
+BUNDLE_MAX_ROWS = 100
+# Most pages in the session's cohort PDF (first patients of the session)
+COHORT_MAX_PAGES = 200
+
+@st.cache_resource
+def get_history_store():
+    """SQLite history store shared by every session of this server process"""
+    return HistoryStore()
+
+@st.cache_resource
+def get_longitudinal_tracker():
+    """Per-patient rolling statistics, shared like the store they are seeded from"""
+    return LongitudinalTracker(get_history_store())
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_trend_series(filter_items, last_id):
+    """Time-ordered HR/MAP/SI arrays for a filter set; last_id in the key reloads them when records are added"""
+    return get_history_store().series(**dict(filter_items))
+
+# Session history: written through to the shared store and held in memory only
+# up to the session budget, so many concurrent sessions cannot exhaust the worker
+if 'history' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]
+    st.session_state.history = PatientHistory(store=get_history_store(), session_id=st.session_state.session_id,
+                                              budget_bytes=DEFAULT_SESSION_BUDGET)
+    get_session_registry().register(st.session_state.session_id, st.session_state.history)
+
+def add_scored_frame(frame):
+    """
+    Add a scored chunk to this session's history and the rolling visit statistics
+    The chunk is checked first, so one the history rejects reaches neither;
+    visit statistics are seeded from the store, so they are updated before storing.
+    """
+    st.session_state.history.check_frame(frame)
+    get_longitudinal_tracker().add_frame(frame)
+    st.session_state.history.extend_frame(frame)
+
 # ============================================================================
 # HELPER FUNCTION FOR METRIC DISPLAY
 # ============================================================================
@@ -266,355 +380,32 @@ def display_metric_with_status(label, value, unit, status, status_text=None):
     """, unsafe_allow_html=True)
 
 # ============================================================================
-# CALCULATION FUNCTIONS (Modular Design)
+# SIDEBAR
 # ============================================================================
 
-def calculate_all_parameters(heart_rate, systolic_bp, diastolic_bp):
-    """
-    Calculate all hemodynamic parameters from patient vitals
-    Using standard medical formulas
-    """
-    
-    # 1. Mean Arterial Pressure (MAP)
-    # Formula: DBP + 1/3(SBP - DBP)
-    map_value = diastolic_bp + (systolic_bp - diastolic_bp) / 3
+with st.sidebar:
+    st.markdown("### ⚙️ Export Cache")
+    cache_stats = get_export_cache().stats()
+    col1, col2 = st.columns(2)
+    col1.metric("Hits", cache_stats['hits'])
+    col2.metric("Misses", cache_stats['misses'])
+    st.caption(f"{cache_stats['entries']} cached exports · "
+               f"{cache_stats['bytes'] / 1024 / 1024:.1f} / {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB · "
+               f"hit rate {cache_stats['hit_rate']:.0%} · {cache_stats['evictions']} evicted")
     
-    # 2. Shock Index (SI)
-    # Formula: HR / SBP
-    shock_index = heart_rate / systolic_bp if systolic_bp > 0 else 0
+    chart_dpi = st.select_slider("**Chart export DPI**", options=[72, 100, 150, 200, 300], value=CHART_DPI,
+                                 help="Resolution of PNG/JPG chart downloads")
     
-    # 3. Pulse Pressure (PP)
-    # Formula: SBP - DBP
-    pulse_pressure = systolic_bp - diastolic_bp
+    st.markdown("### 🧠 Session Memory")
+    memory_panel = st.container()
     
-    # 4. Rate Pressure Product (RPP)
-    # Formula: HR × SBP
-    rpp = heart_rate * systolic_bp
-    
-    return {
-        'map': round(map_value, 2),
-        'shock_index': round(shock_index, 2),
-        'pulse_pressure': pulse_pressure,
-        'rpp': rpp
-    }
-
-def classify_parameters(heart_rate, systolic_bp, diastolic_bp, calculated):
-    """
-    Classify each parameter as NORMAL, ABNORMAL, or CRITICAL
-    Using logical conditions (if/else) as per assignment requirements
-    """
-    status = {}
-    
-    # Heart Rate Classification (Normal: 60-100 BPM)
-    if heart_rate < 60:
-        status['hr_status'] = 'LOW'
-        status['hr_message'] = f'Bradycardia: Heart rate {heart_rate} BPM is below normal range (60-100 BPM)'
-    elif 60 <= heart_rate <= 100:
-        status['hr_status'] = 'NORMAL'
-        status['hr_message'] = f'Normal heart rate: {heart_rate} BPM (within 60-100 BPM range)'
-    else:
-        status['hr_status'] = 'HIGH'
-        status['hr_message'] = f'Tachycardia: Heart rate {heart_rate} BPM is above normal range (60-100 BPM)'
-    
-    # Blood Pressure Classification (Normal: SBP 90-140, DBP 60-90)
-    if systolic_bp < 90 or diastolic_bp < 60:
-        status['bp_status'] = 'LOW'
-        status['bp_message'] = f'Hypotension: BP {systolic_bp}/{diastolic_bp} mmHg is below normal range'
-    elif systolic_bp > 140 or diastolic_bp > 90:
-        status['bp_status'] = 'HIGH'
-        status['bp_message'] = f'Hypertension: BP {systolic_bp}/{diastolic_bp} mmHg is above normal range'
-    else:
-        status['bp_status'] = 'NORMAL'
-        status['bp_message'] = f'Normal blood pressure: {systolic_bp}/{diastolic_bp} mmHg'
-    
-    # MAP Classification (Normal: 70-100 mmHg)
-    if calculated['map'] < 70:
-        status['map_status'] = 'LOW'
-        status['map_message'] = f'Low MAP: {calculated["map"]} mmHg - Risk of inadequate organ perfusion'
-    elif 70 <= calculated['map'] <= 100:
-        status['map_status'] = 'NORMAL'
-        status['map_message'] = f'Normal MAP: {calculated["map"]} mmHg - Adequate organ perfusion'
-    else:
-        status['map_status'] = 'HIGH'
-        status['map_message'] = f'High MAP: {calculated["map"]} mmHg - Increased cardiac workload'
-    
-    # Shock Index Classification (Normal: 0.5-0.7)
-    if calculated['shock_index'] < 0.5:
-        status['si_status'] = 'LOW'
-        status['si_message'] = f'Low shock index: {calculated["shock_index"]} - Hemodynamically stable'
-    elif 0.5 <= calculated['shock_index'] <= 0.7:
-        status['si_status'] = 'NORMAL'
-        status['si_message'] = f'Normal shock index: {calculated["shock_index"]} - Within normal range'
-    elif 0.7 < calculated['shock_index'] <= 1.0:
-        status['si_status'] = 'ELEVATED'
-        status['si_message'] = f'Elevated shock index: {calculated["shock_index"]} - Monitor closely'
-    else:
-        status['si_status'] = 'CRITICAL'
-        status['si_message'] = f'CRITICAL: Shock index {calculated["shock_index"]} - Immediate intervention required'
-    
-    # Overall Patient Classification
-    if (status['si_status'] == 'CRITICAL' or calculated['shock_index'] > 1.0):
-        status['overall'] = 'CRITICAL'
-        status['color'] = '#FF4B4B'
-        status['alert'] = '⚠️ CRITICAL CONDITION - Immediate Medical Intervention Required!'
-        status['priority'] = 1
-    elif (status['si_status'] == 'ELEVATED' or
-          status['map_status'] != 'NORMAL' or
-          status['hr_status'] != 'NORMAL' or
-          status['bp_status'] != 'NORMAL'):
-        status['overall'] = 'ABNORMAL'
-        status['color'] = '#ffc107'
-        status['alert'] = '⚠️ Abnormal Parameters Detected - Medical Review Recommended'
-        status['priority'] = 2
-    else:
-        status['overall'] = 'NORMAL'
-        status['color'] = '#28a745'
-        status['alert'] = '✅ Patient Stable - All Parameters Within Normal Range'
-        status['priority'] = 3
-    
-    return status
-
-def generate_clinical_report(patient_data):
-    """
-    Generate comprehensive clinical report as formatted string
-    """
-    report = []
-    report.append("=" * 80)
-    report.append("                    BIOMEDICAL HEMODYNAMIC ANALYSIS REPORT")
-    report.append("=" * 80)
-    report.append(f"Report ID: {patient_data['patient_id']}")
-    report.append(f"Patient Name: {patient_data['patient_name']}")
-    report.append(f"Age: {patient_data['age']} years")
-    report.append(f"Date & Time: {patient_data['timestamp']}")
-    report.append("-" * 80)
-    report.append("PATIENT VITAL SIGNS:")
-    report.append(f"  • Heart Rate: {patient_data['heart_rate']} BPM ({patient_data['hr_status']})")
-    report.append(f"  • Systolic Blood Pressure: {patient_data['systolic_bp']} mmHg")
-    report.append(f"  • Diastolic Blood Pressure: {patient_data['diastolic_bp']} mmHg")
-    report.append("-" * 80)
-    report.append("CALCULATED HEMODYNAMIC PARAMETERS:")
-    report.append(f"  • Mean Arterial Pressure (MAP): {patient_data['map']} mmHg ({patient_data['map_status']})")
-    report.append(f"  • Shock Index (SI): {patient_data['shock_index']} ({patient_data['si_status']})")
-    report.append(f"  • Pulse Pressure: {patient_data['pulse_pressure']} mmHg")
-    report.append(f"  • Rate Pressure Product (RPP): {patient_data['rpp']}")
-    report.append("-" * 80)
-    report.append("CLINICAL INTERPRETATION:")
-    report.append(f"  • Heart Rate: {patient_data['hr_message']}")
-    report.append(f"  • Blood Pressure: {patient_data['bp_message']}")
-    report.append(f"  • MAP Status: {patient_data['map_message']}")
-    report.append(f"  • Shock Risk: {patient_data['si_message']}")
-    report.append("-" * 80)
-    report.append(f"OVERALL STATUS: {patient_data['overall']}")
-    report.append(f"CLINICAL ALERT: {patient_data['alert']}")
-    report.append("=" * 80)
-    report.append("Generated by Biomedical Hemodynamic Analyzer")
-    report.append("Advanced Patient Monitoring & Risk Assessment System")
-    
-    return "\n".join(report)
-
-# ============================================================================
-# FILE EXPORT FUNCTIONS
-# ============================================================================
-
-def save_report_as_txt(report_text, filename):
-    """Save report as TXT file"""
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(report_text)
-        return filename
-    except Exception as e:
-        st.error(f"Error saving TXT: {e}")
-        return None
-
-def save_report_as_csv(patient_data, filename):
-    """Save report as CSV file"""
-    try:
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['Parameter', 'Value', 'Status', 'Normal Range', 'Unit'])
-            writer.writerow(['Patient ID', patient_data['patient_id'], '', '', ''])
-            writer.writerow(['Patient Name', patient_data['patient_name'], '', '', ''])
-            writer.writerow(['Timestamp', patient_data['timestamp'], '', '', ''])
-            writer.writerow(['Age', patient_data['age'], '', '', 'years'])
-            writer.writerow(['Heart Rate', patient_data['heart_rate'], patient_data['hr_status'], '60-100', 'BPM'])
-            writer.writerow(['Systolic BP', patient_data['systolic_bp'], '', '90-140', 'mmHg'])
-            writer.writerow(['Diastolic BP', patient_data['diastolic_bp'], '', '60-90', 'mmHg'])
-            writer.writerow(['MAP', patient_data['map'], patient_data['map_status'], '70-100', 'mmHg'])
-            writer.writerow(['Shock Index', patient_data['shock_index'], patient_data['si_status'], '0.5-0.7', ''])
-            writer.writerow(['Pulse Pressure', patient_data['pulse_pressure'], '', '30-50', 'mmHg'])
-            writer.writerow(['RPP', patient_data['rpp'], '', '<10000', ''])
-            writer.writerow(['Overall Status', patient_data['overall'], '', '', ''])
-        return filename
-    except Exception as e:
-        st.error(f"Error saving CSV: {e}")
-        return None
-
-def save_report_as_pdf(report_text, filename):
-    """Save report as PDF file"""
-    try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=10)
-        
-        for line in report_text.split('\n'):
-            # Handle encoding issues
-            line = line.encode('latin-1', 'replace').decode('latin-1')
-            pdf.cell(200, 5, txt=line, ln=True, align='L')
-        
-        pdf.output(filename)
-        return filename
-    except Exception as e:
-        st.error(f"Error saving PDF: {e}")
-        return None
-
-def create_chart_image(patient_data, format_type='png'):
-    """Create chart image using matplotlib (no kaleido required)"""
-    try:
-        # Create figure with matplotlib
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
-        fig.patch.set_facecolor('#f8f9fa')
-        
-        # Bar chart for vitals
-        categories = ['Heart Rate\n(BPM)', 'Systolic BP\n(mmHg)', 'Diastolic BP\n(mmHg)', 'MAP\n(mmHg)']
-        values = [patient_data['heart_rate'], patient_data['systolic_bp'], 
-                 patient_data['diastolic_bp'], patient_data['map']]
-        
-        # Color based on status
-        colors = []
-        if patient_data['hr_status'] == 'NORMAL':
-            colors.append('#667eea')
-        elif patient_data['hr_status'] == 'LOW':
-            colors.append('#dc3545')
-        else:
-            colors.append('#28a745')
-            
-        colors.append('#6c757d')  # SBP
-        colors.append('#6c757d')  # DBP
-        
-        if patient_data['map_status'] == 'NORMAL':
-            colors.append('#667eea')
-        elif patient_data['map_status'] == 'LOW':
-            colors.append('#dc3545')
-        else:
-            colors.append('#28a745')
-        
-        bars = ax1.bar(categories, values, color=colors, edgecolor='black', linewidth=2)
-        ax1.set_title('Patient Vital Signs', fontsize=16, fontweight='bold', pad=20)
-        ax1.set_ylabel('Value', fontsize=12, fontweight='bold')
-        ax1.grid(True, alpha=0.3, linestyle='--')
-        
-        # Add value labels on bars
-        for bar, v in zip(bars, values):
-            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 1,
-                    str(v), ha='center', va='bottom', fontweight='bold', fontsize=11)
-        
-        # Add reference lines
-        ax1.axhline(y=60, color='gray', linestyle='--', alpha=0.5, label='Normal Lower Limit')
-        ax1.axhline(y=100, color='gray', linestyle='--', alpha=0.5, label='Normal Upper Limit')
-        ax1.legend(fontsize=9)
-        
-        # Gauge for overall status
-        status_colors = {'NORMAL': '#667eea', 'ABNORMAL': '#ffc107', 'CRITICAL': '#dc3545'}
-        status = patient_data['overall']
-        color = status_colors.get(status, '#808080')
-        
-        # Create a donut chart for status
-        wedges, texts = ax2.pie([1], colors=[color], radius=0.8, 
-                                wedgeprops=dict(width=0.3, edgecolor='white'))
-        ax2.text(0, 0, status, ha='center', va='center', fontsize=20, fontweight='bold')
-        ax2.set_title('Overall Patient Status', fontsize=16, fontweight='bold', pad=20)
-        
-        # Add patient info
-        plt.suptitle(f"Hemodynamic Analysis Report\nPatient: {patient_data['patient_name']} (ID: {patient_data['patient_id']})", 
-                    fontsize=18, fontweight='bold', y=1.02)
-        plt.tight_layout()
-        
-        # Save to bytes
-        img_bytes = BytesIO()
-        plt.savefig(img_bytes, format=format_type, dpi=150, bbox_inches='tight', 
-                   facecolor=fig.get_facecolor(), edgecolor='none')
-        plt.close()
-        
-        img_bytes.seek(0)
-        return img_bytes
-    except Exception as e:
-        st.error(f"Error creating chart: {e}")
-        return None
-
-def save_chart_as_image(patient_data, filename, format_type='png'):
-    """Save chart as image file"""
-    try:
-        img_bytes = create_chart_image(patient_data, format_type)
-        if img_bytes:
-            with open(filename, 'wb') as f:
-                f.write(img_bytes.getvalue())
-            return filename
-    except Exception as e:
-        st.error(f"Error saving {format_type.upper()}: {e}")
-        return None
-
-# ============================================================================
-# VISUALIZATION FUNCTIONS
-# ============================================================================
-
-def create_vitals_chart(patient_data):
-    """Create interactive Plotly chart for display"""
-    
-    categories = ['Heart Rate (BPM)', 'Systolic BP (mmHg)', 'Diastolic BP (mmHg)', 'MAP (mmHg)']
-    values = [patient_data['heart_rate'], patient_data['systolic_bp'], 
-             patient_data['diastolic_bp'], patient_data['map']]
-    
-    # Color based on status
-    colors = []
-    for i, cat in enumerate(categories):
-        if cat == 'Heart Rate (BPM)':
-            if patient_data['hr_status'] == 'NORMAL':
-                colors.append('#667eea')
-            elif patient_data['hr_status'] == 'LOW':
-                colors.append('#dc3545')
-            else:
-                colors.append('#28a745')
-        elif cat == 'MAP (mmHg)':
-            if patient_data['map_status'] == 'NORMAL':
-                colors.append('#667eea')
-            elif patient_data['map_status'] == 'LOW':
-                colors.append('#dc3545')
-            else:
-                colors.append('#28a745')
-        else:
-            colors.append('#6c757d')
-    
-    fig = go.Figure(data=[
-        go.Bar(name='Values', x=categories, y=values, marker_color=colors,
-               text=values, textposition='auto',
-               textfont=dict(size=14, color='white', family='Arial Black'))
-    ])
-    
-    fig.update_layout(
-        title={
-            'text': 'Patient Vitals Visualization',
-            'y':0.95,
-            'x':0.5,
-            'xanchor': 'center',
-            'yanchor': 'top',
-            'font': dict(size=20, family='Arial Black')
-        },
-        xaxis_title='Parameter',
-        yaxis_title='Value',
-        template='plotly_white',
-        height=500,
-        showlegend=False,
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)'
-    )
-    
-    # Add horizontal lines for normal ranges
-    fig.add_hline(y=60, line_dash="dash", line_color="gray", 
-                  annotation_text="Normal Lower Limit", annotation_position="bottom right")
-    fig.add_hline(y=100, line_dash="dash", line_color="gray",
-                  annotation_text="Normal Upper Limit", annotation_position="top right")
-    
-    return fig
+    st.markdown("### ⏱️ Profiling")
+    st.toggle("Time each rerun", key='profiling_enabled',
+              help="Per-stage timings of calculation, reports, exports, charts and storage for every rerun; "
+                   "fragment reruns are listed at the next full rerun")
+    st.button("🔍 Capture cProfile of one rerun", use_container_width=True,
+              on_click=lambda: st.session_state.update(profile_next_rerun=True))
+    profiling_panel = st.container()
 
 # ============================================================================
 # MAIN UI - TABS
@@ -627,7 +418,14 @@ tab1, tab2, tab3, tab4 = st.tabs(["📝 Patient Input", "📊 Analysis Results",
 # TAB 1: PATIENT INPUT
 # ============================================================================
 
-with tab1:
+@st.fragment
+@profiled_fragment
+def patient_input_panel():
+    """
+    Patient form, reference ranges and live calculation preview
+    A fragment: editing an input reruns only this panel. Analyzing reruns the
+    whole app so the results and history tabs show the new patient.
+    """
     col1, col2 = st.columns([1, 1])
     
     with col1:
@@ -637,6 +435,8 @@ with tab1:
         # Patient name input
         patient_name = st.text_input("**Patient Full Name**", value="Ahmed", 
                                      help="Enter patient's full name")
+        patient_mrn = st.text_input("**MRN (optional)**", placeholder="Medical record number",
+                                    help="Links repeat visits; without it visits are linked by name")
         
         # Patient age
         patient_age = st.number_input("**Age (years)**", min_value=0, max_value=120, value=19, step=1,
@@ -644,67 +444,56 @@ with tab1:
         
         # Vital signs inputs
         heart_rate = st.number_input("**Heart Rate (BPM)**", min_value=0, max_value=300, value=55, step=1,
-                                     help="Normal range: 60-100 BPM")
+                                     help=f"Normal range: {thresholds.normal_range('heart_rate', with_unit=True)}")
         
         systolic_bp = st.number_input("**Systolic BP (mmHg)**", min_value=0, max_value=300, value=160, step=1,
-                                      help="Normal range: 90-140 mmHg")
+                                      help=f"Normal range: {thresholds.normal_range('systolic_bp', with_unit=True)}")
         
         diastolic_bp = st.number_input("**Diastolic BP (mmHg)**", min_value=0, max_value=200, value=92, step=1,
-                                       help="Normal range: 60-90 mmHg")
+                                       help=f"Normal range: {thresholds.normal_range('diastolic_bp', with_unit=True)}")
         
         # Analyze button
         if st.button("🔬 Analyze Patient Data", use_container_width=True):
             with st.spinner("Calculating hemodynamic parameters..."):
                 # Calculate parameters
                 calculated = calculate_all_parameters(heart_rate, systolic_bp, diastolic_bp)
-                status = classify_parameters(heart_rate, systolic_bp, diastolic_bp, calculated)
+                status = classify_statuses(heart_rate, systolic_bp, diastolic_bp, calculated)
                 
                 # Create patient record
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 patient_id = f"PAT-{st.session_state.patient_id_counter:04d}"
                 
                 # Store in session state
-                st.session_state.current_patient = {
-                    'patient_id': patient_id,
-                    'patient_name': patient_name,
-                    'timestamp': timestamp,
-                    'age': patient_age,
-                    'heart_rate': heart_rate,
-                    'systolic_bp': systolic_bp,
-                    'diastolic_bp': diastolic_bp,
-                    'map': calculated['map'],
-                    'shock_index': calculated['shock_index'],
-                    'pulse_pressure': calculated['pulse_pressure'],
-                    'rpp': calculated['rpp'],
-                    'hr_status': status['hr_status'],
-                    'bp_status': status['bp_status'],
-                    'map_status': status['map_status'],
-                    'si_status': status['si_status'],
-                    'hr_message': status['hr_message'],
-                    'bp_message': status['bp_message'],
-                    'map_message': status['map_message'],
-                    'si_message': status['si_message'],
-                    'overall': status['overall'],
-                    'alert': status['alert'],
-                    'color': status['color']
-                }
+                st.session_state.current_patient = build_patient_record(
+                    patient_id, patient_name, timestamp, patient_age,
+                    heart_rate, systolic_bp, diastolic_bp, calculated, status,
+                    key=patient_key(patient_name, patient_mrn)
+                )
                 
                 st.session_state.patient_id_counter += 1
-                st.session_state.history.append(st.session_state.current_patient.copy())
-                st.success("✅ Analysis Complete! Go to Analysis Results tab.")
+                # Rolling visit statistics are seeded from the store, so update them before storing
+                get_longitudinal_tracker().add(st.session_state.current_patient)
+                st.session_state.history.append(st.session_state.current_patient)
+                st.session_state.analysis_complete = True
+            st.rerun()
+        
+        if st.session_state.pop('analysis_complete', False):
+            st.success("✅ Analysis Complete! Go to Analysis Results tab.")
     
     with col2:
         st.markdown("### 📋 Reference Ranges")
         
-        # Reference ranges table
+        # Reference ranges table (ranges come from the active threshold table)
+        ref_parameters = ['heart_rate', 'systolic_bp', 'diastolic_bp', 'map', 'shock_index', 'pulse_pressure', 'rpp']
         ref_data = pd.DataFrame({
-            'Parameter': ['Heart Rate', 'Systolic BP', 'Diastolic BP', 'MAP', 'Shock Index', 'Pulse Pressure', 'RPP'],
-            'Normal Range': ['60-100 BPM', '90-140 mmHg', '60-90 mmHg', '70-100 mmHg', '0.5-0.7', '30-50 mmHg', '<10,000'],
+            'Parameter': [thresholds.label(name) for name in ref_parameters],
+            'Normal Range': [thresholds.normal_range(name, with_unit=True) for name in ref_parameters],
             'Formula': ['Input', 'Input', 'Input', 'DBP + 1/3(SBP-DBP)', 'HR/SBP', 'SBP-DBP', 'HR × SBP'],
             'Clinical Significance': ['Cardiac rate', 'Vascular pressure', 'Vascular pressure', 'Organ perfusion', 'Shock risk', 'Cardiac output', 'Oxygen demand']
         })
         
         st.dataframe(ref_data, use_container_width=True, hide_index=True)
+        st.caption(f"Thresholds version {thresholds.version}")
         
         # Live calculation preview
         st.markdown("### 🧪 Live Calculation Preview")
@@ -724,74 +513,133 @@ with tab1:
         </div>
         """, unsafe_allow_html=True)
 
+with tab1:
+    patient_input_panel()
+
+    # Bulk mode for scoring whole shift exports
+    with st.expander("📂 Bulk CSV Upload"):
+        st.markdown("Upload a CSV with `heart_rate`, `systolic_bp` and `diastolic_bp` columns "
+                    "(optional: `patient_name`, `mrn`, `age`, `timestamp`). The file is scored in "
+                    "bounded-size chunks and every row is added to Patient History.")
+
+        bulk_file = st.file_uploader("**Vitals CSV**", type=["csv"])
+        memory_limit_mb = st.number_input("**Peak memory limit per chunk (MB)**", min_value=8, max_value=1024,
+                                          value=64, step=8,
+                                          help="Chunk size is adapted so each chunk stays under this limit")
+
+        if bulk_file is not None and st.button("📥 Process CSV File", use_container_width=True):
+            progress_bar = st.progress(0.0, text="Scoring uploaded file...")
+            bulk_skipped = [0]
+
+            def update_progress(fraction, rows_done, rows_skipped):
+                bulk_skipped[0] = rows_skipped
+                progress_bar.progress(fraction, text=f"Scored {rows_done:,} rows")
+
+            try:
+                rows_added = 0
+                for scored in process_csv_in_chunks(bulk_file, st.session_state.patient_id_counter,
+                                                    memory_limit_mb, progress_callback=update_progress):
+                    add_scored_frame(scored)
+                    st.session_state.patient_id_counter += len(scored)
+                    rows_added += len(scored)
+                progress_bar.progress(1.0, text=f"Scored {rows_added:,} rows")
+                st.success(f"✅ {rows_added:,} patients analyzed and added to Patient History.")
+                if bulk_skipped[0]:
+                    st.warning(f"{bulk_skipped[0]:,} rows skipped: a vital was missing or outside the "
+                               f"form's limits, or the age was outside 0-120.")
+            except ValueError as e:
+                st.error(f"Error processing CSV: {e}")
+
 # ============================================================================
 # TAB 2: ANALYSIS RESULTS
 # ============================================================================
 
-with tab2:
-    if st.session_state.current_patient:
-        p = st.session_state.current_patient
-        
-        # Alert based on overall status
-        if p['overall'] == 'CRITICAL':
-            st.markdown(f'<div class="critical-alert">{p["alert"]}</div>', unsafe_allow_html=True)
-        elif p['overall'] == 'ABNORMAL':
-            st.markdown(f'<div class="warning-alert">{p["alert"]}</div>', unsafe_allow_html=True)
-        else:
-            st.markdown(f'<div class="normal-alert">{p["alert"]}</div>', unsafe_allow_html=True)
-        
-        # Patient info card
-        st.markdown(f"""
-        <div class="patient-info-card">
-            <h2>Patient: {p['patient_name']}</h2>
-            <p style='font-size: 1.1rem;'>ID: {p['patient_id']} | Age: {p['age']} years | Time: {p['timestamp']}</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Input vitals with color-coded status
-        st.markdown("### 📊 Input Vital Signs")
+@st.fragment
+@profiled_fragment
+def results_panel(p):
+    """Status, vitals, charts, visit history, interpretation and report text of patient p"""
+    # Alert based on overall status
+    if p['overall'] == 'CRITICAL':
+        st.markdown(f'<div class="critical-alert">{p["alert"]}</div>', unsafe_allow_html=True)
+    elif p['overall'] == 'ABNORMAL':
+        st.markdown(f'<div class="warning-alert">{p["alert"]}</div>', unsafe_allow_html=True)
+    else:
+        st.markdown(f'<div class="normal-alert">{p["alert"]}</div>', unsafe_allow_html=True)
+    
+    # Patient info card
+    st.markdown(f"""
+    <div class="patient-info-card">
+        <h2>Patient: {p['patient_name']}</h2>
+        <p style='font-size: 1.1rem;'>ID: {p['patient_id']} | Age: {p['age']} years | Time: {p['timestamp']}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Input vitals with color-coded status
+    st.markdown("### 📊 Input Vital Signs")
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        display_metric_with_status("Heart Rate", p['heart_rate'], "BPM", p['hr_status'])
+    
+    with col2:
+        # For BP, we show both values but status is based on combined classification
+        display_metric_with_status("Systolic BP", p['systolic_bp'], "mmHg", p['bp_status'])
+    
+    with col3:
+        display_metric_with_status("Diastolic BP", p['diastolic_bp'], "mmHg", p['bp_status'])
+    
+    # Calculated parameters with color-coded status
+    st.markdown("### 🧮 Calculated Hemodynamic Parameters")
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        display_metric_with_status("Mean Arterial Pressure", p['map'], "mmHg", p['map_status'])
+        st.caption("DBP + 1/3(SBP-DBP)")
+    
+    with col2:
+        display_metric_with_status("Shock Index", p['shock_index'], "", p['si_status'])
+        st.caption("HR / SBP")
+    
+    with col3:
+        # Pulse Pressure has no specific status, show normal
+        display_metric_with_status("Pulse Pressure", p['pulse_pressure'], "mmHg", "NORMAL", "—")
+        st.caption("SBP - DBP")
+    
+    with col4:
+        # RPP has no specific status, show normal
+        display_metric_with_status("Rate Pressure Product", p['rpp'], "", "NORMAL", "—")
+        st.caption("HR × SBP")
+    
+    # Visualization
+    st.markdown("### 📈 Vitals Visualization")
+    with stage("Vitals chart (build + send)"):
+        fig = create_vitals_chart(p)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    # Longitudinal view: this patient's visits, linked by MRN or name
+    visits = get_longitudinal_tracker().snapshot(p['patient_key'])
+    if visits is not None and visits['visits'] > 1:
+        st.markdown("### 🗓️ Visit History")
         col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            display_metric_with_status("Heart Rate", p['heart_rate'], "BPM", p['hr_status'])
-        
-        with col2:
-            # For BP, we show both values but status is based on combined classification
-            display_metric_with_status("Systolic BP", p['systolic_bp'], "mmHg", p['bp_status'])
-        
-        with col3:
-            display_metric_with_status("Diastolic BP", p['diastolic_bp'], "mmHg", p['bp_status'])
-        
-        # Calculated parameters with color-coded status
-        st.markdown("### 🧮 Calculated Hemodynamic Parameters")
-        col1, col2, col3, col4 = st.columns(4)
-        
         with col1:
-            display_metric_with_status("Mean Arterial Pressure", p['map'], "mmHg", p['map_status'])
-            st.caption("DBP + 1/3(SBP-DBP)")
-        
+            st.metric("Visits", visits['visits'], help=f"Last seen {visits['last_seen']}")
         with col2:
-            display_metric_with_status("Shock Index", p['shock_index'], "", p['si_status'])
-            st.caption("HR / SBP")
-        
+            st.metric("MAP (rolling mean)", f"{visits['map_mean']:.1f} mmHg",
+                      delta=f"{visits['map_delta']:+.1f} mmHg since last visit")
         with col3:
-            # Pulse Pressure has no specific status, show normal
-            display_metric_with_status("Pulse Pressure", p['pulse_pressure'], "mmHg", "NORMAL", "—")
-            st.caption("SBP - DBP")
-        
-        with col4:
-            # RPP has no specific status, show normal
-            display_metric_with_status("Rate Pressure Product", p['rpp'], "", "NORMAL", "—")
-            st.caption("HR × SBP")
-        
-        # Visualization
-        st.markdown("### 📈 Vitals Visualization")
-        fig = create_vitals_chart(p)
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # Clinical interpretation
-        st.markdown("### 🔬 Clinical Interpretation")
-        
+            st.metric("Shock Index (rolling mean)", f"{visits['shock_index_mean']:.2f}",
+                      delta=f"{visits['shock_index_delta']:+.2f} since last visit", delta_color="inverse")
+        st.caption(f"Means over the last {min(visits['visits'], ROLLING_VISITS)} visits")
+        
+        with stage("Visit trend chart"):
+            series = load_trend_series((('patient_key', p['patient_key']),), get_history_store().last_id())
+            traces, _ = downsample_trends(series)
+            st.plotly_chart(create_trend_chart(traces), use_container_width=True, key='visit_trend_chart')
+    
+    # Clinical interpretation
+    st.markdown("### 🔬 Clinical Interpretation")
+    
+    with stage("Interpretation table (build + send)"):
         interpretation_df = pd.DataFrame({
             'Parameter': ['Heart Rate', 'Blood Pressure', 'MAP', 'Shock Index'],
             'Value': [f"{p['heart_rate']} BPM", f"{p['systolic_bp']}/{p['diastolic_bp']} mmHg", 
@@ -801,179 +649,290 @@ with tab2:
         })
         
         st.dataframe(interpretation_df, use_container_width=True, hide_index=True)
-        
-        # Clinical Report
-        st.markdown("### 📄 Clinical Report")
-        report_text = generate_clinical_report(p)
-        
-        st.markdown(f'<div class="report-box">{report_text}</div>', unsafe_allow_html=True)
-        
-        # Download section
-        st.markdown("### 💾 Download Reports")
-        st.markdown('<div class="download-section">', unsafe_allow_html=True)
-        
-        # Create reports directory
-        if not os.path.exists("reports"):
-            os.makedirs("reports")
-        
-        timestamp_file = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # Download buttons
-        col1, col2, col3 = st.columns(3)
-        col4, col5 = st.columns(2)
-        
-        with col1:
-            # TXT download
-            txt_filename = f"reports/{p['patient_id']}_report_{timestamp_file}.txt"
-            if save_report_as_txt(report_text, txt_filename):
-                with open(txt_filename, 'rb') as f:
-                    st.download_button(
-                        label="📄 Download TXT Report",
-                        data=f,
-                        file_name=f"{p['patient_id']}_report.txt",
-                        mime="text/plain",
-                        use_container_width=True
-                    )
-        
-        with col2:
-            # CSV download
-            csv_filename = f"reports/{p['patient_id']}_report_{timestamp_file}.csv"
-            if save_report_as_csv(p, csv_filename):
-                with open(csv_filename, 'rb') as f:
-                    st.download_button(
-                        label="📊 Download CSV Report",
-                        data=f,
-                        file_name=f"{p['patient_id']}_report.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-        
-        with col3:
-            # PDF download
-            pdf_filename = f"reports/{p['patient_id']}_report_{timestamp_file}.pdf"
-            if save_report_as_pdf(report_text, pdf_filename):
-                with open(pdf_filename, 'rb') as f:
-                    st.download_button(
-                        label="📑 Download PDF Report",
-                        data=f,
-                        file_name=f"{p['patient_id']}_report.pdf",
-                        mime="application/pdf",
-                        use_container_width=True
-                    )
-        
-        with col4:
-            # PNG download
-            png_filename = f"reports/{p['patient_id']}_chart_{timestamp_file}.png"
-            if save_chart_as_image(p, png_filename, 'png'):
-                with open(png_filename, 'rb') as f:
-                    st.download_button(
-                        label="🖼️ Download PNG Chart",
-                        data=f,
-                        file_name=f"{p['patient_id']}_chart.png",
-                        mime="image/png",
-                        use_container_width=True
-                    )
-        
-        with col5:
-            # JPG download
-            jpg_filename = f"reports/{p['patient_id']}_chart_{timestamp_file}.jpg"
-            if save_chart_as_image(p, jpg_filename, 'jpg'):
-                with open(jpg_filename, 'rb') as f:
-                    st.download_button(
-                        label="🖼️ Download JPG Chart",
-                        data=f,
-                        file_name=f"{p['patient_id']}_chart.jpg",
-                        mime="image/jpeg",
-                        use_container_width=True
-                    )
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        # New analysis button
-        if st.button("🔄 New Patient Analysis", use_container_width=True):
-            st.session_state.current_patient = None
-            st.rerun()
+    
+    # Clinical Report
+    st.markdown("### 📄 Clinical Report")
+    report_text = generate_clinical_report(p)
+    
+    st.markdown(f'<div class="report-box">{report_text}</div>', unsafe_allow_html=True)
+
+@st.fragment
+@profiled_fragment
+def download_panel(p):
+    """Report and chart downloads of patient p; a download reruns only this panel"""
+    # Download section
+    st.markdown("### 💾 Download Reports")
+    st.markdown('<div class="download-section">', unsafe_allow_html=True)
+    
+    # Download buttons - exports are built in memory, only when the button
+    # is clicked, and cached so an unchanged record is rendered only once
+    col1, col2, col3 = st.columns(3)
+    col4, col5 = st.columns(2)
+    
+    with col1:
+        st.download_button(
+            label="📄 Download TXT Report",
+            data=lambda: export_report(p, 'txt'),
+            file_name=f"{p['patient_id']}_report.txt",
+            mime="text/plain",
+            use_container_width=True
+        )
+    
+    with col2:
+        st.download_button(
+            label="📊 Download CSV Report",
+            data=lambda: export_report(p, 'csv'),
+            file_name=f"{p['patient_id']}_report.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+    
+    with col3:
+        st.download_button(
+            label="📑 Download PDF Report",
+            data=lambda: export_report(p, 'pdf'),
+            file_name=f"{p['patient_id']}_report.pdf",
+            mime="application/pdf",
+            use_container_width=True
+        )
+    
+    with col4:
+        st.download_button(
+            label="🖼️ Download PNG Chart",
+            data=lambda: export_report(p, 'png', chart_dpi),
+            file_name=f"{p['patient_id']}_chart.png",
+            mime="image/png",
+            use_container_width=True
+        )
+    
+    with col5:
+        st.download_button(
+            label="🖼️ Download JPG Chart",
+            data=lambda: export_report(p, 'jpg', chart_dpi),
+            file_name=f"{p['patient_id']}_chart.jpg",
+            mime="image/jpeg",
+            use_container_width=True
+        )
+
+    # All five files in one ZIP, rendered here so the cached exports above are reused
+    st.download_button(
+        label="📦 Download All (ZIP)",
+        data=lambda: bundle_bytes([p], workers=0, dpi=chart_dpi),
+        file_name=f"{p['patient_id']}_bundle.zip",
+        mime="application/zip",
+        use_container_width=True
+    )
+
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # New analysis button
+    if st.button("🔄 New Patient Analysis", use_container_width=True):
+        st.session_state.current_patient = None
+        st.rerun()
+
+with tab2:
+    if st.session_state.current_patient:
+        p = st.session_state.current_patient
+        results_panel(p)
+        download_panel(p)
     
     else:
         st.info("👈 Please enter patient details in the 'Patient Input' tab and click 'Analyze Patient Data'")
         
-        # Sample preview
+        # Sample preview (fixed values, so the figure comes from the chart cache)
         st.markdown("### Sample Preview")
-        sample_fig = create_vitals_chart({
-            'heart_rate': 72,
-            'systolic_bp': 120,
-            'diastolic_bp': 80,
-            'map': 93.33,
-            'hr_status': 'NORMAL',
-            'map_status': 'NORMAL',
-            'patient_name': 'Sample Patient',
-            'patient_id': 'PAT-0000'
-        })
+        sample_fig = create_vitals_chart(SAMPLE_PREVIEW_VITALS)
         st.plotly_chart(sample_fig, use_container_width=True)
 
 # ============================================================================
 # TAB 3: PATIENT HISTORY
 # ============================================================================
 
-with tab3:
+@st.fragment
+@profiled_fragment
+def history_panel():
+    """
+    Stored history (filters, paging, trends) and this session's summary and exports
+    A fragment: filtering and paging rerun only this panel.
+    """
     st.markdown("### 📈 Patient History & Trends")
     
-    if len(st.session_state.history) > 0:
-        # Create DataFrame from history
-        history_df = pd.DataFrame(st.session_state.history)
+    history_store = get_history_store()
+    if history_store.has_records():
+        # Filters and paging run in SQLite, so only one page is ever loaded
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            filter_patient_id = st.text_input("**Patient ID**", placeholder="PAT-0001").strip()
+        with col2:
+            filter_status = st.selectbox("**Status**", ["All", "NORMAL", "ABNORMAL", "CRITICAL"])
+        with col3:
+            filter_dates = st.date_input("**Date range**", value=())
+        with col4:
+            page_size = st.selectbox("**Rows per page**", [25, 50, 100, 250], index=1)
+        
+        filters = {
+            'patient_id': filter_patient_id or None,
+            'overall': None if filter_status == "All" else filter_status,
+            'start': f"{filter_dates[0]:%Y-%m-%d}" if len(filter_dates) > 0 else None,
+            'end': f"{filter_dates[-1]:%Y-%m-%d} 23:59:59" if len(filter_dates) > 1 else None,
+        }
+        
+        # Keyset paging: a stack of page cursors, reset when filters change
+        if st.session_state.get('history_filters') != (filters, page_size):
+            st.session_state.history_filters = (filters, page_size)
+            st.session_state.history_cursors = [None]
+        cursors = st.session_state.history_cursors
+        
+        page_df, has_older = history_store.query_page(page_size, cursors[-1], **filters)
         
         # Select columns for display
         display_cols = ['timestamp', 'patient_id', 'patient_name', 'age', 'heart_rate', 
                        'systolic_bp', 'diastolic_bp', 'map', 'shock_index', 'overall']
         
         # Rename for better display
-        display_df = history_df[display_cols].copy()
+        display_df = page_df[display_cols]
         display_df.columns = ['Date/Time', 'Patient ID', 'Name', 'Age', 'HR', 'SBP', 'DBP', 'MAP', 'SI', 'Status']
         
         # Display history table
-        st.dataframe(display_df, use_container_width=True, hide_index=True)
+        with stage("History table (send)"):
+            st.dataframe(display_df, use_container_width=True, hide_index=True)
         
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("⬅️ Newer", use_container_width=True, disabled=len(cursors) == 1):
+                cursors.pop()
+                st.rerun(scope="fragment")
+        with col2:
+            st.caption(f"Page {len(cursors)} · {len(page_df)} records")
+        with col3:
+            if st.button("Older ➡️", use_container_width=True, disabled=not has_older):
+                cursors.append(history_store.page_cursor(page_df))
+                st.rerun(scope="fragment")
+        
+        # Every report format of the filtered rows in one ZIP, built only when
+        # clicked and rendered by the shared spawned pool (forking one from the
+        # script thread would copy the server's threads and their locks)
+        st.download_button(
+            label=f"📦 Download Reports of Filtered Rows (ZIP, newest {BUNDLE_MAX_ROWS})",
+            data=lambda: bundle_bytes(history_store.matching_records(BUNDLE_MAX_ROWS, **filters),
+                                      dpi=chart_dpi, pool=get_render_pool()),
+            file_name=f"history_bundle_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+            mime="application/zip",
+            help=f"The ZIP is built in memory before the download starts, so it holds at most the newest "
+                 f"{BUNDLE_MAX_ROWS} rows. For more, run `python -m hemodynamic_analyzer bundle --db ...`, "
+                 f"which writes the ZIP to disk as it renders.",
+            use_container_width=True
+        )
+        
+        # Trends: the whole filtered history, downsampled on the server to a
+        # bounded number of points; narrowing the zoom range re-samples it
+        st.markdown("### 📉 Trends")
+        with stage("Trend series"):
+            series = load_trend_series(tuple(filters.items()), history_store.last_id())
+        timestamps = series['timestamp']
+        window = None
+        if len(timestamps) > 1 and timestamps[0] < timestamps[-1]:
+            first, last = (pd.Timestamp(t).to_pydatetime() for t in (timestamps[0], timestamps[-1]))
+            window = st.slider("**Zoom**", min_value=first, max_value=last, value=(first, last),
+                               format="YYYY-MM-DD HH:mm")
+        if len(timestamps) > 0:
+            traces, in_window = downsample_trends(series, window)
+            with stage("Trend chart (send)"):
+                st.plotly_chart(create_trend_chart(traces), use_container_width=True, key='history_trend_chart')
+            shown = len(traces['heart_rate'][0])
+            st.caption(f"{in_window:,} readings in range · {shown:,} points drawn per series")
+    else:
+        st.info("No patient history available. Analyze some patients first!")
+    
+    history = st.session_state.history
+    if len(history) > 0:
         # Statistics
-        st.markdown("### 📊 Summary Statistics")
+        st.markdown("### 📊 Summary Statistics (This Session)")
         
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            avg_hr = np.mean([p['heart_rate'] for p in st.session_state.history])
+            avg_hr = history.mean('heart_rate')
             st.metric("Average Heart Rate", f"{avg_hr:.1f} BPM")
         
         with col2:
-            avg_map = np.mean([p['map'] for p in st.session_state.history])
+            avg_map = history.mean('map')
             st.metric("Average MAP", f"{avg_map:.1f} mmHg")
         
         with col3:
-            avg_si = np.mean([p['shock_index'] for p in st.session_state.history])
+            avg_si = history.mean('shock_index')
             st.metric("Average Shock Index", f"{avg_si:.2f}")
         
         with col4:
-            critical_count = sum(1 for p in st.session_state.history if p['overall'] == 'CRITICAL')
+            critical_count = history.count_status('overall', 'CRITICAL')
             st.metric("Critical Cases", critical_count)
         
-        # Export history button
-        if st.button("📥 Export History to CSV", use_container_width=True):
-            history_filename = f"reports/patient_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            history_df.to_csv(history_filename, index=False)
-            
-            with open(history_filename, 'rb') as f:
-                st.download_button(
-                    label="Download History CSV",
-                    data=f,
-                    file_name=os.path.basename(history_filename),
-                    mime="text/csv"
-                )
-        
-        # Clear history button
-        if st.button("🗑️ Clear History", use_container_width=True):
-            st.session_state.history = []
+        # Export history: CSV with the messages, or typed Parquet / Arrow IPC for analysis.
+        # Every format is built in memory only when the download is clicked and
+        # nothing is written under reports/; CSV is streamed chunk by chunk
+        # (optionally gzip-compressed), so no DataFrame of the whole history is built.
+        export_format = st.radio("**History export format**", list(HISTORY_EXPORT_FORMATS), horizontal=True,
+                                 help="Parquet and Arrow IPC keep column types and store statuses as categories; "
+                                      "Arrow IPC files can be memory-mapped by pandas, pyarrow or polars")
+        history_format = HISTORY_EXPORT_FORMATS[export_format]
+        history_extension, history_mime = HISTORY_FORMATS[history_format]
+        if history_format in CSV_FORMATS:
+            history_data = lambda: history_csv_bytes(history, compress=history_format == 'csv.gz')
+        else:
+            history_data = lambda: history_bytes(history, history_format)
+        st.download_button(
+            label=f"📥 Export History to {export_format}",
+            data=history_data,
+            file_name=f"patient_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}{history_extension}",
+            mime=history_mime,
+            help="The file is built when clicked and held in memory until it is downloaded. To stream "
+                 "the whole database instead, run `python -m hemodynamic_analyzer export-history` or "
+                 "fetch /history.csv from the scoring service.",
+            use_container_width=True
+        )
+        
+        # Cohort PDF of this session: a page per patient, built only on download,
+        # in this process (see the history ZIP) and capped, as a page costs
+        # about a third of a second
+        st.download_button(
+            label="📑 Download Cohort PDF" if len(history) <= COHORT_MAX_PAGES
+                  else f"📑 Download Cohort PDF (first {COHORT_MAX_PAGES} patients)",
+            data=lambda: build_cohort_pdf(history.iter_records(), workers=0, max_pages=COHORT_MAX_PAGES),
+            file_name=f"cohort_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+            mime="application/pdf",
+            use_container_width=True
+        )
+        
+        # Clear history button (stored records are kept)
+        if st.button("🗑️ Clear Session History", use_container_width=True):
+            st.session_state.history.clear()
             st.rerun()
     
-    else:
-        st.info("No patient history available. Analyze some patients first!")
+    # Import a Parquet / Arrow IPC history export into this session (and the store)
+    with st.expander("📤 Import History File"):
+        history_file = st.file_uploader("**History file (Parquet / Arrow IPC)**", type=["parquet", "arrow", "feather"])
+        if history_file is not None and st.button("📤 Import History", use_container_width=True):
+            try:
+                rows_imported = 0
+                highest_number = 0
+                with stage("History import"):
+                    for chunk in history_chunks(read_history(history_file.getvalue())):
+                        add_scored_frame(chunk)
+                        rows_imported += len(chunk)
+                        if len(chunk):
+                            highest_number = max(highest_number, int(chunk['patient_number'].max()))
+                # New patients are numbered after the imported ones, so their ids never repeat
+                st.session_state.patient_id_counter = max(st.session_state.patient_id_counter, highest_number + 1)
+                st.session_state.history_imported = rows_imported
+                st.rerun()
+            except ValueError as e:
+                st.error(f"Error importing history: {e}")
+        
+        if 'history_imported' in st.session_state:
+            st.success(f"✅ {st.session_state.pop('history_imported'):,} records imported into Patient History.")
+
+with tab3:
+    history_panel()
 
 # ============================================================================
 # TAB 4: ABOUT
@@ -1005,7 +964,8 @@ with tab4:
         </div>
         """, unsafe_allow_html=True)
         
-        st.markdown("""
+        hr_lower, hr_upper = thresholds.bounds('heart_rate')
+        st.markdown(f"""
         <div class="feature-box">
             <h3>🧠 System Logic & Design</h3>
             <p><b>Core Logic:</b> The system uses a multi-parameter decision algorithm that:</p>
@@ -1018,17 +978,17 @@ with tab4:
                         <li>RPP = HR × SBP (Arithmetic operator: ×)</li>
                     </ul>
                 </li>
-                <li><b>Applies threshold-based classification</b> using conditional statements:
+                <li><b>Applies threshold-based classification</b> from a versioned threshold table (v{thresholds.version}):
                     <ul>
-                        <li>If HR < 60 → BRADYCARDIA (LOW) → <span style="color:#dc3545;">↓ Red</span></li>
-                        <li>If HR between 60-100 → NORMAL → <span style="color:#667eea;">✓ Blue</span></li>
-                        <li>If HR > 100 → TACHYCARDIA (HIGH) → <span style="color:#28a745;">↑ Green</span></li>
+                        <li>If HR < {hr_lower:g} → BRADYCARDIA (LOW) → <span style="color:#dc3545;">↓ Red</span></li>
+                        <li>If HR between {hr_lower:g}-{hr_upper:g} → NORMAL → <span style="color:#667eea;">✓ Blue</span></li>
+                        <li>If HR > {hr_upper:g} → TACHYCARDIA (HIGH) → <span style="color:#28a745;">↑ Green</span></li>
                         <li>Similar logic for BP, MAP, and Shock Index</li>
                     </ul>
                 </li>
                 <li><b>Combines parameters</b> using logical operators (and/or) for overall classification:
                     <ul>
-                        <li>If Shock Index > 1.0 → CRITICAL (emergency)</li>
+                        <li>If Shock Index > {thresholds.bounds('shock_index', 'CRITICAL')[0]:g} → CRITICAL (emergency)</li>
                         <li>If any parameter abnormal → ABNORMAL (monitor)</li>
                         <li>If all parameters normal → NORMAL (stable)</li>
                     </ul>
@@ -1092,4 +1052,52 @@ st.markdown("""
 <div style='text-align: center; color: gray; padding: 1rem;'>
     Biomedical Hemodynamic Analyzer | Advanced Patient Monitoring System
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# ============================================================================
+# SESSION MEMORY PANEL
+# ============================================================================
+
+# Filled last so it includes the rows added by this rerun
+with memory_panel:
+    session_history = st.session_state.history
+    st.caption(f"This session holds {session_history.nbytes / 1024:,.0f} KB of its "
+               f"{DEFAULT_SESSION_BUDGET / 1024:,.0f} KB budget · {session_history.resident:,} rows in memory, "
+               f"{session_history.spilled:,} spilled to disk")
+    with st.expander("All sessions"):
+        session_usage = get_session_registry().usage()
+        st.dataframe(pd.DataFrame(
+            [(("▶ " if session_id == st.session_state.session_id else "") + session_id,
+              resident, spilled, nbytes / 1024) for session_id, resident, spilled, nbytes in session_usage],
+            columns=['Session', 'Rows in memory', 'Rows spilled', 'KB held']
+        ).round(1), use_container_width=True, hide_index=True)
+        st.caption(f"{len(session_usage)} live sessions · "
+                   f"{sum(row[3] for row in session_usage) / 1024 / 1024:.1f} MB held in total")
+
+# ============================================================================
+# PROFILING PANEL
+# ============================================================================
+
+profiler = stop_profile()
+if profiler is not None:
+    st.session_state.profile_capture = (profile_dump(profiler), profile_summary(profiler))
+rerun_timings = stop_recording()
+
+with profiling_panel:
+    if rerun_timings is not None:
+        timings_df = pd.DataFrame(rerun_timings.rows(), columns=['Stage', 'Calls', 'Total ms', 'Self ms'])
+        st.dataframe(timings_df.round(2), use_container_width=True, hide_index=True)
+        st.caption(f"This rerun: {rerun_timings.elapsed * 1000:.0f} ms · "
+                   f"{rerun_timings.instrumented * 1000:.0f} ms in timed stages")
+    # Fragment reruns cannot update the sidebar: their timings are listed here
+    # at the next full rerun
+    for panel_name, panel_timings in st.session_state.pop('fragment_timings', {}).items():
+        with st.expander(f"Fragment rerun: {panel_name} ({panel_timings.elapsed * 1000:.0f} ms)"):
+            st.dataframe(pd.DataFrame(panel_timings.rows(), columns=['Stage', 'Calls', 'Total ms', 'Self ms']).round(2),
+                         use_container_width=True, hide_index=True)
+    if 'profile_capture' in st.session_state:
+        profile_bytes, profile_text = st.session_state.profile_capture
+        st.download_button("Download rerun.prof", data=profile_bytes, file_name="rerun.prof",
+                           mime="application/octet-stream", use_container_width=True)
+        with st.expander("cProfile: top functions"):
+            st.code(profile_text)
@@ -0,0 +1,54 @@
+"""
+Biomedical Hemodynamic Analyzer - computational core
+
+Calculation, classification and report-text functions plus the threshold
+table they classify against, importable without Streamlit and without any
+UI side effects. Heavier parts live in submodules and are only loaded when
+used:
+
+    hemodynamic_analyzer.thresholds - versioned threshold table (pure Python)
+    hemodynamic_analyzer.profiling - opt-in stage timers and cProfile capture
+    hemodynamic_analyzer.batch    - NumPy/pandas vectorized scoring
+    hemodynamic_analyzer.charts   - matplotlib/Plotly charts (lazy imports)
+    hemodynamic_analyzer.exports  - TXT/CSV/PDF exports (fpdf imported lazily)
+    hemodynamic_analyzer.history  - columnar session history with a memory budget
+    hemodynamic_analyzer.store    - persistent SQLite history with paging
+    hemodynamic_analyzer.archive  - streamed CSV and Parquet/Arrow IPC history files
+    hemodynamic_analyzer.trends   - LTTB-downsampled WebGL trend charts
+    hemodynamic_analyzer.longitudinal - per-patient rolling visit statistics
+    hemodynamic_analyzer.cohort   - multi-page cohort PDF (parallel pages)
+    hemodynamic_analyzer.bundle   - ZIP of every report format (parallel rendering)
+    hemodynamic_analyzer.stream   - live monitor ingestion with rolling windows
+    hemodynamic_analyzer.service  - asyncio HTTP scoring service
+    hemodynamic_analyzer.cli      - headless entry point (python -m hemodynamic_analyzer)
+"""
+from .core import (
+    OVERALL_ALERTS,
+    STATUS_MESSAGES,
+    PatientRecord,
+    build_patient_record,
+    calculate_all_parameters,
+    classify_parameters,
+    classify_statuses,
+    describe_status,
+    generate_clinical_report,
+    patient_key,
+)
+from .thresholds import ThresholdTable, get_thresholds, load_thresholds, set_thresholds
+
+__all__ = [
+    'OVERALL_ALERTS',
+    'STATUS_MESSAGES',
+    'PatientRecord',
+    'build_patient_record',
+    'calculate_all_parameters',
+    'classify_parameters',
+    'classify_statuses',
+    'describe_status',
+    'generate_clinical_report',
+    'patient_key',
+    'ThresholdTable',
+    'get_thresholds',
+    'load_thresholds',
+    'set_thresholds',
+]
@@ -0,0 +1,286 @@
+"""
+History export files: streamed CSV and typed Parquet / Arrow IPC
+
+CSV is produced as a generator of byte chunks, one chunk of records at a
+time and optionally gzip-compressed as it goes, so an export of any size
+needs the memory of one chunk plus whatever the consumer keeps.
+
+Parquet and Arrow IPC are written with typed columns: vitals as int16,
+derived values as float64, timestamps as timestamp[s] and each status as a
+dictionary-encoded (categorical) column. Rows go out one record batch at a
+time, so exporting the whole store never holds it in memory.
+
+Arrow IPC files are written uncompressed so read_history() can memory-map
+them: columns are used in place from the page cache, and opening a
+multi-million-row file costs neither time nor RAM until a column is touched.
+Parquet is smaller on disk but is decoded into memory when read.
+
+The columnar files leave out messages, alerts and colors; they are rebuilt
+from the statuses, as in PatientHistory. pyarrow is imported lazily.
+"""
+import os
+import tempfile
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from .core import STATUS_CODES, patient_key
+from .history import FRAME_COLUMNS, MESSAGE_COLUMNS, STATUS_COLUMNS, records_frames
+from .profiling import timed
+from .store import _parse_timestamps
+
+
+# Format -> (file extension, MIME type)
+HISTORY_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file'),
+}
+CSV_FORMATS = ('csv', 'csv.gz')
+_EXTENSION_FORMATS = {'.csv': 'csv', '.csv.gz': 'csv.gz', '.parquet': 'parquet', '.pq': 'parquet',
+                      '.arrow': 'arrow', '.feather': 'arrow'}
+# Leading bytes of each file format
+_MAGIC = [(b'PAR1', 'parquet'), (b'ARROW1', 'arrow')]
+
+# Rows per record batch written, and per chunk when importing
+BATCH_ROWS = 65536
+# Columns of history CSV exports
+CSV_COLUMNS = FRAME_COLUMNS + MESSAGE_COLUMNS
+# zlib level of .csv.gz exports; beyond 6 files shrink little and compression slows down
+GZIP_LEVEL = 6
+
+INT16_COLUMNS = ['age', 'heart_rate', 'systolic_bp', 'diastolic_bp', 'pulse_pressure']
+# Columns a file must have to be imported (patient_key is derived from the name if absent)
+IMPORT_REQUIRED_COLUMNS = [name for name in FRAME_COLUMNS if name != 'patient_key']
+
+def history_schema():
+    """Arrow schema of history files, in FRAME_COLUMNS order"""
+    import pyarrow as pa
+
+    types = {
+        'patient_id': pa.string(),
+        'patient_name': pa.string(),
+        'patient_key': pa.string(),
+        'timestamp': pa.timestamp('s'),
+        'map': pa.float64(),
+        'shock_index': pa.float64(),
+        'rpp': pa.int32(),
+    }
+    types.update((name, pa.int16()) for name in INT16_COLUMNS)
+    types.update((name, pa.dictionary(pa.int8(), pa.string())) for name in STATUS_COLUMNS)
+    return pa.schema([(name, types[name]) for name in FRAME_COLUMNS])
+
+def format_for_path(path):
+    """A HISTORY_FORMATS key from a file name's extension"""
+    root, extension = os.path.splitext(path.lower())
+    if extension == '.gz':
+        extension = os.path.splitext(root)[1] + extension
+    if extension not in _EXTENSION_FORMATS:
+        raise ValueError(f"unknown history file extension {extension!r} "
+                         f"(use .csv, .csv.gz, .parquet or .arrow)")
+    return _EXTENSION_FORMATS[extension]
+
+# ============================================================================
+# STREAMED CSV
+# ============================================================================
+
+def iter_history_csv(frames, compress=False, columns=CSV_COLUMNS):
+    """
+    Yield a history CSV as byte chunks, one per DataFrame of frames
+    frames is e.g. PatientHistory.iter_records_frames(). With compress the
+    chunks form one gzip stream (a .csv.gz file). Only the current frame and
+    its encoded text are held, so memory stays flat whatever the row count.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    header = True
+    for frame in frames:
+        data = frame.to_csv(index=False, header=header, columns=columns).encode('utf-8')
+        header = False
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if header:
+        # No rows: still a valid CSV with its header
+        data = (','.join(columns) + '\n').encode('utf-8')
+        yield compressor.compress(data) if compressor is not None else data
+    if compressor is not None:
+        yield compressor.flush()
+
+def write_history_csv(frames, sink, compress=False):
+    """Write iter_history_csv() chunks to a binary file; returns the number of rows written"""
+    rows = 0
+
+    def counted():
+        nonlocal rows
+        for frame in frames:
+            rows += len(frame)
+            yield frame
+
+    for data in iter_history_csv(counted(), compress):
+        sink.write(data)
+    return rows
+
+def _file_bytes(write):
+    """
+    Bytes that write(f) puts in a binary file, for a download that needs the whole file
+    They go to a temporary file and are read back once at the end, so the
+    finished file is the only copy held, never the chunks as well.
+    """
+    with tempfile.TemporaryFile() as f:
+        write(f)
+        f.seek(0)
+        return f.read()
+
+@timed
+def history_csv_bytes(history, compress=False):
+    """
+    A PatientHistory (spilled rows included) as CSV bytes, built chunk by chunk
+    Only the finished, optionally gzip-compressed, file is held in full; use
+    write_history_csv() or export_store() to stream instead.
+    """
+    return _file_bytes(lambda f: write_history_csv(history.iter_records_frames(), f, compress))
+
+# ============================================================================
+# PARQUET / ARROW IPC
+# ============================================================================
+
+def _record_batch(frame, schema):
+    """
+    One record batch from a FRAME_COLUMNS DataFrame
+    Statuses may be categorical or STATUS_CODES indices; timestamps that do
+    not parse are written as null.
+    """
+    import pyarrow as pa
+
+    dictionary = pa.array(STATUS_CODES, pa.string())
+    arrays = []
+    for field in schema:
+        values = frame[field.name]
+        if field.name in STATUS_COLUMNS:
+            codes = values.cat.codes if isinstance(values.dtype, pd.CategoricalDtype) else values
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(codes.to_numpy(np.int8)), dictionary))
+        elif field.name == 'timestamp':
+            stamps = _parse_timestamps(values.astype(str).tolist()).astype('datetime64[s]')
+            arrays.append(pa.array(stamps, field.type, from_pandas=True))
+        else:
+            arrays.append(pa.array(values, field.type, from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+@timed
+def write_history(frames, sink, format='arrow'):
+    """
+    Write FRAME_COLUMNS DataFrames to sink (a path or a writable binary file)
+    frames is any iterable, e.g. PatientHistory.iter_frames() or
+    HistoryStore.record_chunks(). Returns the number of rows written.
+    """
+    import pyarrow as pa
+
+    schema = history_schema()
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+
+        writer = pq.ParquetWriter(sink, schema)
+    elif format == 'arrow':
+        # Uncompressed, so readers can memory-map the columns
+        writer = pa.ipc.new_file(sink, schema)
+    else:
+        raise ValueError(f"unknown history format {format!r}")
+
+    rows = 0
+    with writer:
+        for frame in frames:
+            for start in range(0, len(frame), BATCH_ROWS):
+                batch = _record_batch(frame.iloc[start:start + BATCH_ROWS], schema)
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    return rows
+
+def history_bytes(history, format='arrow'):
+    """A PatientHistory (spilled rows included) as the bytes of a history file (see _file_bytes)"""
+    return _file_bytes(lambda f: write_history(history.iter_frames(), f, format))
+
+def export_store(store, path, format=None):
+    """Write every stored row to path (format from the extension by default); returns rows written"""
+    format = format or format_for_path(path)
+    if format in CSV_FORMATS:
+        with open(path, 'wb') as f:
+            return write_history_csv(records_frames(store.records()), f, compress=format == 'csv.gz')
+    return write_history(store.record_chunks(chunk_rows=BATCH_ROWS), path, format)
+
+# ============================================================================
+# READING
+# ============================================================================
+
+def _source_format(head):
+    for magic, format in _MAGIC:
+        if head.startswith(magic):
+            return format
+    raise ValueError("not a Parquet or Arrow IPC file")
+
+@timed
+def read_history(source, columns=None):
+    """
+    Open a history file as a pyarrow Table
+    source is a path or the file's bytes. An Arrow IPC file given by path is
+    memory-mapped and its columns are not copied into RAM; Parquet is
+    decoded. columns optionally selects the columns to read.
+    """
+    import pyarrow as pa
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            format = _source_format(f.read(6))
+        if format == 'arrow':
+            table = pa.ipc.open_file(pa.memory_map(os.fspath(source), 'r')).read_all()
+            return table.select(columns) if columns is not None else table
+        import pyarrow.parquet as pq
+
+        return pq.read_table(source, columns=columns, memory_map=True)
+
+    format = _source_format(bytes(memoryview(source)[:6]))
+    buffer = pa.py_buffer(source)
+    if format == 'arrow':
+        table = pa.ipc.open_file(pa.BufferReader(buffer)).read_all()
+        return table.select(columns) if columns is not None else table
+    import pyarrow.parquet as pq
+
+    return pq.read_table(pa.BufferReader(buffer), columns=columns)
+
+def history_frame(table):
+    """DataFrame of a history table (or record batch): categorical statuses, nullable Int16 age"""
+    frame = table.to_pandas()
+    if 'age' in frame:
+        frame['age'] = frame['age'].astype('Int16')
+    return frame
+
+def history_chunks(table, batch_rows=BATCH_ROWS):
+    """
+    Rows of a history table as chunks shaped like score_bulk_chunk output,
+    ready for PatientHistory.extend_frame and LongitudinalTracker.add_frame
+    Raises ValueError for a file without the history columns, with patient
+    ids not of the PAT-<number> form, or with unknown statuses.
+    """
+    missing = [name for name in IMPORT_REQUIRED_COLUMNS if name not in table.column_names]
+    if missing:
+        raise ValueError(f"not a history file, missing columns: {', '.join(missing)}")
+
+    for batch in table.to_batches(max_chunksize=batch_rows):
+        frame = history_frame(batch)
+        numbers = pd.to_numeric(frame['patient_id'].astype(str).str.rsplit('-', n=1).str[-1], errors='coerce')
+        if numbers.isna().any():
+            raise ValueError("patient_id values must look like PAT-0001")
+        chunk = frame.drop(columns='patient_id')
+        chunk.insert(0, 'patient_number', numbers.astype(np.int64))
+        if 'patient_key' not in chunk:
+            chunk.insert(2, 'patient_key', [patient_key(name) for name in chunk['patient_name'].tolist()])
+        stamps = pd.to_datetime(chunk['timestamp'])
+        chunk['timestamp'] = stamps.dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+        for name in STATUS_COLUMNS:
+            statuses = pd.Categorical(chunk[name], categories=STATUS_CODES)
+            if (statuses.codes < 0).any():
+                raise ValueError(f"unknown {name} values in history file")
+            chunk[name] = statuses
+        yield chunk
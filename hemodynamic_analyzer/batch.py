@@ -0,0 +1,290 @@
+"""
+Vectorized (NumPy) scoring and chunked CSV/Parquet processing
+"""
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .core import AGE_RANGE, VITAL_RANGES, build_patient_record, patient_key
+from .history import STATUS_COLUMNS, patient_id_from_number
+from .thresholds import get_thresholds
+
+
+# ============================================================================
+# BATCH (VECTORIZED) FUNCTIONS
+# ============================================================================
+
+def _round2(values):
+    """
+    Round an array to 2 decimals exactly like the builtin round()
+    np.round scales by 100 first, which can break ties differently from
+    Python's correctly-rounded round(), so near-tie values are redone in Python
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, 2)
+    scaled = np.abs(values * 100)
+    near_tie = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in near_tie:
+        rounded.flat[i] = round(float(values.flat[i]), 2)
+    return rounded
+
+def calculate_all_parameters_batch(heart_rate, systolic_bp, diastolic_bp):
+    """
+    Vectorized calculate_all_parameters for arrays of vitals
+    Returns a dict of NumPy columns with the same keys as the scalar version
+    """
+    heart_rate = np.asarray(heart_rate)
+    systolic_bp = np.asarray(systolic_bp)
+    diastolic_bp = np.asarray(diastolic_bp)
+
+    # 1. Mean Arterial Pressure (MAP)
+    map_value = diastolic_bp + (systolic_bp - diastolic_bp) / 3
+
+    # 2. Shock Index (SI) - same SBP > 0 guard as the scalar version
+    valid_sbp = systolic_bp > 0
+    shock_index = np.zeros(np.broadcast(heart_rate, systolic_bp).shape, dtype=float)
+    np.divide(heart_rate, systolic_bp, out=shock_index, where=valid_sbp)
+
+    # 3. Pulse Pressure (PP) and 4. Rate Pressure Product (RPP)
+    pulse_pressure = systolic_bp - diastolic_bp
+    rpp = heart_rate * systolic_bp
+
+    return {
+        'map': _round2(map_value),
+        'shock_index': _round2(shock_index),
+        'pulse_pressure': pulse_pressure,
+        'rpp': rpp
+    }
+
+def classify_parameters_batch(heart_rate, systolic_bp, diastolic_bp, calculated):
+    """
+    Vectorized classify_parameters for arrays of vitals
+    Returns status codes, overall status and priority as NumPy columns
+    (messages are not built here - use classify_parameters for a single record)
+    """
+    heart_rate = np.asarray(heart_rate)
+    systolic_bp = np.asarray(systolic_bp)
+    diastolic_bp = np.asarray(diastolic_bp)
+    map_value = np.asarray(calculated['map'])
+    shock_index = np.asarray(calculated['shock_index'])
+
+    # Same band lookups as the scalar version, via np.searchsorted
+    thresholds = get_thresholds()
+    hr_status = thresholds.classify_array('heart_rate', heart_rate)
+    map_status = thresholds.classify_array('map', map_value)
+    si_status = thresholds.classify_array('shock_index', shock_index)
+
+    systolic = thresholds.classify_array('systolic_bp', systolic_bp)
+    diastolic = thresholds.classify_array('diastolic_bp', diastolic_bp)
+    bp_status = np.select(
+        [(systolic == 'LOW') | (diastolic == 'LOW'), (systolic == 'HIGH') | (diastolic == 'HIGH')],
+        ['LOW', 'HIGH'], default='NORMAL')
+
+    # Overall Patient Classification
+    critical = si_status == 'CRITICAL'
+    abnormal = ((si_status == 'ELEVATED') |
+                (map_status != 'NORMAL') |
+                (hr_status != 'NORMAL') |
+                (bp_status != 'NORMAL'))
+    overall = np.select([critical, abnormal], ['CRITICAL', 'ABNORMAL'], default='NORMAL')
+    priority = np.select([critical, abnormal], [1, 2], default=3)
+
+    return {
+        'hr_status': hr_status,
+        'bp_status': bp_status,
+        'map_status': map_status,
+        'si_status': si_status,
+        'overall': overall,
+        'priority': priority
+    }
+
+def analyze_vitals_batch(vitals, systolic_bp=None, diastolic_bp=None):
+    """
+    Score many readings in one pass
+    Accepts a DataFrame with heart_rate/systolic_bp/diastolic_bp columns,
+    or three array-likes, and returns a columnar DataFrame of results
+    """
+    if isinstance(vitals, pd.DataFrame):
+        heart_rate = vitals['heart_rate'].to_numpy()
+        systolic_bp = vitals['systolic_bp'].to_numpy()
+        diastolic_bp = vitals['diastolic_bp'].to_numpy()
+        index = vitals.index
+    else:
+        heart_rate = np.asarray(vitals)
+        systolic_bp = np.asarray(systolic_bp)
+        diastolic_bp = np.asarray(diastolic_bp)
+        index = None
+
+    calculated = calculate_all_parameters_batch(heart_rate, systolic_bp, diastolic_bp)
+    status = classify_parameters_batch(heart_rate, systolic_bp, diastolic_bp, calculated)
+
+    return pd.DataFrame({
+        'heart_rate': heart_rate,
+        'systolic_bp': systolic_bp,
+        'diastolic_bp': diastolic_bp,
+        **calculated,
+        **status
+    }, index=index)
+
+# ============================================================================
+# BULK CSV / PARQUET PROCESSING
+# ============================================================================
+
+BULK_REQUIRED_COLUMNS = ['heart_rate', 'systolic_bp', 'diastolic_bp']
+BULK_OPTIONAL_COLUMNS = ['patient_name', 'mrn', 'age', 'timestamp']
+
+# Rough working-set multiplier per parsed row: the parsed chunk and the scored
+# frame built from it are alive at the same time
+BULK_MEMORY_OVERHEAD = 4
+
+def _patient_keys(names, mrns):
+    """patient_key of every row, computed once per distinct (name, MRN) pair"""
+    keys = {}
+    result = []
+    for pair in zip(names, mrns):
+        key = keys.get(pair)
+        if key is None:
+            key = keys[pair] = patient_key(*pair)
+        result.append(key)
+    return result
+
+def valid_bulk_rows(vitals, ages):
+    """
+    Mask of rows whose vitals are all within VITAL_RANGES and whose age is
+    missing or within AGE_RANGE; missing, non-finite and implausible values
+    fail (NaN compares false with both limits)
+    """
+    valid = np.ones(len(vitals), dtype=bool)
+    for name, (low, high) in VITAL_RANGES.items():
+        values = vitals[name].to_numpy(dtype=float)
+        valid &= (values >= low) & (values <= high)
+    ages = ages.to_numpy(dtype=float)
+    valid &= np.isnan(ages) | ((ages >= AGE_RANGE[0]) & (ages <= AGE_RANGE[1]))
+    return valid
+
+def score_bulk_chunk(chunk, first_patient_number):
+    """
+    Score one chunk of uploaded rows
+    Vitals are rounded to whole numbers (as in the single-patient form); rows
+    with a missing or implausible vital or an implausible age (see
+    valid_bulk_rows) are skipped. Returns the analyze_vitals_batch output
+    with patient_number, patient_name, patient_key, timestamp and age
+    columns added (the key uses the optional mrn column),
+    ready for PatientHistory.extend_frame.
+    """
+    vitals = chunk[BULK_REQUIRED_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    ages = pd.to_numeric(chunk['age'], errors='coerce') if 'age' in chunk \
+        else pd.Series(np.nan, index=chunk.index)
+    valid = valid_bulk_rows(vitals, ages)
+    chunk = chunk[valid]
+    vitals = vitals[valid].round().astype(np.int64)
+    ages = ages[valid]
+
+    scored = analyze_vitals_batch(vitals)
+    numbers = np.arange(first_patient_number, first_patient_number + len(scored))
+    scored.insert(0, 'patient_number', numbers)
+
+    default_names = pd.Series([f"Bulk Row {n}" for n in numbers], index=chunk.index)
+    names = chunk['patient_name'].where(chunk['patient_name'].notna(), default_names) \
+        if 'patient_name' in chunk else default_names
+    scored.insert(1, 'patient_name', names.astype(str))
+    mrns = [None if pd.isna(m) else m for m in chunk['mrn'].tolist()] if 'mrn' in chunk \
+        else [None] * len(scored)
+    scored.insert(2, 'patient_key', _patient_keys(scored['patient_name'].tolist(), mrns))
+
+    timestamps = chunk['timestamp'].astype(str) if 'timestamp' in chunk \
+        else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    scored.insert(3, 'timestamp', timestamps)
+
+    scored.insert(4, 'age', ages.round().astype('Int16'))
+    return scored
+
+def scored_chunk_records(scored):
+    """
+    Rebuild patient records from a scored chunk
+    Yields PatientRecords as built by build_patient_record, one per row.
+    """
+    columns = ['patient_number', 'patient_name', 'patient_key', 'timestamp', 'age', 'heart_rate', 'systolic_bp',
+               'diastolic_bp', 'map', 'shock_index', 'pulse_pressure', 'rpp'] + STATUS_COLUMNS
+    for row in zip(*(scored[name].tolist() for name in columns)):
+        (number, name, key, timestamp, age, heart_rate, systolic_bp, diastolic_bp,
+         map_value, shock_index, pulse_pressure, rpp) = row[:12]
+        calculated = {'map': map_value, 'shock_index': shock_index,
+                      'pulse_pressure': pulse_pressure, 'rpp': rpp}
+        status = dict(zip(STATUS_COLUMNS, row[12:]))
+        yield build_patient_record(patient_id_from_number(number), name, timestamp,
+                                   None if pd.isna(age) else age,
+                                   heart_rate, systolic_bp, diastolic_bp, calculated, status, key=key)
+
+def _bulk_columns(header):
+    missing = [c for c in BULK_REQUIRED_COLUMNS if c not in header]
+    if missing:
+        raise ValueError(f"Input is missing required column(s): {', '.join(missing)}")
+    return BULK_REQUIRED_COLUMNS + [c for c in BULK_OPTIONAL_COLUMNS if c in header]
+
+def process_csv_in_chunks(csv_file, first_patient_number, memory_limit_mb=64,
+                          probe_rows=1000, progress_callback=None):
+    """
+    Score an uploaded CSV in bounded-size chunks
+    The first chunk is a small probe used to measure bytes per row; later chunks
+    are sized so one chunk's working set stays under memory_limit_mb.
+    Yields the score_bulk_chunk output for each chunk. progress_callback is
+    called after each chunk with (fraction read, rows scored, rows skipped).
+    """
+    usecols = _bulk_columns(pd.read_csv(csv_file, nrows=0).columns)
+
+    csv_file.seek(0, os.SEEK_END)
+    total_bytes = csv_file.tell() or 1
+    csv_file.seek(0)
+
+    memory_limit = memory_limit_mb * 1024 * 1024
+    patient_number = first_patient_number
+    rows_skipped = 0
+    chunk_rows = probe_rows
+
+    # MRNs stay text: as numbers, leading zeros are lost and a gap turns 123 into 123.0
+    with pd.read_csv(csv_file, usecols=usecols, dtype={'mrn': str}, iterator=True) as reader:
+        while True:
+            try:
+                chunk = reader.get_chunk(chunk_rows)
+            except StopIteration:
+                break
+
+            # Resize the next chunk from the measured cost of this one
+            bytes_per_row = chunk.memory_usage(deep=True).sum() / max(len(chunk), 1)
+            chunk_rows = max(int(memory_limit / (bytes_per_row * BULK_MEMORY_OVERHEAD)), 1)
+
+            scored = score_bulk_chunk(chunk, patient_number)
+            patient_number += len(scored)
+            rows_skipped += len(chunk) - len(scored)
+
+            if progress_callback:
+                progress_callback(min(csv_file.tell() / total_bytes, 1.0), patient_number - first_patient_number,
+                                  rows_skipped)
+            yield scored
+
+def process_parquet_in_batches(path, first_patient_number, batch_rows=65536, progress_callback=None):
+    """
+    Score a Parquet file one record batch at a time (pyarrow imported lazily)
+    Only the needed columns are read. Yields the score_bulk_chunk output for
+    each batch; progress_callback is called as for process_csv_in_chunks.
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    columns = _bulk_columns(parquet_file.schema_arrow.names)
+    total_rows = parquet_file.metadata.num_rows or 1
+    patient_number = first_patient_number
+    rows_read = 0
+
+    for record_batch in parquet_file.iter_batches(batch_size=batch_rows, columns=columns):
+        scored = score_bulk_chunk(record_batch.to_pandas(), patient_number)
+        patient_number += len(scored)
+        rows_read += record_batch.num_rows
+
+        if progress_callback:
+            progress_callback(min(rows_read / total_rows, 1.0), patient_number - first_patient_number,
+                              rows_read - (patient_number - first_patient_number))
+        yield scored
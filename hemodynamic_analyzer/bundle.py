@@ -0,0 +1,148 @@
+"""
+ZIP bundle of every report format, for one patient or many
+
+For each record the TXT, CSV and PDF reports and the PNG and JPG charts are
+rendered by a process pool, a task of BUNDLE_TASK_SIZE records at a time,
+and added to the archive in record order as each task comes back. Records
+are read lazily and only a bounded number of tasks is in flight, so neither
+the records nor the rendered files are ever held whole. write_bundle writes
+the ZIP entry by entry to its output, which need not even be seekable;
+bundle_bytes is for callers that need the finished archive in memory.
+
+TXT and CSV entries are deflated; PDF, PNG and JPG are already compressed
+and are stored as they are.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from functools import partial
+from itertools import chain, islice
+
+from .charts import CHART_DPI
+from .exports import export_report
+from .profiling import timed
+
+
+BUNDLE_FORMATS = ('txt', 'csv', 'pdf', 'png', 'jpg')
+# Formats that do not shrink any further when deflated
+STORED_FORMATS = {'pdf', 'png', 'jpg'}
+# Records per rendering task sent to a worker process
+BUNDLE_TASK_SIZE = 8
+# Workers of the shared pool used from threaded servers (get_render_pool)
+RENDER_POOL_WORKERS = min(4, os.cpu_count() or 1)
+
+def bundle_file_name(record, format_type):
+    """File name of one export, as given by the single download buttons"""
+    kind = 'chart' if format_type in ('png', 'jpg') else 'report'
+    return f"{record['patient_id']}_{kind}.{format_type}"
+
+def render_bundle_files(records, formats=BUNDLE_FORMATS, dpi=CHART_DPI):
+    """[(patient_id, [(file name, format, bytes), ...]), ...] for a task of records"""
+    return [(record['patient_id'],
+             [(bundle_file_name(record, format_type), format_type, export_report(record, format_type, dpi))
+              for format_type in formats])
+            for record in records]
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def get_render_pool():
+    """
+    Process pool for rendering from a threaded server such as Streamlit, started once
+    Its workers are spawned rather than forked, as a forked child inherits
+    locks held by the server's other threads and can deadlock on them.
+    """
+    global _render_pool
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                _render_pool = ProcessPoolExecutor(max_workers=RENDER_POOL_WORKERS,
+                                                   mp_context=multiprocessing.get_context('spawn'))
+    return _render_pool
+
+@timed
+def write_bundle(records, sink, formats=BUNDLE_FORMATS, workers=None, dpi=CHART_DPI, folders=None, pool=None):
+    """
+    Write a ZIP of every format for each record to sink (a path or a writable binary file)
+    records may be any iterable and is consumed as rendering proceeds. With
+    folders each record's files go in a folder named after its patient ID
+    (default: only when there is more than one record). workers=0 renders in
+    this process; otherwise a process pool is used (default: one worker per
+    CPU) unless everything fits in one task. pool renders in an existing
+    pool instead (it is left running), with up to 2 x workers tasks in flight.
+    Returns the number of records written.
+    """
+    unknown = [format_type for format_type in formats if format_type not in BUNDLE_FORMATS]
+    if unknown:
+        raise ValueError(f"unknown bundle format {unknown[0]!r} (use {', '.join(BUNDLE_FORMATS)})")
+    if workers is None:
+        workers = RENDER_POOL_WORKERS if pool is not None else (os.cpu_count() or 1)
+    records = iter(records)
+    tasks = iter(lambda: list(islice(records, BUNDLE_TASK_SIZE)), [])
+    first = next(tasks, [])
+    if len(first) < BUNDLE_TASK_SIZE:
+        # Everything fits in one task: a pool would only add its start-up time
+        workers = 0
+    if folders is None:
+        folders = len(first) > 1
+    render = partial(render_bundle_files, formats=formats, dpi=dpi)
+    date_time = datetime.now().timetuple()[:6]
+    folder_counts = {}
+    written = 0
+
+    def add(rendered):
+        nonlocal written
+        for patient_id, files in rendered:
+            prefix = ''
+            if folders:
+                # A patient ID seen before (repeat rows) gets a numbered folder
+                count = folder_counts[patient_id] = folder_counts.get(patient_id, 0) + 1
+                prefix = f"{patient_id}/" if count == 1 else f"{patient_id} ({count})/"
+            for name, format_type, data in files:
+                info = zipfile.ZipInfo(prefix + name, date_time)
+                info.compress_type = zipfile.ZIP_STORED if format_type in STORED_FORMATS else zipfile.ZIP_DEFLATED
+                archive.writestr(info, data)
+            written += 1
+
+    with ExitStack() as stack:
+        archive = stack.enter_context(zipfile.ZipFile(sink, 'w'))
+        tasks = chain([first], tasks) if first else tasks
+        if not workers:
+            for task in tasks:
+                add(render(task))
+            return written
+
+        if pool is None:
+            pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+        # Bound in-flight tasks so rendering cannot run ahead of the writer
+        max_pending = 2 * workers
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= max_pending:
+                add(pending.popleft().result())
+            pending.append(pool.submit(render, task))
+        while pending:
+            add(pending.popleft().result())
+    return written
+
+@timed
+def bundle_bytes(records, formats=BUNDLE_FORMATS, workers=None, dpi=CHART_DPI, folders=None, pool=None):
+    """
+    The bundle as bytes, for a download that needs the whole file
+    The ZIP is written to a temporary file as rendering proceeds and read
+    back once at the end: the records and rendered files are never held
+    whole, but the finished archive is, so callers should bound the number
+    of records. Use write_bundle to stream instead. From a threaded server
+    such as Streamlit pass pool=get_render_pool() (or workers=0) rather than
+    letting a pool be forked there.
+    """
+    with tempfile.TemporaryFile() as f:
+        write_bundle(records, f, formats, workers, dpi, folders, pool)
+        f.seek(0)
+        return f.read()
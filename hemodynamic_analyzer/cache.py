@@ -0,0 +1,87 @@
+"""
+Content-addressed, size-bounded LRU cache for rendered exports
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def patient_data_hash(patient_data):
+    """Stable content hash of a patient record (independent of key order)"""
+    payload = json.dumps(dict(patient_data), sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _entry_size(data):
+    """Size in bytes of a cached value (bytes or a NumPy buffer)"""
+    return getattr(data, 'nbytes', None) or len(data)
+
+class ExportCache:
+    """
+    Thread-safe, size-bounded LRU cache of rendered exports
+    Entries are keyed on (patient_data hash, format) so an unchanged record is
+    rendered once and every later view or download is served from memory.
+    Values are export bytes or raw RGBA chart buffers
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_create(self, patient_data, format_type, builder):
+        """Return cached bytes for this record/format, building them on a miss"""
+        key = (patient_data_hash(patient_data), format_type)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        data = builder()
+
+        with self._lock:
+            size = _entry_size(data)
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (data, size)
+                self._size += size
+                while self._size > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._size -= evicted_size
+                    self.evictions += 1
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+_export_cache = None
+_export_cache_lock = threading.Lock()
+
+def get_export_cache():
+    """Export cache shared by every caller (and every Streamlit session) in this process"""
+    global _export_cache
+    if _export_cache is None:
+        with _export_cache_lock:
+            if _export_cache is None:
+                _export_cache = ExportCache()
+    return _export_cache
@@ -0,0 +1,230 @@
+"""
+Report chart rendering (matplotlib/Pillow) and interactive Plotly charts
+
+matplotlib, Pillow and Plotly are imported inside the functions that need
+them, so importing this module does not pull in the plotting stacks.
+"""
+from functools import lru_cache
+from io import BytesIO
+
+from .cache import get_export_cache
+from .profiling import timed
+from .thresholds import get_thresholds
+
+
+# Default raster resolution for chart exports
+CHART_DPI = 150
+THUMBNAIL_SIZE = (480, 240)
+CHART_FACECOLOR = '#f8f9fa'
+
+# Record fields that the chart without the patient title is drawn from
+CHART_KEY_FIELDS = ('heart_rate', 'systolic_bp', 'diastolic_bp', 'map', 'hr_status', 'map_status', 'overall')
+
+# Interactive (Plotly) vitals chart: bars, the record fields it is drawn from,
+# and how many distinct figures are kept
+VITALS_CHART_CATEGORIES = ['Heart Rate (BPM)', 'Systolic BP (mmHg)', 'Diastolic BP (mmHg)', 'MAP (mmHg)']
+VITALS_CHART_FIELDS = ('heart_rate', 'systolic_bp', 'diastolic_bp', 'map', 'hr_status', 'map_status')
+VITALS_CHART_BP_COLOR = '#6c757d'
+VITALS_CHART_CACHE_SIZE = 128
+
+def chart_key(patient_data):
+    """Key under which two records produce the same untitled chart"""
+    return tuple(patient_data[name] for name in CHART_KEY_FIELDS)
+
+@timed
+def render_chart_rgba(patient_data, dpi=CHART_DPI, patient_title=True):
+    """
+    Rasterize the matplotlib report chart once and return it as an RGBA array
+    Uses the Agg canvas directly (no pyplot global state) and crops the plain
+    background margins the way bbox_inches='tight' would.
+    With patient_title=False the title omits the patient name and ID, so the
+    image depends only on chart_key(patient_data).
+    """
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.colors import to_rgba
+    from matplotlib.figure import Figure
+    
+    fig = Figure(figsize=(14, 6), dpi=dpi, facecolor=CHART_FACECOLOR)
+    canvas = FigureCanvasAgg(fig)
+    ax1, ax2 = fig.subplots(1, 2)
+    
+    # Bar chart for vitals
+    categories = ['Heart Rate\n(BPM)', 'Systolic BP\n(mmHg)', 'Diastolic BP\n(mmHg)', 'MAP\n(mmHg)']
+    values = [patient_data['heart_rate'], patient_data['systolic_bp'], 
+             patient_data['diastolic_bp'], patient_data['map']]
+    
+    # Color based on status
+    colors = []
+    if patient_data['hr_status'] == 'NORMAL':
+        colors.append('#667eea')
+    elif patient_data['hr_status'] == 'LOW':
+        colors.append('#dc3545')
+    else:
+        colors.append('#28a745')
+        
+    colors.append('#6c757d')  # SBP
+    colors.append('#6c757d')  # DBP
+    
+    if patient_data['map_status'] == 'NORMAL':
+        colors.append('#667eea')
+    elif patient_data['map_status'] == 'LOW':
+        colors.append('#dc3545')
+    else:
+        colors.append('#28a745')
+    
+    bars = ax1.bar(categories, values, color=colors, edgecolor='black', linewidth=2)
+    ax1.set_title('Patient Vital Signs', fontsize=16, fontweight='bold', pad=20)
+    ax1.set_ylabel('Value', fontsize=12, fontweight='bold')
+    ax1.grid(True, alpha=0.3, linestyle='--')
+    
+    # Add value labels on bars
+    for bar, v in zip(bars, values):
+        ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 1,
+                str(v), ha='center', va='bottom', fontweight='bold', fontsize=11)
+    
+    # Add reference lines (normal heart-rate band)
+    lower, upper = get_thresholds().bounds('heart_rate')
+    ax1.axhline(y=lower, color='gray', linestyle='--', alpha=0.5, label='Normal Lower Limit')
+    ax1.axhline(y=upper, color='gray', linestyle='--', alpha=0.5, label='Normal Upper Limit')
+    ax1.legend(fontsize=9)
+    
+    # Gauge for overall status
+    status_colors = {'NORMAL': '#667eea', 'ABNORMAL': '#ffc107', 'CRITICAL': '#dc3545'}
+    status = patient_data['overall']
+    color = status_colors.get(status, '#808080')
+    
+    # Create a donut chart for status
+    ax2.pie([1], colors=[color], radius=0.8, wedgeprops=dict(width=0.3, edgecolor='white'))
+    ax2.text(0, 0, status, ha='center', va='center', fontsize=20, fontweight='bold')
+    ax2.set_title('Overall Patient Status', fontsize=16, fontweight='bold', pad=20)
+    
+    # Add patient info (kept inside the canvas, there is no tight bbox pass)
+    if patient_title:
+        fig.suptitle(f"Hemodynamic Analysis Report\nPatient: {patient_data['patient_name']} (ID: {patient_data['patient_id']})", 
+                     fontsize=18, fontweight='bold', y=0.99)
+    fig.tight_layout(rect=(0, 0, 1, 0.95 if patient_title else 1))
+    
+    canvas.draw()
+    rgba = np.asarray(canvas.buffer_rgba())
+    
+    # Crop uniform background margins, keeping a 0.1 inch pad like savefig
+    background = np.round(np.array(to_rgba(CHART_FACECOLOR)) * 255).astype(np.uint8)
+    content = np.any(rgba != background, axis=2)
+    rows = np.flatnonzero(content.any(axis=1))
+    cols = np.flatnonzero(content.any(axis=0))
+    if len(rows) == 0:
+        return rgba.copy()
+    pad = int(round(0.1 * dpi))
+    top, bottom = max(rows[0] - pad, 0), min(rows[-1] + pad + 1, rgba.shape[0])
+    left, right = max(cols[0] - pad, 0), min(cols[-1] + pad + 1, rgba.shape[1])
+    return rgba[top:bottom, left:right].copy()
+
+@timed
+def encode_chart_image(rgba, format_type='png', thumbnail_size=None):
+    """Encode an RGBA chart buffer as PNG or JPG bytes with Pillow"""
+    from PIL import Image
+    
+    # The chart is fully opaque, so RGB keeps both formats smaller
+    image = Image.fromarray(rgba, 'RGBA').convert('RGB')
+    if thumbnail_size:
+        image.thumbnail(thumbnail_size)
+    
+    img_bytes = BytesIO()
+    if format_type.lower() in ('jpg', 'jpeg'):
+        image.save(img_bytes, format='JPEG', quality=90)
+    else:
+        image.save(img_bytes, format='PNG')
+    return img_bytes.getvalue()
+
+@timed
+def create_chart_image(patient_data, format_type='png', dpi=CHART_DPI):
+    """
+    Create chart image using matplotlib (no kaleido required)
+    The chart is rasterized once per record and DPI; PNG, JPG and 'thumbnail'
+    (a small PNG) are all encoded from the same cached RGBA buffer
+    """
+    rgba = get_export_cache().get_or_create(
+        patient_data, f'rgba@{dpi}', lambda: render_chart_rgba(patient_data, dpi))
+    
+    if format_type == 'thumbnail':
+        return BytesIO(encode_chart_image(rgba, 'png', THUMBNAIL_SIZE))
+    return BytesIO(encode_chart_image(rgba, format_type))
+
+def save_chart_as_image(patient_data, filename, format_type='png', dpi=CHART_DPI):
+    """Save chart as image file"""
+    with open(filename, 'wb') as f:
+        f.write(create_chart_image(patient_data, format_type, dpi).getvalue())
+    return filename
+
+def _status_color(status):
+    if status == 'NORMAL':
+        return '#667eea'
+    if status == 'LOW':
+        return '#dc3545'
+    return '#28a745'
+
+@lru_cache(maxsize=4)
+def _vitals_chart_template(thresholds):
+    """
+    Figure dict of the vitals chart without bar values, built once per threshold table
+    The layout, fonts and normal-range lines are the expensive, validated part.
+    Keyed on the table itself, which compares by contents.
+    """
+    import plotly.graph_objects as go
+    
+    fig = go.Figure(data=[
+        go.Bar(name='Values', x=VITALS_CHART_CATEGORIES, textposition='auto',
+               textfont=dict(size=14, color='white', family='Arial Black'))
+    ])
+    
+    fig.update_layout(
+        title={
+            'text': 'Patient Vitals Visualization',
+            'y':0.95,
+            'x':0.5,
+            'xanchor': 'center',
+            'yanchor': 'top',
+            'font': dict(size=20, family='Arial Black')
+        },
+        xaxis_title='Parameter',
+        yaxis_title='Value',
+        template='plotly_white',
+        height=500,
+        showlegend=False,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)'
+    )
+    
+    # Add horizontal lines for normal ranges (normal heart-rate band)
+    lower, upper = thresholds.bounds('heart_rate')
+    fig.add_hline(y=lower, line_dash="dash", line_color="gray", 
+                  annotation_text="Normal Lower Limit", annotation_position="bottom right")
+    fig.add_hline(y=upper, line_dash="dash", line_color="gray",
+                  annotation_text="Normal Upper Limit", annotation_position="top right")
+    
+    return fig.to_dict()
+
+@lru_cache(maxsize=VITALS_CHART_CACHE_SIZE)
+def _vitals_chart(vitals, thresholds):
+    """Figure dict of the vitals chart for one set of vitals"""
+    heart_rate, systolic_bp, diastolic_bp, map_value, hr_status, map_status = vitals
+    template = _vitals_chart_template(thresholds)
+    values = [heart_rate, systolic_bp, diastolic_bp, map_value]
+    colors = [_status_color(hr_status), VITALS_CHART_BP_COLOR, VITALS_CHART_BP_COLOR, _status_color(map_status)]
+    bar = dict(template['data'][0], y=values, text=[str(v) for v in values], marker={'color': colors})
+    return {'data': [bar], 'layout': template['layout']}
+
+@timed
+def create_vitals_chart(patient_data):
+    """
+    Create interactive Plotly chart for display
+    The figure dict for identical vitals is cached and shared by every session;
+    each call builds a new figure from it, which the caller may modify.
+    """
+    import plotly.graph_objects as go
+    
+    vitals = tuple(patient_data[name] for name in VITALS_CHART_FIELDS)
+    # The template was validated when it was built and only the bar values
+    # change, so the figure skips Plotly's per-property validation
+    return go.Figure(_vitals_chart(vitals, get_thresholds()), _validate=False)
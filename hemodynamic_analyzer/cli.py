@@ -0,0 +1,411 @@
+"""
+Headless command-line entry point
+
+    python -m hemodynamic_analyzer score vitals.csv -o scored.parquet --reports reports/ --format pdf
+
+The input (CSV or Parquet) is streamed chunk by chunk, so files larger than
+memory can be scored. Per-patient reports and cohort PDF pages are rendered
+in a process pool.
+
+    python -m hemodynamic_analyzer cohort ward.csv -o rounds.pdf
+    python -m hemodynamic_analyzer bundle ward.csv -o reports.zip
+    python -m hemodynamic_analyzer simulate --beds 40 | python -m hemodynamic_analyzer stream
+    python -m hemodynamic_analyzer serve --port 8080
+    python -m hemodynamic_analyzer export-history -o history.arrow
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from contextlib import ExitStack
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .archive import export_store
+from .batch import process_csv_in_chunks, process_parquet_in_batches, scored_chunk_records
+from .bundle import BUNDLE_FORMATS, write_bundle
+from .cohort import save_cohort_pdf
+from .core import generate_clinical_report
+from .exports import build_report_pdf, build_report_txt
+from .history import patient_id_from_number
+from .service import DEFAULT_HOST, DEFAULT_PORT, MAX_IN_FLIGHT, ScoringService
+from .store import DEFAULT_DB_PATH, HistoryStore
+from .stream import DEFAULT_WINDOW, StreamMonitor, format_snapshot, run_lines, serve_tcp, simulate_samples
+from .thresholds import get_thresholds, load_thresholds
+
+
+REPORT_BUILDERS = {
+    'txt': build_report_txt,
+    'pdf': build_report_pdf,
+}
+
+# Patient records per report-rendering task sent to a worker process
+REPORT_TASK_SIZE = 200
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in ('.parquet', '.pq')
+
+def render_reports(records, formats, directory):
+    """Write <patient_id>_report.<format> for each record; returns files written"""
+    written = 0
+    for record in records:
+        report_text = generate_clinical_report(record)
+        for format_type in formats:
+            path = os.path.join(directory, f"{record['patient_id']}_report.{format_type}")
+            with open(path, 'wb') as f:
+                f.write(REPORT_BUILDERS[format_type](report_text))
+            written += 1
+    return written
+
+class ScoredOutput:
+    """Appends scored chunks to a CSV or Parquet file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._parquet_writer = None
+        self._csv_header = True
+
+    def write(self, scored):
+        frame = scored.drop(columns='patient_number')
+        frame.insert(0, 'patient_id', [patient_id_from_number(n) for n in scored['patient_number'].tolist()])
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+        else:
+            frame.to_csv(self.path, mode='w' if self._csv_header else 'a', header=self._csv_header, index=False)
+            self._csv_header = False
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+def _scored_chunks(stack, input_path, first_patient_number, memory_limit_mb, progress):
+    if _is_parquet(input_path):
+        return process_parquet_in_batches(input_path, first_patient_number, progress_callback=progress)
+    input_file = stack.enter_context(open(input_path, 'rb'))
+    return process_csv_in_chunks(input_file, first_patient_number, memory_limit_mb, progress_callback=progress)
+
+def score_file(input_path, output_path, reports_dir=None, formats=('txt',), workers=None,
+               memory_limit_mb=64, first_patient_number=1, progress=None):
+    """
+    Score input_path into output_path, optionally rendering per-patient reports
+    workers=0 renders reports in this process. Returns (rows scored, report files written).
+    """
+    rows = reports = 0
+    pending = set()
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    # Bound in-flight tasks so a fast reader cannot queue the whole file in memory
+    max_pending = 2 * max(workers, 1)
+
+    with ExitStack() as stack:
+        pool = None
+        if reports_dir:
+            os.makedirs(reports_dir, exist_ok=True)
+            if workers:
+                pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+        output = ScoredOutput(output_path)
+        stack.callback(output.close)
+
+        def submit(records):
+            nonlocal reports, pending
+            if pool is None:
+                reports += render_reports(records, formats, reports_dir)
+                return
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                reports += sum(future.result() for future in done)
+            pending.add(pool.submit(render_reports, records, formats, reports_dir))
+
+        for scored in _scored_chunks(stack, input_path, first_patient_number, memory_limit_mb, progress):
+            output.write(scored)
+            rows += len(scored)
+            if reports_dir:
+                records = list(scored_chunk_records(scored))
+                for start in range(0, len(records), REPORT_TASK_SIZE):
+                    submit(records[start:start + REPORT_TASK_SIZE])
+        reports += sum(future.result() for future in pending)
+    return rows, reports
+
+def cohort_file(input_path, output_path, workers=None, memory_limit_mb=64, first_patient_number=1,
+                max_pages=None, progress=None):
+    """
+    Write one cohort PDF (a page per patient) for input_path; returns pages written
+    Records are scored as pages are built, so only the document grows with the
+    input; max_pages stops after that many patients. progress is called with
+    the number of pages built so far.
+    """
+    with ExitStack() as stack:
+        records = (record
+                   for scored in _scored_chunks(stack, input_path, first_patient_number, memory_limit_mb, None)
+                   for record in scored_chunk_records(scored))
+        # Stopped early by max_pages: close the reader before its input file
+        stack.callback(records.close)
+        return save_cohort_pdf(records, output_path, workers, max_pages=max_pages, progress=progress)
+
+def bundle_file(input_path, output_path, formats=BUNDLE_FORMATS, workers=None, memory_limit_mb=64,
+                first_patient_number=1, progress=None):
+    """
+    Write a ZIP of every report format per patient for input_path; returns patients written
+    Records are scored and rendered as the ZIP is written, so the input is
+    never held in memory.
+    """
+    with ExitStack() as stack:
+        records = (record
+                   for scored in _scored_chunks(stack, input_path, first_patient_number, memory_limit_mb, progress)
+                   for record in scored_chunk_records(scored))
+        return write_bundle(records, output_path, formats, workers)
+
+def _print_progress(fraction, rows, skipped):
+    skipped = f", {skipped:,} invalid rows skipped" if skipped else ''
+    print(f"\r{fraction:6.1%}  {rows:,} rows{skipped}", end='', file=sys.stderr, flush=True)
+
+def _print_pages(pages):
+    print(f"\r{pages:,} pages", end='', file=sys.stderr, flush=True)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m hemodynamic_analyzer',
+                                     description='Biomedical Hemodynamic Analyzer (headless)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    score = commands.add_parser('score', help='score a CSV/Parquet file of vitals',
+                                description='Score heart_rate/systolic_bp/diastolic_bp rows '
+                                            '(optional patient_name, mrn, age, timestamp columns).')
+    score.add_argument('input', help='input .csv or .parquet file')
+    score.add_argument('-o', '--output', required=True, help='scored output (.csv or .parquet)')
+    score.add_argument('--reports', metavar='DIR', help='also write one report per patient into DIR')
+    score.add_argument('--format', dest='formats', action='append', choices=sorted(REPORT_BUILDERS),
+                       help='report format, may be repeated (default: txt)')
+    score.add_argument('--workers', type=int, default=None,
+                       help='report-rendering processes (default: CPU count, 0 = in-process)')
+    score.add_argument('--memory-limit', type=int, default=64, metavar='MB',
+                       help='working-set budget per CSV chunk (default: 64)')
+    score.add_argument('--first-patient-number', type=int, default=1,
+                       help='patient number of the first row (default: 1)')
+    score.add_argument('-q', '--quiet', action='store_true', help='no progress output')
+    score.set_defaults(handler=_run_score)
+
+    cohort = commands.add_parser('cohort', help='build one PDF with a page per patient',
+                                 description='Build a multi-page cohort PDF (report text and chart '
+                                             'per patient) from a CSV/Parquet file of vitals.')
+    cohort.add_argument('input', help='input .csv or .parquet file')
+    cohort.add_argument('-o', '--output', required=True, help='output .pdf file')
+    cohort.add_argument('--workers', type=int, default=None,
+                        help='page-rendering processes (default: CPU count, 0 = in-process)')
+    cohort.add_argument('--memory-limit', type=int, default=64, metavar='MB',
+                        help='working-set budget per CSV chunk (default: 64)')
+    cohort.add_argument('--first-patient-number', type=int, default=1,
+                        help='patient number of the first row (default: 1)')
+    cohort.add_argument('--max-pages', type=int, default=None, metavar='N',
+                        help='stop after the first N patients (default: every row)')
+    cohort.add_argument('-q', '--quiet', action='store_true', help='no progress output')
+    cohort.set_defaults(handler=_run_cohort)
+
+    bundle = commands.add_parser('bundle', help='write every report format per patient into one ZIP',
+                                 description='Write the TXT, CSV and PDF reports and the PNG and JPG charts '
+                                             'of each patient in a CSV/Parquet file of vitals, or of stored '
+                                             'history rows, into one ZIP with a folder per patient.')
+    bundle.add_argument('input', nargs='?', help='input .csv or .parquet file (omit with --db)')
+    bundle.add_argument('-o', '--output', required=True, help='output .zip file')
+    bundle.add_argument('--format', dest='formats', action='append', choices=BUNDLE_FORMATS,
+                        help='file format, may be repeated (default: all)')
+    bundle.add_argument('--workers', type=int, default=None,
+                        help='rendering processes (default: CPU count, 0 = in-process)')
+    bundle.add_argument('--db', metavar='PATH', help='bundle stored history rows instead, newest first')
+    bundle.add_argument('--patient-id', help='with --db: only this patient ID')
+    bundle.add_argument('--status', choices=['NORMAL', 'ABNORMAL', 'CRITICAL'],
+                        help='with --db: only this overall status')
+    bundle.add_argument('--limit', type=int, default=None, help='with --db: at most this many rows')
+    bundle.add_argument('--memory-limit', type=int, default=64, metavar='MB',
+                        help='working-set budget per CSV chunk (default: 64)')
+    bundle.add_argument('--first-patient-number', type=int, default=1,
+                        help='patient number of the first row (default: 1)')
+    bundle.add_argument('-q', '--quiet', action='store_true', help='no progress output')
+    bundle.set_defaults(handler=_run_bundle)
+
+    stream = commands.add_parser('stream', help='ingest live bed_id,hr,sbp,dbp samples',
+                                 description='Ingest 1 Hz monitor samples (one "bed_id,hr,sbp,dbp" line '
+                                             'each) from stdin or TCP, classifying rolling windows.')
+    stream.add_argument('--listen', metavar='HOST:PORT', help='accept monitor connections instead of stdin')
+    stream.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help=f'samples per rolling window (default: {DEFAULT_WINDOW})')
+    stream.add_argument('--all', action='store_true', help='print every update, not only status changes')
+    stream.set_defaults(handler=_run_stream)
+
+    simulate = commands.add_parser('simulate', help='emit simulated bedside monitor samples',
+                                   description='Emit simulated "bed_id,hr,sbp,dbp" samples to stdout '
+                                               'or to a stream listener.')
+    simulate.add_argument('--beds', type=int, default=24, help='number of beds (default: 24)')
+    simulate.add_argument('--rate', type=float, default=1.0, help='samples per bed per second (0 = unthrottled)')
+    simulate.add_argument('--count', type=int, default=None, help='samples per bed (default: run forever)')
+    simulate.add_argument('--seed', type=int, default=None, help='random seed')
+    simulate.add_argument('--connect', metavar='HOST:PORT', help='send to a stream listener instead of stdout')
+    simulate.set_defaults(handler=_run_simulate)
+
+    serve = commands.add_parser('serve', help='run the HTTP scoring service',
+                                description='Serve POST /score, POST /score/batch, GET /metrics '
+                                            'and GET /health as JSON over HTTP.')
+    serve.add_argument('--host', default=DEFAULT_HOST, help=f'bind address (default: {DEFAULT_HOST})')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port (default: {DEFAULT_PORT})')
+    serve.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                       help=f'concurrent requests before answering 503 (default: {MAX_IN_FLIGHT})')
+    serve.add_argument('--db', metavar='PATH', help='also stream this history database as GET /history.csv')
+    serve.set_defaults(handler=_run_serve)
+
+    export_history = commands.add_parser('export-history', help='write the stored history to a file',
+                                         description='Write every stored record to CSV (streamed, optionally '
+                                                     'gzip-compressed), or with typed columns and categorical '
+                                                     'statuses to Parquet or Arrow IPC.')
+    export_history.add_argument('-o', '--output', required=True,
+                                help='output .csv, .csv.gz, .parquet or .arrow file')
+    export_history.add_argument('--db', default=DEFAULT_DB_PATH,
+                                help=f'history database (default: {DEFAULT_DB_PATH})')
+    export_history.set_defaults(handler=_run_export_history)
+
+    thresholds = commands.add_parser('thresholds', help='print the active threshold table as JSON',
+                                     description='Print the active threshold table (set HEMODYNAMIC_THRESHOLDS '
+                                                 'to a JSON file to use your own), or check a table file.')
+    thresholds.add_argument('--check', metavar='FILE', help='validate a threshold table file and show its ranges')
+    thresholds.set_defaults(handler=_run_thresholds)
+    return parser
+
+def _run_score(args):
+    start = time.perf_counter()
+    rows, reports = score_file(args.input, args.output, args.reports, args.formats or ['txt'],
+                               args.workers, args.memory_limit, args.first_patient_number,
+                               None if args.quiet else _print_progress)
+    elapsed = time.perf_counter() - start
+
+    if not args.quiet:
+        print(file=sys.stderr)
+    summary = f"Scored {rows:,} rows in {elapsed:.2f} s ({rows / elapsed:,.0f} rows/s)"
+    if args.reports:
+        summary += f", wrote {reports:,} report files to {args.reports}"
+    print(summary)
+
+def _run_cohort(args):
+    if args.max_pages is not None and args.max_pages < 1:
+        raise ValueError("--max-pages must be at least 1")
+    start = time.perf_counter()
+    pages = cohort_file(args.input, args.output, args.workers, args.memory_limit,
+                        args.first_patient_number, args.max_pages, None if args.quiet else _print_pages)
+    elapsed = time.perf_counter() - start
+
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"Wrote {pages:,} pages to {args.output} in {elapsed:.2f} s ({pages / elapsed:,.1f} pages/s)")
+
+def _run_bundle(args):
+    if (args.input is None) == (args.db is None):
+        raise ValueError("give either an input file or --db")
+    formats = args.formats or BUNDLE_FORMATS
+    start = time.perf_counter()
+    if args.db:
+        if not os.path.exists(args.db):
+            raise ValueError(f"no history database at {args.db}")
+        store = HistoryStore(args.db)
+        try:
+            records = store.matching_records(args.limit, patient_id=args.patient_id, overall=args.status)
+            patients = write_bundle(records, args.output, formats, args.workers)
+        finally:
+            store.close()
+    else:
+        patients = bundle_file(args.input, args.output, formats, args.workers, args.memory_limit,
+                               args.first_patient_number, None if args.quiet else _print_progress)
+        if not args.quiet:
+            print(file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {patients:,} patients ({patients * len(formats):,} files) to {args.output} "
+          f"in {elapsed:.2f} s ({patients / elapsed:,.1f} patients/s)")
+
+def _host_port(value):
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+def _run_stream(args):
+    monitor = StreamMonitor(args.window)
+
+    def on_update(snapshot):
+        if args.all or snapshot['changed']:
+            print(format_snapshot(snapshot), flush=True)
+
+    try:
+        if args.listen:
+            host, port = _host_port(args.listen)
+            print(f"Listening for monitor feeds on {host}:{port}", file=sys.stderr)
+            asyncio.run(serve_tcp(monitor, host, port, on_update))
+        else:
+            run_lines(monitor, sys.stdin, on_update)
+    except KeyboardInterrupt:
+        pass
+
+    print(f"\n{monitor.samples:,} samples from {len(monitor.beds)} beds "
+          f"({monitor.nbytes / 1024:.1f} KiB of window buffers)")
+    for snapshot in monitor.summary():
+        print(format_snapshot(snapshot))
+
+def _run_simulate(args):
+    samples = simulate_samples(args.beds, args.rate, args.count, args.seed)
+    try:
+        if args.connect:
+            with socket.create_connection(_host_port(args.connect)) as connection:
+                for line in samples:
+                    connection.sendall(line.encode('utf-8'))
+        else:
+            for line in samples:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+
+def _run_serve(args):
+    if args.db and not os.path.exists(args.db):
+        raise ValueError(f"no history database at {args.db}")
+    store = HistoryStore(args.db) if args.db else None
+    service = ScoringService(args.host, args.port, args.max_in_flight, store)
+
+    async def run():
+        await service.start()
+        print(f"Scoring service on http://{service.host}:{service.port}", file=sys.stderr)
+        await service.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+def _run_export_history(args):
+    if not os.path.exists(args.db):
+        raise ValueError(f"no history database at {args.db}")
+    start = time.perf_counter()
+    store = HistoryStore(args.db)
+    try:
+        rows = export_store(store, args.output)
+    finally:
+        store.close()
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {rows:,} records to {args.output} in {elapsed:.2f} s")
+
+def _run_thresholds(args):
+    if args.check:
+        table = load_thresholds(args.check)
+        print(f"{args.check}: version {table.version}")
+        for name in table.spec['parameters']:
+            print(f"  {table.label(name):<16} {table.normal_range(name, with_unit=True)}")
+        return
+    print(json.dumps(get_thresholds().spec, indent=2))
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.handler(args)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
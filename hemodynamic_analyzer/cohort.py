@@ -0,0 +1,154 @@
+"""
+Cohort PDF: one page per patient (report text and chart) in a single document
+
+Page text and charts are built in worker processes, a task of
+COHORT_TASK_SIZE records at a time, and added to a single FPDF object in
+record order as each task comes back. Records are read lazily and only a
+bounded number of tasks is in flight; the finished document is returned
+whole, as fpdf builds it in memory. Charts are drawn without the
+patient title, so patients with the same chart_key share one rendered and
+embedded image. The report uses the core Helvetica font, which PDF viewers
+provide, so no font data is embedded at all.
+"""
+import hashlib
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from io import BytesIO
+from itertools import chain, islice
+
+from .charts import chart_key, render_chart_rgba
+from .core import generate_clinical_report
+from .profiling import timed
+
+
+# Charts are printed about 19 cm wide, 100 DPI is plenty for that
+COHORT_CHART_DPI = 100
+CHART_PALETTE_COLORS = 64
+PAGE_MARGIN = 10
+LINE_HEIGHT = 5
+# Records per page-building task sent to a worker process
+COHORT_TASK_SIZE = 8
+
+def page_text(record):
+    """Report text for one page, made safe for the PDF core fonts"""
+    return generate_clinical_report(record).encode('latin-1', 'replace').decode('latin-1')
+
+def page_chart_png(record, dpi=COHORT_CHART_DPI):
+    """Untitled chart for one page as a palette PNG"""
+    from PIL import Image
+
+    image = Image.fromarray(render_chart_rgba(record, dpi, patient_title=False), 'RGBA').convert('RGB')
+    # The chart is a few flat colors plus antialiasing; a palette PNG is
+    # about a third of the RGB size and fpdf embeds it as an indexed image.
+    # Fast octree is about twice as quick as the default median cut here and
+    # gives a smaller file
+    buffer = BytesIO()
+    image.quantize(CHART_PALETTE_COLORS, method=Image.Quantize.FASTOCTREE).save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+def render_cohort_pages(task, dpi=COHORT_CHART_DPI):
+    """[(page text, chart PNG or None), ...] for a task of (record, draw chart) pairs"""
+    return [(page_text(record), page_chart_png(record, dpi) if draw else None) for record, draw in task]
+
+@timed
+def build_cohort_pdf(records, workers=None, dpi=COHORT_CHART_DPI, max_pages=None, progress=None):
+    """
+    Build a multi-page PDF with one page per patient record and return its bytes
+    records may be any iterable and is consumed as pages are built; with
+    max_pages only that many records are read. workers=0 builds everything in
+    this process; otherwise page content is built by a process pool (default:
+    one worker per CPU) unless everything fits in one task. progress, if
+    given, is called with the number of pages added after each task.
+    """
+    from fpdf import FPDF
+
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    records = iter(records) if max_pages is None else islice(records, max_pages)
+    # Chart keys already drawn or queued, and the key of every queued page in order
+    drawn = set()
+    page_keys = deque()
+
+    def tasks():
+        while True:
+            chunk = list(islice(records, COHORT_TASK_SIZE))
+            if not chunk:
+                return
+            task = []
+            for record in chunk:
+                key = chart_key(record)
+                task.append((record, key not in drawn))
+                drawn.add(key)
+                page_keys.append(key)
+            yield task
+
+    pdf = FPDF()
+    pdf.set_margins(PAGE_MARGIN, PAGE_MARGIN)
+    pdf.set_auto_page_break(False)
+    pdf.set_font("Arial", size=10)
+    width = pdf.w - 2 * PAGE_MARGIN
+    # fpdf 1.7 embeds an image once per file name, so each distinct chart
+    # is written to one file and every page that shows it refers to it
+    chart_files = {}
+    pages = 0
+
+    def add(rendered):
+        nonlocal pages
+        for text, png in rendered:
+            key = page_keys.popleft()
+            if png is not None:
+                path = chart_files[key] = os.path.join(directory, hashlib.sha256(png).hexdigest()[:16] + '.png')
+                with open(path, 'wb') as f:
+                    f.write(png)
+            pdf.add_page()
+            pdf.multi_cell(width, LINE_HEIGHT, text)
+            pdf.image(chart_files[key], x=PAGE_MARGIN, y=pdf.get_y() + LINE_HEIGHT, w=width)
+        pages += len(rendered)
+        if progress is not None:
+            progress(pages)
+
+    render = partial(render_cohort_pages, dpi=dpi)
+    with ExitStack() as stack:
+        directory = stack.enter_context(tempfile.TemporaryDirectory(prefix='cohort-'))
+        tasks = tasks()
+        first = next(tasks, [])
+        if len(first) < COHORT_TASK_SIZE:
+            # Everything fits in one task: a pool would only add its start-up time
+            workers = 0
+        tasks = chain([first], tasks) if first else tasks
+        if not workers:
+            for task in tasks:
+                add(render(task))
+        else:
+            pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+            # Bound in-flight tasks so rendering cannot run ahead of the document
+            max_pending = 2 * workers
+            pending = deque()
+            for task in tasks:
+                if len(pending) >= max_pending:
+                    add(pending.popleft().result())
+                pending.append(pool.submit(render, task))
+            while pending:
+                add(pending.popleft().result())
+
+        # fpdf 1.x returns a latin-1 str, fpdf2 returns a bytearray
+        output = pdf.output(dest='S')
+    return output.encode('latin-1') if isinstance(output, str) else bytes(output)
+
+def save_cohort_pdf(records, filename, workers=None, dpi=COHORT_CHART_DPI, max_pages=None, progress=None):
+    """Save the cohort PDF to a file; returns the number of pages"""
+    pages = 0
+
+    def count(written):
+        nonlocal pages
+        pages = written
+        if progress is not None:
+            progress(written)
+
+    data = build_cohort_pdf(records, workers, dpi, max_pages, count)
+    with open(filename, 'wb') as f:
+        f.write(data)
+    return pages
@@ -0,0 +1,319 @@
+"""
+Hemodynamic calculations, threshold classification and clinical report text
+
+Pure Python with no third-party imports, so it is cheap to import from
+workers, scripts and services.
+"""
+import math
+import sys
+import unicodedata
+from collections.abc import Mapping
+
+from .profiling import timed
+from .thresholds import get_thresholds
+
+# ============================================================================
+# CALCULATION FUNCTIONS (Modular Design)
+# ============================================================================
+
+# Plausible range of each vital (inclusive), as allowed by the input form;
+# readings outside it are device or transmission errors, not patients
+VITAL_RANGES = {
+    'heart_rate': (0, 300),
+    'systolic_bp': (0, 300),
+    'diastolic_bp': (0, 200),
+}
+# Plausible age in years (inclusive), as allowed by the input form
+AGE_RANGE = (0, 120)
+
+def check_vitals(heart_rate, systolic_bp, diastolic_bp):
+    """Raise ValueError unless every vital is a finite number within VITAL_RANGES"""
+    for (name, (low, high)), value in zip(VITAL_RANGES.items(), (heart_rate, systolic_bp, diastolic_bp)):
+        # Compared before isfinite(), which cannot take ints too large for a float
+        if not low <= value <= high or not math.isfinite(value):
+            raise ValueError(f"{name} must be between {low} and {high}, got {value!r}")
+
+@timed
+def calculate_all_parameters(heart_rate, systolic_bp, diastolic_bp):
+    """
+    Calculate all hemodynamic parameters from patient vitals
+    Using standard medical formulas
+    """
+    
+    # 1. Mean Arterial Pressure (MAP)
+    # Formula: DBP + 1/3(SBP - DBP)
+    map_value = diastolic_bp + (systolic_bp - diastolic_bp) / 3
+    
+    # 2. Shock Index (SI)
+    # Formula: HR / SBP
+    shock_index = heart_rate / systolic_bp if systolic_bp > 0 else 0
+    
+    # 3. Pulse Pressure (PP)
+    # Formula: SBP - DBP
+    pulse_pressure = systolic_bp - diastolic_bp
+    
+    # 4. Rate Pressure Product (RPP)
+    # Formula: HR × SBP
+    rpp = heart_rate * systolic_bp
+    
+    return {
+        'map': round(map_value, 2),
+        'shock_index': round(shock_index, 2),
+        'pulse_pressure': pulse_pressure,
+        'rpp': rpp
+    }
+
+# Every status value, in the order used for compact integer codes
+STATUS_CODES = ('LOW', 'NORMAL', 'HIGH', 'ELEVATED', 'CRITICAL', 'ABNORMAL')
+STATUS_INDEX = {status: code for code, status in enumerate(STATUS_CODES)}
+
+# Clinical message templates, keyed by parameter and status code
+# ({hr_range} is filled in from the active threshold table)
+STATUS_MESSAGES = {
+    'hr': {
+        'LOW': 'Bradycardia: Heart rate {heart_rate} BPM is below normal range ({hr_range})',
+        'NORMAL': 'Normal heart rate: {heart_rate} BPM (within {hr_range} range)',
+        'HIGH': 'Tachycardia: Heart rate {heart_rate} BPM is above normal range ({hr_range})',
+    },
+    'bp': {
+        'LOW': 'Hypotension: BP {systolic_bp}/{diastolic_bp} mmHg is below normal range',
+        'HIGH': 'Hypertension: BP {systolic_bp}/{diastolic_bp} mmHg is above normal range',
+        'NORMAL': 'Normal blood pressure: {systolic_bp}/{diastolic_bp} mmHg',
+    },
+    'map': {
+        'LOW': 'Low MAP: {map} mmHg - Risk of inadequate organ perfusion',
+        'NORMAL': 'Normal MAP: {map} mmHg - Adequate organ perfusion',
+        'HIGH': 'High MAP: {map} mmHg - Increased cardiac workload',
+    },
+    'si': {
+        'LOW': 'Low shock index: {shock_index} - Hemodynamically stable',
+        'NORMAL': 'Normal shock index: {shock_index} - Within normal range',
+        'ELEVATED': 'Elevated shock index: {shock_index} - Monitor closely',
+        'CRITICAL': 'CRITICAL: Shock index {shock_index} - Immediate intervention required',
+    },
+}
+
+# Overall status -> (color, alert, priority)
+OVERALL_ALERTS = {
+    'CRITICAL': ('#FF4B4B', '⚠️ CRITICAL CONDITION - Immediate Medical Intervention Required!', 1),
+    'ABNORMAL': ('#ffc107', '⚠️ Abnormal Parameters Detected - Medical Review Recommended', 2),
+    'NORMAL': ('#28a745', '✅ Patient Stable - All Parameters Within Normal Range', 3),
+}
+
+def _message_values(heart_rate, systolic_bp, diastolic_bp, map_value, shock_index, hr_range=None):
+    return {
+        'heart_rate': heart_rate,
+        'systolic_bp': systolic_bp,
+        'diastolic_bp': diastolic_bp,
+        'map': map_value,
+        'shock_index': shock_index,
+        'hr_range': hr_range or get_thresholds().normal_range('heart_rate', with_unit=True)
+    }
+
+def describe_status(heart_rate, systolic_bp, diastolic_bp, map_value, shock_index, status, hr_range=None):
+    """
+    Build the clinical messages, alert and color for a set of status codes
+    hr_range (the heart-rate normal range text) may be passed in by callers
+    describing many readings, so the threshold table is not asked every time.
+    """
+    values = _message_values(heart_rate, systolic_bp, diastolic_bp, map_value, shock_index, hr_range)
+    color, alert, priority = OVERALL_ALERTS[status['overall']]
+    return {
+        'hr_message': STATUS_MESSAGES['hr'][status['hr_status']].format(**values),
+        'bp_message': STATUS_MESSAGES['bp'][status['bp_status']].format(**values),
+        'map_message': STATUS_MESSAGES['map'][status['map_status']].format(**values),
+        'si_message': STATUS_MESSAGES['si'][status['si_status']].format(**values),
+        'color': color,
+        'alert': alert,
+        'priority': priority
+    }
+
+@timed
+def classify_statuses(heart_rate, systolic_bp, diastolic_bp, calculated):
+    """
+    Status of each parameter and the overall status, without messages
+    Cut-offs come from the active threshold table (see thresholds.py)
+    """
+    thresholds = get_thresholds()
+    status = {}
+    
+    # Heart Rate, MAP and Shock Index: one band lookup each
+    status['hr_status'] = thresholds.classify('heart_rate', heart_rate)
+    status['map_status'] = thresholds.classify('map', calculated['map'])
+    status['si_status'] = thresholds.classify('shock_index', calculated['shock_index'])
+    
+    # Blood Pressure: LOW if either pressure is low, else HIGH if either is high
+    systolic = thresholds.classify('systolic_bp', systolic_bp)
+    diastolic = thresholds.classify('diastolic_bp', diastolic_bp)
+    if systolic == 'LOW' or diastolic == 'LOW':
+        status['bp_status'] = 'LOW'
+    elif systolic == 'HIGH' or diastolic == 'HIGH':
+        status['bp_status'] = 'HIGH'
+    else:
+        status['bp_status'] = 'NORMAL'
+    
+    # Overall Patient Classification
+    if status['si_status'] == 'CRITICAL':
+        status['overall'] = 'CRITICAL'
+    elif (status['si_status'] == 'ELEVATED' or
+          status['map_status'] != 'NORMAL' or
+          status['hr_status'] != 'NORMAL' or
+          status['bp_status'] != 'NORMAL'):
+        status['overall'] = 'ABNORMAL'
+    else:
+        status['overall'] = 'NORMAL'
+    return status
+
+@timed
+def classify_parameters(heart_rate, systolic_bp, diastolic_bp, calculated):
+    """
+    Classify each parameter as NORMAL, ABNORMAL, or CRITICAL
+    Returns the statuses plus their messages, alert, color and priority
+    """
+    status = classify_statuses(heart_rate, systolic_bp, diastolic_bp, calculated)
+    status.update(describe_status(heart_rate, systolic_bp, diastolic_bp,
+                                  calculated['map'], calculated['shock_index'], status))
+    return status
+
+# ============================================================================
+# PATIENT RECORDS
+# ============================================================================
+
+def patient_key(patient_name, mrn=None):
+    """
+    Stable key linking repeated visits of one patient
+    The MRN identifies the patient when given; otherwise the name does,
+    compared case-insensitively with whitespace collapsed, so "Ahmed  Ali"
+    and "ahmed ali" are the same patient.
+    """
+    if mrn is not None and str(mrn).strip():
+        return "mrn:" + "".join(str(mrn).split()).upper()
+    name = unicodedata.normalize('NFKC', str(patient_name or ""))
+    return "name:" + " ".join(name.casefold().split())
+
+# Keys of a patient record, in display/export order
+VALUE_FIELDS = ('patient_id', 'patient_name', 'patient_key', 'timestamp', 'age', 'heart_rate', 'systolic_bp',
+                'diastolic_bp', 'map', 'shock_index', 'pulse_pressure', 'rpp')
+RECORD_STATUS_FIELDS = ('hr_status', 'bp_status', 'map_status', 'si_status')
+RECORD_MESSAGE_FIELDS = ('hr_message', 'bp_message', 'map_message', 'si_message')
+RECORD_FIELDS = VALUE_FIELDS + RECORD_STATUS_FIELDS + RECORD_MESSAGE_FIELDS + ('overall', 'alert', 'color')
+
+# Status key -> slot holding its STATUS_CODES index
+_CODE_SLOTS = {'hr_status': 'hr_code', 'bp_status': 'bp_code', 'map_status': 'map_code',
+               'si_status': 'si_code', 'overall': 'overall_code'}
+# Message key -> (STATUS_MESSAGES group, status key)
+_MESSAGE_SOURCES = {'hr_message': ('hr', 'hr_status'), 'bp_message': ('bp', 'bp_status'),
+                    'map_message': ('map', 'map_status'), 'si_message': ('si', 'si_status')}
+# Overall-alert key -> position in OVERALL_ALERTS entries
+_ALERT_FIELDS = {'color': 0, 'alert': 1}
+
+class PatientRecord(Mapping):
+    """
+    One analyzed patient, read like a dict (record['map'], dict(record), ...)
+    Statuses are kept as STATUS_CODES indices; the messages, alert and color
+    are not stored but rendered from the shared templates when looked up, so
+    a record holds little beyond its own values.
+    """
+
+    __slots__ = VALUE_FIELDS + tuple(_CODE_SLOTS.values())
+
+    def __init__(self, patient_id, patient_name, patient_key, timestamp, age, heart_rate, systolic_bp,
+                 diastolic_bp, map_value, shock_index, pulse_pressure, rpp, status):
+        self.patient_id = patient_id
+        self.patient_name = patient_name
+        # None stands for patient_key(patient_name), derived on access
+        self.patient_key = None if patient_key is None else sys.intern(patient_key)
+        self.timestamp = sys.intern(str(timestamp))
+        self.age = age
+        self.heart_rate = heart_rate
+        self.systolic_bp = systolic_bp
+        self.diastolic_bp = diastolic_bp
+        self.map = map_value
+        self.shock_index = shock_index
+        self.pulse_pressure = pulse_pressure
+        self.rpp = rpp
+        for key, slot in _CODE_SLOTS.items():
+            setattr(self, slot, STATUS_INDEX[status[key]])
+
+    def __getitem__(self, key):
+        slot = _CODE_SLOTS.get(key)
+        if slot is not None:
+            return STATUS_CODES[getattr(self, slot)]
+        if key in _MESSAGE_SOURCES:
+            group, status_key = _MESSAGE_SOURCES[key]
+            values = _message_values(self.heart_rate, self.systolic_bp, self.diastolic_bp,
+                                     self.map, self.shock_index)
+            return STATUS_MESSAGES[group][self[status_key]].format(**values)
+        if key in _ALERT_FIELDS:
+            return OVERALL_ALERTS[self['overall']][_ALERT_FIELDS[key]]
+        if key == 'patient_key':
+            return self.patient_key or patient_key(self.patient_name)
+        if key in VALUE_FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(RECORD_FIELDS)
+
+    def __len__(self):
+        return len(RECORD_FIELDS)
+
+    def __repr__(self):
+        return f"PatientRecord({self.patient_id!r}, {self.patient_name!r}, overall={self['overall']!r})"
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+def build_patient_record(patient_id, patient_name, timestamp, age,
+                         heart_rate, systolic_bp, diastolic_bp, calculated, status, key=None):
+    """
+    Assemble the patient record stored in current_patient and history
+    status needs the status keys only; any messages in it are not kept.
+    key defaults to patient_key(patient_name).
+    """
+    return PatientRecord(patient_id, patient_name, key, timestamp, age, heart_rate, systolic_bp, diastolic_bp,
+                         calculated['map'], calculated['shock_index'], calculated['pulse_pressure'],
+                         calculated['rpp'], status)
+
+@timed
+def generate_clinical_report(patient_data):
+    """
+    Generate comprehensive clinical report as formatted string
+    """
+    report = []
+    report.append("=" * 80)
+    report.append("                    BIOMEDICAL HEMODYNAMIC ANALYSIS REPORT")
+    report.append("=" * 80)
+    report.append(f"Report ID: {patient_data['patient_id']}")
+    report.append(f"Patient Name: {patient_data['patient_name']}")
+    report.append(f"Age: {patient_data['age']} years")
+    report.append(f"Date & Time: {patient_data['timestamp']}")
+    report.append("-" * 80)
+    report.append("PATIENT VITAL SIGNS:")
+    report.append(f"  • Heart Rate: {patient_data['heart_rate']} BPM ({patient_data['hr_status']})")
+    report.append(f"  • Systolic Blood Pressure: {patient_data['systolic_bp']} mmHg")
+    report.append(f"  • Diastolic Blood Pressure: {patient_data['diastolic_bp']} mmHg")
+    report.append("-" * 80)
+    report.append("CALCULATED HEMODYNAMIC PARAMETERS:")
+    report.append(f"  • Mean Arterial Pressure (MAP): {patient_data['map']} mmHg ({patient_data['map_status']})")
+    report.append(f"  • Shock Index (SI): {patient_data['shock_index']} ({patient_data['si_status']})")
+    report.append(f"  • Pulse Pressure: {patient_data['pulse_pressure']} mmHg")
+    report.append(f"  • Rate Pressure Product (RPP): {patient_data['rpp']}")
+    report.append("-" * 80)
+    report.append("CLINICAL INTERPRETATION:")
+    report.append(f"  • Heart Rate: {patient_data['hr_message']}")
+    report.append(f"  • Blood Pressure: {patient_data['bp_message']}")
+    report.append(f"  • MAP Status: {patient_data['map_message']}")
+    report.append(f"  • Shock Risk: {patient_data['si_message']}")
+    report.append("-" * 80)
+    report.append(f"OVERALL STATUS: {patient_data['overall']}")
+    report.append(f"CLINICAL ALERT: {patient_data['alert']}")
+    report.append("=" * 80)
+    report.append("Generated by Biomedical Hemodynamic Analyzer")
+    report.append("Advanced Patient Monitoring & Risk Assessment System")
+    
+    return "\n".join(report)
@@ -0,0 +1,104 @@
+"""
+TXT/CSV/PDF report builders and the cached export entry point
+
+fpdf is imported only when a PDF is actually built.
+"""
+import csv
+from io import StringIO
+
+from .cache import get_export_cache
+from .charts import CHART_DPI, create_chart_image
+from .core import generate_clinical_report
+from .profiling import timed
+from .thresholds import get_thresholds
+
+
+# Parameter rows of the CSV report and the status column shown next to each
+REPORT_CSV_PARAMETERS = [
+    ('heart_rate', 'hr_status'),
+    ('systolic_bp', None),
+    ('diastolic_bp', None),
+    ('map', 'map_status'),
+    ('shock_index', 'si_status'),
+    ('pulse_pressure', None),
+    ('rpp', None),
+]
+
+
+@timed
+def build_report_txt(report_text):
+    """Build TXT report in memory and return its bytes"""
+    return report_text.encode('utf-8')
+
+@timed
+def build_report_csv(patient_data):
+    """Build CSV report in memory and return its bytes"""
+    thresholds = get_thresholds()
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['Parameter', 'Value', 'Status', 'Normal Range', 'Unit'])
+    writer.writerow(['Patient ID', patient_data['patient_id'], '', '', ''])
+    writer.writerow(['Patient Name', patient_data['patient_name'], '', '', ''])
+    writer.writerow(['Timestamp', patient_data['timestamp'], '', '', ''])
+    writer.writerow(['Age', patient_data['age'], '', '', 'years'])
+    for name, status_key in REPORT_CSV_PARAMETERS:
+        writer.writerow([thresholds.label(name), patient_data[name], patient_data[status_key] if status_key else '',
+                         thresholds.normal_range(name), thresholds.unit(name)])
+    writer.writerow(['Overall Status', patient_data['overall'], '', '', ''])
+    writer.writerow(['Thresholds Version', thresholds.version, '', '', ''])
+    return buffer.getvalue().encode('utf-8')
+
+@timed
+def build_report_pdf(report_text):
+    """Build PDF report in memory and return its bytes"""
+    from fpdf import FPDF
+    
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=10)
+    
+    for line in report_text.split('\n'):
+        # Handle encoding issues
+        line = line.encode('latin-1', 'replace').decode('latin-1')
+        pdf.cell(200, 5, txt=line, ln=True, align='L')
+    
+    # fpdf 1.x returns a latin-1 str, fpdf2 returns a bytearray
+    output = pdf.output(dest='S')
+    return output.encode('latin-1') if isinstance(output, str) else bytes(output)
+
+@timed
+def save_report_as_txt(report_text, filename):
+    """Save report as TXT file"""
+    with open(filename, 'wb') as f:
+        f.write(build_report_txt(report_text))
+    return filename
+
+@timed
+def save_report_as_csv(patient_data, filename):
+    """Save report as CSV file"""
+    with open(filename, 'wb') as f:
+        f.write(build_report_csv(patient_data))
+    return filename
+
+@timed
+def save_report_as_pdf(report_text, filename):
+    """Save report as PDF file"""
+    with open(filename, 'wb') as f:
+        f.write(build_report_pdf(report_text))
+    return filename
+
+@timed
+def export_report(patient_data, format_type, dpi=CHART_DPI):
+    """
+    Return the export for a patient record as bytes, served from the shared cache
+    format_type is one of 'txt', 'csv', 'pdf', 'png', 'jpg' or 'thumbnail'
+    """
+    builders = {
+        'txt': lambda: build_report_txt(generate_clinical_report(patient_data)),
+        'csv': lambda: build_report_csv(patient_data),
+        'pdf': lambda: build_report_pdf(generate_clinical_report(patient_data)),
+    }
+    if format_type in builders:
+        return get_export_cache().get_or_create(patient_data, format_type, builders[format_type])
+    return get_export_cache().get_or_create(
+        patient_data, f'{format_type}@{dpi}', lambda: create_chart_image(patient_data, format_type, dpi).getvalue())
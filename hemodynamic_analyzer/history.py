@@ -0,0 +1,416 @@
+"""
+Columnar, typed patient-history store
+
+Vitals are kept as int16, derived values as float32 and statuses as uint8
+codes in growable NumPy arrays. Messages, alerts and colors are not stored;
+they are rebuilt from the status codes when a full record is needed.
+
+A history backed by the shared HistoryStore keeps at most its memory budget
+of rows; older rows are spilled (dropped from memory and read back from the
+store on demand). SessionRegistry reports what every live session holds.
+"""
+import os
+import sys
+import threading
+import weakref
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from .core import STATUS_CODES, STATUS_INDEX, build_patient_record
+from .profiling import timed
+
+
+# Numeric columns and their storage dtype
+NUMERIC_COLUMNS = {
+    'patient_number': np.int32,
+    'age': np.int16,
+    'heart_rate': np.int16,
+    'systolic_bp': np.int16,
+    'diastolic_bp': np.int16,
+    'map': np.float32,
+    'shock_index': np.float32,
+    'pulse_pressure': np.int16,
+    'rpp': np.int32,
+    'hr_status': np.uint8,
+    'bp_status': np.uint8,
+    'map_status': np.uint8,
+    'si_status': np.uint8,
+    'overall': np.uint8,
+}
+STATUS_COLUMNS = ['hr_status', 'bp_status', 'map_status', 'si_status', 'overall']
+TEXT_COLUMNS = ['patient_name', 'patient_key', 'timestamp']
+
+# Stored in place of a missing age
+MISSING_AGE = -1
+
+# Bytes of history one session may hold in memory before its oldest rows are spilled
+DEFAULT_SESSION_BUDGET = int(float(os.environ.get('HEMODYNAMIC_SESSION_BUDGET_MB', '4')) * 1024 * 1024)
+# Columns whose session-wide mean (PatientHistory.mean) survives spilling
+SUMMED_COLUMNS = ['heart_rate', 'systolic_bp', 'diastolic_bp', 'map', 'shock_index', 'pulse_pressure', 'rpp']
+
+# Column order of the DataFrame view (matches build_patient_record)
+FRAME_COLUMNS = ['patient_id', 'patient_name', 'patient_key', 'timestamp', 'age', 'heart_rate', 'systolic_bp',
+                 'diastolic_bp', 'map', 'shock_index', 'pulse_pressure', 'rpp'] + STATUS_COLUMNS
+MESSAGE_COLUMNS = ['hr_message', 'bp_message', 'map_message', 'si_message', 'alert', 'color']
+# Records per DataFrame yielded by records_frames()
+RECORDS_CHUNK_ROWS = 5000
+
+def patient_id_from_number(number):
+    return f"PAT-{number:04d}"
+
+def _patient_number(patient_id):
+    return int(patient_id.rsplit('-', 1)[-1])
+
+def records_frame(records):
+    """DataFrame of patient records with their messages, alert and color (the CSV export columns)"""
+    records = list(records)
+    frame = pd.DataFrame({name: [r[name] for r in records] for name in FRAME_COLUMNS + MESSAGE_COLUMNS})
+    frame['age'] = pd.array(frame['age'], dtype='Int16')
+    return frame
+
+def records_frames(records, chunk_rows=RECORDS_CHUNK_ROWS):
+    """records_frame() of an iterable of records, chunk_rows records at a time"""
+    records = iter(records)
+    while chunk := list(islice(records, chunk_rows)):
+        yield records_frame(chunk)
+
+class PatientHistory:
+    """
+    Append-only columnar history of analyzed patients
+    Arrays grow by doubling, so append is amortized O(1). to_frame() builds
+    a DataFrame on demand whose integer columns are views of the arrays, so
+    no copy of the history is cached or concatenated.
+
+    With a store, every row is also written to it under session_id, and when
+    nbytes exceeds budget_bytes the oldest rows are spilled down to about
+    half the budget. len(), mean(), count_status(), record() and
+    iter_records() cover spilled rows too; column() and to_frame() only the
+    rows held in memory.
+    """
+
+    def __init__(self, capacity=64, store=None, session_id=None, budget_bytes=None):
+        self.store = store
+        self.session_id = session_id
+        self.budget_bytes = budget_bytes if store is not None else None
+        self._initial_capacity = capacity
+        self._reset()
+
+    def _reset(self):
+        capacity = self._initial_capacity
+        self._size = 0
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in NUMERIC_COLUMNS.items()}
+        self._text = {name: [] for name in TEXT_COLUMNS}
+        # Occurrences of each distinct string per text column and the bytes of those
+        # strings, kept up to date so nbytes never rescans the columns
+        self._text_counts = {name: {} for name in TEXT_COLUMNS}
+        self._text_bytes = 0
+        self._spilled = 0
+        self._spilled_sums = dict.fromkeys(SUMMED_COLUMNS, 0.0)
+        self._spilled_counts = {name: np.zeros(len(STATUS_CODES), dtype=np.int64) for name in STATUS_COLUMNS}
+        # Store rows of this session with a larger id belong to this history (see clear())
+        self._after_id = 0
+
+    def __len__(self):
+        return self._spilled + self._size
+
+    @property
+    def resident(self):
+        """Rows held in memory"""
+        return self._size
+
+    @property
+    def spilled(self):
+        """Rows dropped from memory; they are read back from the store"""
+        return self._spilled
+
+    @property
+    def capacity(self):
+        return len(self._columns['heart_rate'])
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held by the stored rows (arrays + text)
+        Each distinct string of a text column is counted once. O(1): the text
+        bytes are a running total kept by append, extend_frame and spilling.
+        """
+        total = sum(array.nbytes for array in self._columns.values())
+        total += sum(sys.getsizeof(values) for values in self._text.values())
+        return total + self._text_bytes
+
+    def _add_text(self, name, values):
+        """Append values to a text column, counting the strings it did not hold yet"""
+        counts = self._text_counts[name]
+        for value in values:
+            n = counts.get(value, 0)
+            if not n:
+                self._text_bytes += sys.getsizeof(value)
+            counts[value] = n + 1
+        self._text[name].extend(values)
+
+    def _drop_text(self, name, n):
+        """Remove the n oldest values of a text column, uncounting strings no longer held"""
+        counts = self._text_counts[name]
+        values = self._text[name]
+        for value in values[:n]:
+            left = counts[value] - 1
+            if left:
+                counts[value] = left
+            else:
+                del counts[value]
+                self._text_bytes -= sys.getsizeof(value)
+        del values[:n]
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        if needed <= self.capacity:
+            return
+        capacity = max(self.capacity * 2, needed)
+        for name, array in self._columns.items():
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            self._columns[name] = grown
+
+    def _enforce_budget(self):
+        if self.budget_bytes is None or self._size == 0:
+            return
+        nbytes = self.nbytes
+        if nbytes > self.budget_bytes:
+            # Keep the newest rows filling about half the budget, so spills are rare
+            self._spill(self._size - int(self._size * self.budget_bytes / 2 / nbytes))
+
+    def _spill(self, n):
+        """Drop the n oldest rows from memory, keeping their sums and status counts"""
+        columns = self._columns
+        for name in SUMMED_COLUMNS:
+            self._spilled_sums[name] += float(columns[name][:n].sum(dtype=np.float64))
+        for name in STATUS_COLUMNS:
+            self._spilled_counts[name] += np.bincount(columns[name][:n], minlength=len(STATUS_CODES))
+
+        keep = self._size - n
+        capacity = max(keep * 2, self._initial_capacity)
+        for name, array in columns.items():
+            kept = np.zeros(capacity, dtype=array.dtype)
+            kept[:keep] = array[n:self._size]
+            columns[name] = kept
+        for name in TEXT_COLUMNS:
+            self._drop_text(name, n)
+        self._size = keep
+        self._spilled += n
+
+    def append(self, record):
+        """Append one patient record (as built by build_patient_record)"""
+        if self.store is not None:
+            self.store.insert_records([record], self.session_id)
+        self._reserve(1)
+        i = self._size
+        columns = self._columns
+        columns['patient_number'][i] = _patient_number(record['patient_id'])
+        columns['age'][i] = MISSING_AGE if record['age'] is None else record['age']
+        for name in ('heart_rate', 'systolic_bp', 'diastolic_bp', 'map', 'shock_index', 'pulse_pressure', 'rpp'):
+            columns[name][i] = record[name]
+        for name in STATUS_COLUMNS:
+            columns[name][i] = STATUS_INDEX[record[name]]
+        self._add_text('patient_name', [record['patient_name']])
+        self._add_text('patient_key', [record['patient_key']])
+        self._add_text('timestamp', [sys.intern(str(record['timestamp']))])
+        self._size += 1
+        self._enforce_budget()
+
+    def check_frame(self, frame):
+        """Raise ValueError if extend_frame would reject frame (vitals that do not fit int16)"""
+        if len(frame) == 0:
+            return
+        for name in ('heart_rate', 'systolic_bp', 'diastolic_bp', 'pulse_pressure'):
+            if np.abs(frame[name].to_numpy()).max() > np.iinfo(np.int16).max:
+                raise ValueError(f"{name} value out of range")
+
+    def extend_frame(self, frame):
+        """
+        Append a scored chunk in one vectorized step
+        frame needs patient_number, patient_name, patient_key, timestamp and age columns plus
+        the output columns of analyze_vitals_batch. Raises ValueError, before
+        anything is stored, for a frame check_frame rejects.
+        """
+        n = len(frame)
+        if n == 0:
+            return
+        self.check_frame(frame)
+        if self.store is not None:
+            self.store.insert_frame(frame, self.session_id)
+
+        self._reserve(n)
+        start, stop = self._size, self._size + n
+        columns = self._columns
+        columns['patient_number'][start:stop] = frame['patient_number'].to_numpy()
+        columns['age'][start:stop] = frame['age'].fillna(MISSING_AGE).to_numpy()
+        for name in ('heart_rate', 'systolic_bp', 'diastolic_bp', 'map', 'shock_index', 'pulse_pressure', 'rpp'):
+            columns[name][start:stop] = frame[name].to_numpy()
+        for name in STATUS_COLUMNS:
+            codes = pd.Categorical(frame[name], categories=STATUS_CODES).codes
+            columns[name][start:stop] = codes
+        self._add_text('patient_name', frame['patient_name'].tolist())
+        self._add_text('patient_key', [sys.intern(k) for k in frame['patient_key'].tolist()])
+        self._add_text('timestamp', [sys.intern(str(t)) for t in frame['timestamp'].tolist()])
+        self._size = stop
+        self._enforce_budget()
+
+    def clear(self):
+        """Empty the history; rows already in the store stay there"""
+        self._reset()
+        if self.store is not None:
+            self._after_id = self.store.last_id()
+
+    def column(self, name):
+        """Read-only view of a numeric column over the rows in memory (status columns are uint8 codes)"""
+        view = self._columns[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def mean(self, name):
+        """Mean of a SUMMED_COLUMNS column over every row, spilled ones included"""
+        if len(self) == 0:
+            return float('nan')
+        total = self._spilled_sums[name] + float(self.column(name).sum(dtype=np.float64))
+        return total / len(self)
+
+    def count_status(self, name, status):
+        code = STATUS_INDEX[status]
+        return int(self._spilled_counts[name][code]) + int(np.count_nonzero(self.column(name) == code))
+
+    def record(self, i):
+        """Rebuild the patient record for row i (messages are rendered on access)"""
+        if i < self._spilled:
+            return next(self.store.session_records(self.session_id, self._after_id, offset=i, limit=1))
+        i -= self._spilled
+        columns = self._columns
+        age = int(columns['age'][i])
+        heart_rate = int(columns['heart_rate'][i])
+        systolic_bp = int(columns['systolic_bp'][i])
+        diastolic_bp = int(columns['diastolic_bp'][i])
+        calculated = {
+            # float32 -> float keeps the two-decimal value the record was built with
+            'map': round(float(columns['map'][i]), 2),
+            'shock_index': round(float(columns['shock_index'][i]), 2),
+            'pulse_pressure': int(columns['pulse_pressure'][i]),
+            'rpp': int(columns['rpp'][i]),
+        }
+        status = {name: STATUS_CODES[columns[name][i]] for name in STATUS_COLUMNS}
+        return build_patient_record(
+            patient_id_from_number(int(columns['patient_number'][i])),
+            self._text['patient_name'][i], self._text['timestamp'][i],
+            None if age == MISSING_AGE else age,
+            heart_rate, systolic_bp, diastolic_bp, calculated, status, key=self._text['patient_key'][i]
+        )
+
+    def _build_frame(self, start, stop):
+        columns = self._columns
+        age = columns['age'][start:stop]
+        data = {
+            'patient_id': [patient_id_from_number(n) for n in columns['patient_number'][start:stop].tolist()],
+            'patient_name': self._text['patient_name'][start:stop],
+            'patient_key': self._text['patient_key'][start:stop],
+            'timestamp': self._text['timestamp'][start:stop],
+            'age': pd.array(np.where(age == MISSING_AGE, 0, age), dtype='Int16'),
+        }
+        data['age'][age == MISSING_AGE] = pd.NA
+        for name in ('heart_rate', 'systolic_bp', 'diastolic_bp', 'pulse_pressure', 'rpp'):
+            # Read-only views: rows are never rewritten, and appends land past stop
+            view = columns[name][start:stop]
+            view.flags.writeable = False
+            data[name] = view
+        for name in ('map', 'shock_index'):
+            data[name] = columns[name][start:stop].astype(np.float64).round(2)
+        for name in STATUS_COLUMNS:
+            data[name] = pd.Categorical.from_codes(columns[name][start:stop], categories=STATUS_CODES)
+        return pd.DataFrame(data, columns=FRAME_COLUMNS, index=pd.RangeIndex(start, stop), copy=False)
+
+    @timed
+    def to_frame(self):
+        """
+        DataFrame of the rows in memory, built from the column arrays
+        Vitals, pulse pressure and RPP are zero-copy views of the arrays;
+        only the text, categorical and float64 columns are materialized.
+        Treat the returned frame as read-only.
+        """
+        return self._build_frame(0, self._size)
+
+    def iter_records(self):
+        """Every record in order: spilled rows streamed from the store, then the rows in memory"""
+        if self._spilled:
+            yield from self.store.session_records(self.session_id, self._after_id, limit=self._spilled)
+        for i in range(self._size):
+            yield self.record(self._spilled + i)
+
+    def iter_frames(self):
+        """
+        Every row as FRAME_COLUMNS DataFrames in order: spilled rows streamed
+        from the store a chunk at a time, then the rows in memory
+        """
+        if self._spilled:
+            for chunk in self.store.record_chunks(self.session_id, self._after_id, limit=self._spilled):
+                for name in STATUS_COLUMNS:
+                    chunk[name] = pd.Categorical.from_codes(chunk[name], categories=STATUS_CODES)
+                chunk['age'] = pd.array(chunk['age'], dtype='Int16')
+                yield chunk
+        if self._size:
+            yield self.to_frame()
+
+    @timed
+    def to_records_frame(self):
+        """Full DataFrame including the rebuilt messages, alert and color (for export)"""
+        if not self._spilled:
+            frame = self.to_frame().copy()
+            records = [self.record(i) for i in range(self._size)]
+            for name in MESSAGE_COLUMNS:
+                frame[name] = [r[name] for r in records]
+            return frame
+        return records_frame(self.iter_records())
+
+    def iter_records_frames(self, chunk_rows=RECORDS_CHUNK_ROWS):
+        """to_records_frame() in chunks of chunk_rows rows, so only one chunk is built at a time"""
+        return records_frames(self.iter_records(), chunk_rows)
+
+# ============================================================================
+# SESSION REGISTRY
+# ============================================================================
+
+class SessionRegistry:
+    """
+    Live session histories of this process, for memory accounting
+    Histories are held by weak reference, so a session drops out as soon as
+    Streamlit discards its state.
+    """
+
+    def __init__(self):
+        self._histories = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._histories)
+
+    def register(self, session_id, history):
+        with self._lock:
+            self._histories[session_id] = history
+
+    def usage(self):
+        """(session_id, rows in memory, rows spilled, bytes held) per live session, largest first"""
+        with self._lock:
+            histories = list(self._histories.items())
+        rows = [(session_id, history.resident, history.spilled, history.nbytes)
+                for session_id, history in histories]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+_session_registry = None
+_session_registry_lock = threading.Lock()
+
+def get_session_registry():
+    """Session registry shared by every Streamlit session in this process"""
+    global _session_registry
+    if _session_registry is None:
+        with _session_registry_lock:
+            if _session_registry is None:
+                _session_registry = SessionRegistry()
+    return _session_registry
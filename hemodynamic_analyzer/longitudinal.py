@@ -0,0 +1,162 @@
+"""
+Per-patient longitudinal statistics, updated one visit at a time
+
+Visits are linked by patient_key (MRN, or the normalized name). For every
+patient the last ROLLING_VISITS MAP and shock-index values are kept in a
+small ring buffer with running sums, so adding an analysis updates that
+patient's rolling means and visit-to-visit deltas in O(1) instead of
+regrouping the whole history.
+
+Only the most recently seen max_patients are held in memory. A patient who
+is not (or no longer) held is seeded from the store's last visits the first
+time they are seen again, so statistics stay correct across restarts.
+"""
+import threading
+from collections import OrderedDict
+
+from .profiling import timed
+
+
+# Visits averaged by the rolling means
+ROLLING_VISITS = 5
+# Patients whose rolling state is kept in memory
+DEFAULT_MAX_PATIENTS = 10000
+# Visits per store lookup when adding many at once
+SEED_BATCH = 1000
+
+class PatientTrend:
+    """
+    Rolling MAP / shock index over one patient's last visits
+    The sums are re-computed from the buffer once per wrap so float rounding
+    cannot build up.
+    """
+
+    __slots__ = ('visits', 'last_seen', '_map', '_shock_index', '_map_sum', '_shock_index_sum', '_pos', '_count')
+
+    def __init__(self, size=ROLLING_VISITS):
+        self.visits = 0
+        self.last_seen = None
+        self._map = [0.0] * size
+        self._shock_index = [0.0] * size
+        self._map_sum = 0.0
+        self._shock_index_sum = 0.0
+        self._pos = 0
+        self._count = 0
+
+    def push(self, timestamp, map_value, shock_index):
+        """Add one visit, dropping the oldest once the window is full"""
+        i = self._pos
+        size = len(self._map)
+        if self._count == size:
+            self._map_sum -= self._map[i]
+            self._shock_index_sum -= self._shock_index[i]
+        else:
+            self._count += 1
+        self._map[i] = map_value
+        self._shock_index[i] = shock_index
+        self._map_sum += map_value
+        self._shock_index_sum += shock_index
+
+        self._pos = (i + 1) % size
+        if self._pos == 0:
+            self._map_sum = sum(self._map)
+            self._shock_index_sum = sum(self._shock_index)
+        self.visits += 1
+        self.last_seen = timestamp
+
+    def _latest(self, back):
+        return (self._pos - 1 - back) % len(self._map)
+
+    def snapshot(self):
+        """
+        Rolling means and change since the previous visit
+        Deltas are None until the patient has two visits.
+        """
+        n = self._count
+        latest = self._latest(0)
+        snapshot = {
+            'visits': self.visits,
+            'last_seen': self.last_seen,
+            'map': self._map[latest],
+            'shock_index': self._shock_index[latest],
+            'map_mean': round(self._map_sum / n, 2),
+            'shock_index_mean': round(self._shock_index_sum / n, 2),
+            'map_delta': None,
+            'shock_index_delta': None,
+        }
+        if n > 1:
+            previous = self._latest(1)
+            snapshot['map_delta'] = round(self._map[latest] - self._map[previous], 2)
+            snapshot['shock_index_delta'] = round(self._shock_index[latest] - self._shock_index[previous], 2)
+        return snapshot
+
+class LongitudinalTracker:
+    """
+    Rolling statistics of the most recently seen patients
+    Call add()/add_frame() before the visits are written to the store: a
+    patient not held in memory is seeded from the store first, and a visit
+    already stored would be counted twice. Visits are taken in the order
+    they are added. Safe to share between sessions.
+    """
+
+    def __init__(self, store=None, max_patients=DEFAULT_MAX_PATIENTS, window=ROLLING_VISITS):
+        self.store = store
+        self.max_patients = max_patients
+        self.window = window
+        self._patients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._patients)
+
+    def _load(self, keys):
+        """Seed the patients of keys that are not held (lock held)"""
+        missing = [key for key in dict.fromkeys(keys) if key not in self._patients]
+        if not missing:
+            return
+        stored = self.store.recent_visits(missing, self.window) if self.store is not None else {}
+        for key in missing:
+            trend = PatientTrend(self.window)
+            total, visits = stored.get(key, (0, []))
+            for timestamp, map_value, shock_index in visits:
+                trend.push(timestamp, map_value, shock_index)
+            trend.visits = total
+            self._patients[key] = trend
+
+    def _add(self, visits):
+        """Push (patient_key, timestamp, map, shock_index) visits in order (lock held)"""
+        patients = self._patients
+        # Seeded a slice at a time so a large upload neither queries the store
+        # per patient nor holds more than max_patients + SEED_BATCH patients
+        for start in range(0, len(visits), SEED_BATCH):
+            batch = visits[start:start + SEED_BATCH]
+            self._load(key for key, _, _, _ in batch)
+            for key, timestamp, map_value, shock_index in batch:
+                patients[key].push(timestamp, map_value, shock_index)
+                patients.move_to_end(key)
+            while len(patients) > self.max_patients:
+                patients.popitem(last=False)
+
+    @timed
+    def add(self, record):
+        """Add one patient record; returns that patient's snapshot"""
+        key = record['patient_key']
+        with self._lock:
+            self._add([(key, record['timestamp'], record['map'], record['shock_index'])])
+            return self._patients[key].snapshot()
+
+    @timed
+    def add_frame(self, frame):
+        """Add the rows of a scored chunk (score_bulk_chunk output) in row order"""
+        visits = list(zip(frame['patient_key'].tolist(), frame['timestamp'].tolist(),
+                          frame['map'].tolist(), frame['shock_index'].tolist()))
+        with self._lock:
+            self._add(visits)
+        return len(visits)
+
+    def snapshot(self, patient_key):
+        """Current statistics of one patient (seeded from the store if needed), or None without visits"""
+        with self._lock:
+            self._load([patient_key])
+            trend = self._patients[patient_key]
+            return trend.snapshot() if trend.visits else None
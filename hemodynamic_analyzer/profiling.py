@@ -0,0 +1,163 @@
+"""
+Opt-in stage timers and single-rerun cProfile capture
+
+@timed wraps the hot-path functions (calculation, classification, report
+text, exports, charts, disk writes). Timing is switched on per thread with
+start_recording(), so each Streamlit session, whose script runs on its own
+thread, gets its own breakdown. While no thread is recording, a wrapped call
+costs one extra function call and a global check. cProfile and pstats are
+only imported when a profile is captured.
+"""
+import functools
+import threading
+import time
+import weakref
+
+
+_local = threading.local()
+# Number of threads currently recording; zero lets wrapped calls skip the thread-local lookup
+_recording = 0
+_recording_lock = threading.Lock()
+
+def _release_recording():
+    global _recording
+    with _recording_lock:
+        _recording -= 1
+
+class StageTimings:
+    """
+    Calls, total time and self time per stage for one recording
+    Self time excludes nested timed calls, so the self times add up to the
+    time spent in instrumented code without double counting.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self._child_time = [0.0]
+
+    def _enter(self):
+        self._child_time.append(0.0)
+
+    def _exit(self, name, seconds):
+        child_time = self._child_time.pop()
+        self._child_time[-1] += seconds
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += seconds - child_time
+
+    @property
+    def instrumented(self):
+        """Seconds spent inside timed stages"""
+        return sum(self_time for _, _, self_time in self.stages.values())
+
+    def rows(self):
+        """(stage, calls, total ms, self ms) tuples, largest self time first"""
+        rows = [(name, calls, total * 1000, self_time * 1000)
+                for name, (calls, total, self_time) in self.stages.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+def timed(function):
+    """Record calls to function under its qualified name while the thread is recording"""
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _recording:
+            return function(*args, **kwargs)
+        timings = getattr(_local, 'timings', None)
+        if timings is None:
+            return function(*args, **kwargs)
+        timings._enter()
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings._exit(name, time.perf_counter() - start)
+    return wrapper
+
+class stage:
+    """Time a block of code as one stage: `with stage('history page'):`"""
+
+    __slots__ = ('name', '_timings', '_start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._timings = getattr(_local, 'timings', None) if _recording else None
+        if self._timings is not None:
+            self._timings._enter()
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._timings is not None:
+            self._timings._exit(self.name, time.perf_counter() - self._start)
+        return False
+
+def start_recording():
+    """Start a fresh breakdown for the calling thread, replacing any unfinished one"""
+    global _recording
+    stop_recording()
+    timings = _local.timings = StageTimings()
+    with _recording_lock:
+        _recording += 1
+    # Released by stop_recording(), or when the thread's locals are freed if it
+    # ends without stopping (e.g. a rerun that was interrupted)
+    timings._release = weakref.finalize(timings, _release_recording)
+    return timings
+
+def is_recording():
+    """True while the calling thread is recording"""
+    return bool(_recording) and getattr(_local, 'timings', None) is not None
+
+def stop_recording():
+    """Stop recording on the calling thread; returns its StageTimings, or None if it was not recording"""
+    timings = getattr(_local, 'timings', None)
+    _local.timings = None
+    if timings is not None:
+        timings._release()
+        timings.elapsed = time.perf_counter() - timings.started
+    return timings
+
+# ============================================================================
+# CPROFILE CAPTURE
+# ============================================================================
+
+def start_profile():
+    """Start a cProfile capture for the calling thread"""
+    import cProfile
+
+    stop_profile()
+    _local.profiler = cProfile.Profile()
+    _local.profiler.enable()
+    return _local.profiler
+
+def stop_profile():
+    """Stop the calling thread's capture; returns the profiler, or None if none was running"""
+    profiler = getattr(_local, 'profiler', None)
+    _local.profiler = None
+    if profiler is not None:
+        profiler.disable()
+    return profiler
+
+def profile_dump(profiler):
+    """Captured stats as bytes in the .prof format read by pstats and snakeviz"""
+    import marshal
+
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+def profile_summary(profiler, limit=25, sort='cumulative'):
+    """Text table of the top functions of a capture"""
+    import pstats
+    from io import StringIO
+
+    buffer = StringIO()
+    pstats.Stats(profiler, stream=buffer).strip_dirs().sort_stats(sort).print_stats(limit)
+    return buffer.getvalue()
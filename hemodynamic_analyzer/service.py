@@ -0,0 +1,379 @@
+"""
+Local asyncio HTTP scoring service (standard library only)
+
+    POST /score         {"heart_rate": 72, "systolic_bp": 120, "diastolic_bp": 80}
+    POST /score/batch   {"readings": [{...}, ...]}
+    GET  /metrics       request counts and p50/p99 latency per endpoint
+    GET  /health
+    GET  /history.csv   the stored history as CSV (only when started with a store)
+
+Identical requests that arrive while one is being computed share its result
+(coalescing), single readings are memoized and batches are scored with the
+vectorized batch API (NumPy is only imported by the first batch). Readings
+must be finite and within core.VITAL_RANGES, otherwise the answer is 400. Beyond max_in_flight
+concurrent requests the service answers 503 with Retry-After instead of
+queueing without bound.
+
+/history.csv is sent with chunked transfer encoding (gzip-compressed when the
+client accepts it): the next chunk is produced only after the previous one
+was written out, so memory stays flat however large the history is.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from functools import lru_cache
+
+from .core import calculate_all_parameters, check_vitals, classify_parameters, describe_status
+from .thresholds import get_thresholds
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+MAX_IN_FLIGHT = 64
+MAX_BATCH_READINGS = 10000
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+# Latency samples kept per endpoint for the percentiles
+LATENCY_WINDOW = 10000
+
+READING_FIELDS = ('heart_rate', 'systolic_bp', 'diastolic_bp')
+# Statuses in the order classify_parameters returns them
+STATUS_FIELDS = ('hr_status', 'map_status', 'si_status', 'bp_status', 'overall')
+BATCH_RESULT_COLUMNS = ('map', 'shock_index', 'pulse_pressure', 'rpp') + STATUS_FIELDS
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def score_reading(heart_rate, systolic_bp, diastolic_bp):
+    """Calculated parameters and status for one reading (memoized; do not mutate)"""
+    return _score_reading(heart_rate, systolic_bp, diastolic_bp, get_thresholds().digest)
+
+@lru_cache(maxsize=65536, typed=True)
+def _score_reading(heart_rate, systolic_bp, diastolic_bp, thresholds_digest):
+    # The table's digest is part of the cache key so a table swap is never served
+    # stale, even when the new table keeps the old version string;
+    # typed, so 120 and 120.0 (echoed back as given) are separate entries
+    calculated = calculate_all_parameters(heart_rate, systolic_bp, diastolic_bp)
+    status = classify_parameters(heart_rate, systolic_bp, diastolic_bp, calculated)
+    return {
+        'heart_rate': heart_rate,
+        'systolic_bp': systolic_bp,
+        'diastolic_bp': diastolic_bp,
+        **calculated,
+        **status
+    }
+
+def _reading(payload):
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "a reading must be a JSON object")
+    values = []
+    for name in READING_FIELDS:
+        value = payload.get(name)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise HTTPError(400, f"{name} must be a number")
+        values.append(value)
+    try:
+        check_vitals(*values)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    return tuple(values)
+
+def _parse_constant(name):
+    raise HTTPError(400, f"{name} is not a valid reading value")
+
+def _parse_json(body):
+    try:
+        # NaN / Infinity tokens are not JSON; reject them instead of parsing them as floats
+        return json.loads(body, parse_constant=_parse_constant)
+    except (UnicodeDecodeError, ValueError):
+        raise HTTPError(400, "body is not valid JSON")
+
+def handle_score(body):
+    return score_reading(*_reading(_parse_json(body)))
+
+def handle_score_batch(body):
+    payload = _parse_json(body)
+    readings = payload.get('readings') if isinstance(payload, dict) else None
+    if not isinstance(readings, list):
+        raise HTTPError(400, 'expected {"readings": [...]}')
+    if len(readings) > MAX_BATCH_READINGS:
+        raise HTTPError(413, f"at most {MAX_BATCH_READINGS} readings per batch")
+    return {'results': score_readings([_reading(r) for r in readings])}
+
+def score_readings(readings):
+    """
+    score_reading() for a list of (heart_rate, systolic_bp, diastolic_bp), vectorized
+    Readings of ints only and the others are scored as separate int and float
+    batches, so every value has the type the scalar path gives it.
+    """
+    from .batch import analyze_vitals_batch
+
+    hr_range = get_thresholds().normal_range('heart_rate', with_unit=True)
+    results = [None] * len(readings)
+    groups = {}
+    for i, (heart_rate, systolic_bp, diastolic_bp) in enumerate(readings):
+        integral = type(heart_rate) is int and type(systolic_bp) is int and type(diastolic_bp) is int
+        groups.setdefault(integral, []).append(i)
+    for rows in groups.values():
+        scored = analyze_vitals_batch(*(list(column) for column in zip(*(readings[i] for i in rows))))
+        columns = zip(rows, *(scored[name].tolist() for name in BATCH_RESULT_COLUMNS))
+        for i, map_value, shock_index, pulse_pressure, rpp, *statuses in columns:
+            heart_rate, systolic_bp, diastolic_bp = readings[i]
+            status = dict(zip(STATUS_FIELDS, statuses))
+            # The scalar path's shock index is the int 0 when SBP is 0
+            shock_index = shock_index if systolic_bp > 0 else 0
+            results[i] = {
+                'heart_rate': heart_rate,
+                'systolic_bp': systolic_bp,
+                'diastolic_bp': diastolic_bp,
+                'map': map_value,
+                'shock_index': shock_index,
+                'pulse_pressure': pulse_pressure,
+                'rpp': rpp,
+                **status,
+                **describe_status(heart_rate, systolic_bp, diastolic_bp, map_value, shock_index, status, hr_range)
+            }
+    return results
+
+class LatencyStats:
+    """Request count and a sliding window of latencies for one endpoint"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.count = 0
+        self.errors = 0
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds, error=False):
+        self.count += 1
+        self.errors += error
+        self._samples.append(seconds)
+
+    def snapshot(self):
+        samples = sorted(self._samples)
+        def percentile(p):
+            return round(samples[min(int(p * len(samples)), len(samples) - 1)] * 1000, 3) if samples else None
+        return {'count': self.count, 'errors': self.errors,
+                'p50_ms': percentile(0.50), 'p99_ms': percentile(0.99)}
+
+class ScoringService:
+    """
+    HTTP/1.1 server with keep-alive; one instance per listening socket
+    Batch requests are scored in the default thread pool so a large batch
+    does not stall the event loop for other connections.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, max_in_flight=MAX_IN_FLIGHT, store=None):
+        self.host = host
+        self.port = port
+        self.max_in_flight = max_in_flight
+        self.store = store
+        self.routes = {
+            ('POST', '/score'): (handle_score, False),
+            ('POST', '/score/batch'): (handle_score_batch, True),
+            ('GET', '/metrics'): (lambda body: self.metrics(), False),
+            ('GET', '/health'): (lambda body: {'status': 'ok'}, False),
+        }
+        # Streamed endpoints: (method, path) -> (content type, chunk iterator factory taking compress)
+        self.streams = {}
+        if store is not None:
+            self.streams[('GET', '/history.csv')] = ('text/csv; charset=utf-8', self.history_csv)
+        self.latency = {path: LatencyStats() for _, path in list(self.routes) + list(self.streams)}
+        self.in_flight = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self._pending = {}
+        self._server = None
+        self._started = time.monotonic()
+
+    def metrics(self):
+        info = _score_reading.cache_info()
+        return {
+            'uptime_s': round(time.monotonic() - self._started, 1),
+            'thresholds_version': get_thresholds().version,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'rejected': self.rejected,
+            'coalesced': self.coalesced,
+            'reading_cache': {'hits': info.hits, 'misses': info.misses, 'size': info.currsize},
+            'endpoints': {path: stats.snapshot() for path, stats in self.latency.items()},
+        }
+
+    def history_csv(self, compress):
+        """The store's records as CSV byte chunks (pandas is only imported on first use)"""
+        from .archive import iter_history_csv
+        from .history import records_frames
+
+        return iter_history_csv(records_frames(self.store.records()), compress)
+
+    async def _compute(self, handler, body, offload):
+        # allow_nan=False: a NaN or inf that got through is an error, never a bare NaN token
+        if not offload:
+            return json.dumps(handler(body), allow_nan=False).encode('utf-8')
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: json.dumps(handler(body), allow_nan=False).encode('utf-8'))
+
+    async def dispatch(self, method, path, body):
+        """Return the JSON response body for one request (raises HTTPError)"""
+        route = self.routes.get((method, path))
+        if route is None:
+            if any(p == path for _, p in list(self.routes) + list(self.streams)):
+                raise HTTPError(405, f"{method} not allowed on {path}")
+            raise HTTPError(404, f"no endpoint {path}")
+        handler, offload = route
+
+        # Requests with identical method, path and body share one computation
+        key = (method, path, body)
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        task = asyncio.ensure_future(self._compute(handler, body, offload))
+        self._pending[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._pending.pop(key, None)
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            raise HTTPError(413, "request headers too large")
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HTTPError(400, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"body larger than {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b''
+        keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+        return method, target.split('?', 1)[0], body, keep_alive, headers
+
+    @staticmethod
+    def _head(status, headers):
+        return (f"HTTP/1.1 {status} {REASONS[status]}\r\n" +
+                ''.join(f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n").encode('latin-1')
+
+    @classmethod
+    def _write_response(cls, writer, status, payload, keep_alive, extra_headers=None):
+        headers = {
+            'Content-Type': 'application/json',
+            'Content-Length': str(len(payload)),
+            'Connection': 'keep-alive' if keep_alive else 'close',
+            **(extra_headers or {}),
+        }
+        writer.write(cls._head(status, headers) + payload)
+
+    async def _write_stream(self, writer, content_type, chunks, keep_alive, compress):
+        """
+        Send the byte chunks of an iterator with chunked transfer encoding
+        Each chunk is produced in the thread pool, and only after the previous
+        one was drained to the socket. Returns False if the iterator failed,
+        in which case the response is cut short and the connection must close.
+        """
+        headers = {
+            'Content-Type': content_type,
+            'Transfer-Encoding': 'chunked',
+            'Connection': 'keep-alive' if keep_alive else 'close',
+        }
+        if compress:
+            headers['Content-Encoding'] = 'gzip'
+        writer.write(self._head(200, headers))
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                data = await loop.run_in_executor(None, next, chunks, None)
+            except Exception:
+                return False
+            if data is None:
+                break
+            if data:
+                writer.write(b'%X\r\n%s\r\n' % (len(data), data))
+                await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        return True
+
+    async def handle_connection(self, reader, writer):
+        keep_alive = True
+        try:
+            while keep_alive:
+                try:
+                    method, path, body, keep_alive, headers = await self._read_request(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                except HTTPError as e:
+                    self._write_response(writer, e.status, json.dumps({'error': str(e)}).encode(), False)
+                    break
+
+                start = time.perf_counter()
+                status, extra = 200, None
+                if self.in_flight >= self.max_in_flight:
+                    self.rejected += 1
+                    status, payload = 503, json.dumps({'error': 'server busy, retry later'}).encode()
+                    extra = {'Retry-After': '1'}
+                elif (method, path) in self.streams:
+                    content_type, open_stream = self.streams[(method, path)]
+                    compress = 'gzip' in headers.get('accept-encoding', '')
+                    self.in_flight += 1
+                    try:
+                        if not await self._write_stream(writer, content_type, open_stream(compress),
+                                                        keep_alive, compress):
+                            status, keep_alive = 500, False
+                    finally:
+                        self.in_flight -= 1
+                    payload = None
+                else:
+                    self.in_flight += 1
+                    try:
+                        payload = await self.dispatch(method, path, body)
+                    except HTTPError as e:
+                        status, payload = e.status, json.dumps({'error': str(e)}).encode()
+                    except Exception as e:
+                        status, payload = 500, json.dumps({'error': f"{type(e).__name__}: {e}"}).encode()
+                    finally:
+                        self.in_flight -= 1
+
+                if payload is not None:
+                    self._write_response(writer, status, payload, keep_alive, extra)
+                await writer.drain()
+                if path in self.latency:
+                    self.latency[path].add(time.perf_counter() - start, error=status >= 400)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        """Start listening; port 0 picks a free port (see self.port afterwards)"""
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port,
+                                                  limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
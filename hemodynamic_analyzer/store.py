@@ -0,0 +1,365 @@
+"""
+Persistent SQLite store for analyzed patient records
+
+Runs in WAL mode so the Streamlit UI can read while inserts are in flight,
+inserts in batches inside a single transaction, and serves the history tab
+with keyset pagination so a page costs the same at 100 rows or 10 million.
+"""
+import os
+import sqlite3
+import threading
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+from .core import STATUS_CODES, STATUS_INDEX, PatientRecord, patient_key
+from .profiling import stage, timed
+
+
+DEFAULT_DB_PATH = os.environ.get('HEMODYNAMIC_DB_PATH', os.path.join('data', 'history.sqlite3'))
+
+# Rows per executemany() call for bulk inserts
+INSERT_BATCH_SIZE = 5000
+# Rows converted to arrays at a time when reading a whole series
+SERIES_FETCH_SIZE = 50000
+# Rows fetched per query when streaming PatientRecords
+RECORD_FETCH_SIZE = 5000
+# Patient keys per query when loading recent visits
+VISIT_KEYS_PER_QUERY = 500
+# Bumped with every migration in _migrate()
+SCHEMA_VERSION = 2
+
+RECORD_COLUMNS = ['patient_id', 'patient_name', 'patient_key', 'timestamp', 'age', 'heart_rate', 'systolic_bp',
+                  'diastolic_bp', 'map', 'shock_index', 'pulse_pressure', 'rpp',
+                  'hr_status', 'bp_status', 'map_status', 'si_status', 'overall']
+STATUS_COLUMNS = ['hr_status', 'bp_status', 'map_status', 'si_status', 'overall']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    patient_id TEXT NOT NULL,
+    patient_name TEXT,
+    patient_key TEXT,
+    timestamp TEXT NOT NULL,
+    age INTEGER,
+    heart_rate INTEGER NOT NULL,
+    systolic_bp INTEGER NOT NULL,
+    diastolic_bp INTEGER NOT NULL,
+    map REAL NOT NULL,
+    shock_index REAL NOT NULL,
+    pulse_pressure INTEGER NOT NULL,
+    rpp INTEGER NOT NULL,
+    hr_status INTEGER NOT NULL,
+    bp_status INTEGER NOT NULL,
+    map_status INTEGER NOT NULL,
+    si_status INTEGER NOT NULL,
+    overall INTEGER NOT NULL,
+    session_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_patient_id ON records (patient_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_records_timestamp ON records (timestamp);
+CREATE INDEX IF NOT EXISTS idx_records_overall ON records (overall, timestamp);
+"""
+
+def _patient_records(rows):
+    """PatientRecords of rows selected as id + RECORD_COLUMNS"""
+    records = []
+    for row in rows:
+        status = {name: STATUS_CODES[code] for name, code in zip(STATUS_COLUMNS, row[13:])}
+        records.append(PatientRecord(*row[1:13], status))
+    return records
+
+def _parse_timestamps(stamps):
+    """datetime64 array of timestamp strings; unparseable ones become NaT"""
+    try:
+        # NumPy parses the app's 'YYYY-MM-DD HH:MM:SS' several times faster than pandas
+        return np.array(stamps, dtype='datetime64[s]')
+    except ValueError:
+        # Timestamps copied from uploaded files can be in any format
+        return pd.to_datetime(pd.Series(stamps), format='ISO8601', errors='coerce').to_numpy()
+
+class HistoryStore:
+    """
+    Thread-safe wrapper around one SQLite connection
+    Status columns are stored as the integer codes of core.STATUS_CODES.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Bring a database written by an older version up to SCHEMA_VERSION"""
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(records)")}
+        with self._conn:
+            if version < 1:
+                # 1: patient_key links repeated visits; filled in from the stored names
+                if 'patient_key' not in columns:
+                    self._conn.execute("ALTER TABLE records ADD COLUMN patient_key TEXT")
+                self._conn.create_function('patient_key', 1, patient_key, deterministic=True)
+                self._conn.execute("UPDATE records SET patient_key = patient_key(patient_name) "
+                                   "WHERE patient_key IS NULL")
+            if version < 2:
+                # 2: session_id tags the rows a UI session added (NULL for older rows)
+                if 'session_id' not in columns:
+                    self._conn.execute("ALTER TABLE records ADD COLUMN session_id TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_patient_key "
+                           "ON records (patient_key, timestamp)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_session_id ON records (session_id, id)")
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _insert_rows(self, rows, session_id=None):
+        columns = RECORD_COLUMNS + ['session_id']
+        sql = f"INSERT INTO records ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        tag = (session_id,)
+        with self._lock, self._conn:
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                self._conn.executemany(sql, [row + tag for row in rows[start:start + INSERT_BATCH_SIZE]])
+
+    @timed
+    def insert_records(self, records, session_id=None):
+        """Insert patient records (as built by build_patient_record) in one transaction"""
+        rows = [
+            tuple(STATUS_INDEX[r[c]] if c in STATUS_COLUMNS else r[c] for c in RECORD_COLUMNS)
+            for r in records
+        ]
+        self._insert_rows(rows, session_id)
+        return len(rows)
+
+    @timed
+    def insert_frame(self, frame, session_id=None):
+        """
+        Insert a scored DataFrame (process_csv_in_chunks output) in one transaction
+        """
+        columns = {
+            'patient_id': [f"PAT-{n:04d}" for n in frame['patient_number'].tolist()],
+            'age': [None if pd.isna(a) else int(a) for a in frame['age'].tolist()],
+        }
+        for name in RECORD_COLUMNS:
+            if name in columns:
+                continue
+            if name in STATUS_COLUMNS:
+                columns[name] = pd.Categorical(frame[name], categories=STATUS_CODES).codes.tolist()
+            else:
+                columns[name] = frame[name].tolist()
+        rows = list(zip(*(columns[name] for name in RECORD_COLUMNS)))
+        self._insert_rows(rows, session_id)
+        return len(rows)
+
+    def _where(self, patient_id=None, overall=None, start=None, end=None, patient_key=None):
+        clauses, params = [], []
+        if patient_id:
+            clauses.append("patient_id = ?")
+            params.append(patient_id)
+        if patient_key:
+            clauses.append("patient_key = ?")
+            params.append(patient_key)
+        if overall:
+            clauses.append("overall = ?")
+            params.append(STATUS_INDEX[overall])
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        return clauses, params
+
+    @timed
+    def query_page(self, page_size=50, before=None,
+                   patient_id=None, overall=None, start=None, end=None, patient_key=None):
+        """
+        Return one page of records, newest first, as (DataFrame, has_older)
+        Pages are addressed by a (timestamp, id) cursor (keyset pagination):
+        pass page_cursor(frame) of the current page as before to get the next
+        older page. Every filter combination walks an index in order, so no
+        page needs a sort or an OFFSET scan.
+        """
+        clauses, params = self._where(patient_id, overall, start, end, patient_key)
+        if before is not None:
+            clauses.append("(timestamp, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (f"SELECT id, {', '.join(RECORD_COLUMNS)} FROM records {where} "
+               f"ORDER BY timestamp DESC, id DESC LIMIT ?")
+        with self._lock:
+            rows = self._conn.execute(sql, params + [page_size + 1]).fetchall()
+
+        frame = pd.DataFrame.from_records(rows[:page_size], columns=['id'] + RECORD_COLUMNS)
+        for name in STATUS_COLUMNS:
+            frame[name] = pd.Categorical.from_codes(frame[name].astype('int8'), categories=STATUS_CODES)
+        return frame, len(rows) > page_size
+
+    @staticmethod
+    def page_cursor(frame):
+        """Cursor of the oldest row on a page, for requesting the next page"""
+        last = frame.iloc[-1]
+        return (last['timestamp'], int(last['id']))
+
+    @timed
+    def series(self, columns=('heart_rate', 'map', 'shock_index'),
+               patient_id=None, overall=None, start=None, end=None, patient_key=None):
+        """
+        Numeric columns of every matching record in time order, as NumPy arrays
+        Returns a dict with 'timestamp' (datetime64; rows whose timestamp does
+        not parse are dropped) and one float64 array per column. Rows are
+        converted in SERIES_FETCH_SIZE chunks, so the full result is never
+        held as Python tuples.
+        """
+        clauses, params = self._where(patient_id, overall, start, end, patient_key)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT timestamp, {', '.join(columns)} FROM records {where} ORDER BY timestamp, id"
+        timestamps, values = [], []
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            while rows := cursor.fetchmany(SERIES_FETCH_SIZE):
+                timestamps.append(_parse_timestamps(list(map(itemgetter(0), rows))))
+                values.append(np.array([list(map(itemgetter(i), rows)) for i in range(1, len(columns) + 1)],
+                                       dtype=np.float64))
+
+        timestamp = np.concatenate(timestamps) if timestamps else np.array([], dtype='datetime64[ns]')
+        matrix = np.concatenate(values, axis=1) if values else np.empty((len(columns), 0))
+        valid = ~np.isnat(timestamp)
+        result = {'timestamp': timestamp[valid]}
+        for name, column in zip(columns, matrix):
+            result[name] = column[valid]
+        return result
+
+    @timed
+    def recent_visits(self, patient_keys, limit):
+        """
+        Last limit visits of each patient, for seeding longitudinal statistics
+        Returns {patient_key: (total visits, [(timestamp, map, shock_index), ...])}
+        with the visits oldest first; patients without stored visits are left out.
+        """
+        patient_keys = list(patient_keys)
+        visits = {}
+        with self._lock:
+            for start in range(0, len(patient_keys), VISIT_KEYS_PER_QUERY):
+                keys = patient_keys[start:start + VISIT_KEYS_PER_QUERY]
+                placeholders = ', '.join('?' for _ in keys)
+                rows = self._conn.execute(
+                    f"SELECT patient_key, total, timestamp, map, shock_index FROM ("
+                    f"  SELECT patient_key, timestamp, map, shock_index,"
+                    f"    COUNT(*) OVER (PARTITION BY patient_key) AS total,"
+                    f"    ROW_NUMBER() OVER (PARTITION BY patient_key ORDER BY timestamp DESC, id DESC) AS recent"
+                    f"  FROM records WHERE patient_key IN ({placeholders})"
+                    f") WHERE recent <= ? ORDER BY patient_key, recent DESC",
+                    keys + [limit]).fetchall()
+                for key, total, timestamp, map_value, shock_index in rows:
+                    entry = visits.get(key)
+                    if entry is None:
+                        entry = visits[key] = (total, [])
+                    entry[1].append((timestamp, map_value, shock_index))
+        return visits
+
+    # The record generators below time each chunk they fetch as a stage named
+    # after the method, rather than using @timed, which would only time the
+    # creation of the generator. Time spent by the consumer is not counted.
+
+    def session_records(self, session_id, after_id=0, offset=0, limit=None):
+        """
+        Yield the records a session added (ids above after_id) as PatientRecords, oldest first
+        Rows are fetched RECORD_FETCH_SIZE at a time and the lock is not held
+        between chunks, so a slow consumer does not block other sessions.
+        """
+        return self._records('HistoryStore.session_records', "session_id = ? AND", (session_id,),
+                             after_id, offset, limit)
+
+    def records(self, after_id=0, limit=None):
+        """Yield every stored record (ids above after_id) as PatientRecords, oldest first"""
+        return self._records('HistoryStore.records', "", (), after_id, 0, limit)
+
+    def matching_records(self, limit=None,
+                         patient_id=None, overall=None, start=None, end=None, patient_key=None):
+        """
+        Yield the records matching the query_page filters as PatientRecords, newest first
+        Rows come in the order of the history table, fetched RECORD_FETCH_SIZE
+        at a time by (timestamp, id) cursor without holding the lock between chunks.
+        """
+        clauses, params = self._where(patient_id, overall, start, end, patient_key)
+        before = None
+        fetched = 0
+        while limit is None or fetched < limit:
+            chunk = RECORD_FETCH_SIZE if limit is None else min(limit - fetched, RECORD_FETCH_SIZE)
+            page_clauses, page_params = list(clauses), list(params)
+            if before is not None:
+                page_clauses.append("(timestamp, id) < (?, ?)")
+                page_params.extend(before)
+            where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+            with stage('HistoryStore.matching_records'):
+                with self._lock:
+                    rows = self._conn.execute(
+                        f"SELECT id, {', '.join(RECORD_COLUMNS)} FROM records {where} "
+                        f"ORDER BY timestamp DESC, id DESC LIMIT ?", page_params + [chunk]).fetchall()
+                records = _patient_records(rows)
+            yield from records
+            if len(rows) < chunk:
+                return
+            fetched += len(rows)
+            before = (rows[-1][4], rows[-1][0])
+
+    def _records(self, stage_name, clause, params, after_id, offset, limit):
+        fetched = 0
+        while limit is None or fetched < limit:
+            chunk = RECORD_FETCH_SIZE if limit is None else min(limit - fetched, RECORD_FETCH_SIZE)
+            with stage(stage_name):
+                with self._lock:
+                    rows = self._conn.execute(
+                        f"SELECT id, {', '.join(RECORD_COLUMNS)} FROM records "
+                        f"WHERE {clause} id > ? ORDER BY id LIMIT ? OFFSET ?",
+                        params + (after_id, chunk, offset)).fetchall()
+                records = _patient_records(rows)
+            yield from records
+            if len(rows) < chunk:
+                return
+            fetched += len(rows)
+            after_id, offset = rows[-1][0], 0
+
+    def record_chunks(self, session_id=None, after_id=0, limit=None, chunk_rows=SERIES_FETCH_SIZE):
+        """
+        Yield stored rows (ids above after_id) as DataFrames of RECORD_COLUMNS, oldest first
+        session_id restricts the rows to one session. Status columns hold the
+        integer codes. Rows are read chunk_rows at a time by id, without
+        holding the lock between chunks.
+        """
+        session_clause = "AND session_id = ?" if session_id is not None else ""
+        fetched = 0
+        while limit is None or fetched < limit:
+            chunk = chunk_rows if limit is None else min(limit - fetched, chunk_rows)
+            params = (after_id,) + ((session_id,) if session_id is not None else ()) + (chunk,)
+            with stage('HistoryStore.record_chunks'):
+                with self._lock:
+                    rows = self._conn.execute(
+                        f"SELECT id, {', '.join(RECORD_COLUMNS)} FROM records "
+                        f"WHERE id > ? {session_clause} ORDER BY id LIMIT ?", params).fetchall()
+                if not rows:
+                    return
+                frame = pd.DataFrame.from_records(rows, columns=['id'] + RECORD_COLUMNS).drop(columns='id')
+            after_id = rows[-1][0]
+            fetched += len(rows)
+            yield frame
+            if len(rows) < chunk:
+                return
+
+    def last_id(self):
+        """Id of the newest row (0 when empty); changes whenever records are added"""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM records").fetchone()[0]
+
+    def has_records(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM records LIMIT 1").fetchone() is not None
@@ -0,0 +1,227 @@
+"""
+Real-time bedside monitor ingestion with fixed-size rolling windows
+
+Each bed keeps its last `window` samples in preallocated NumPy ring buffers
+with running sums, so a new sample updates the rolling HR/SBP/DBP, MAP and
+shock index in O(1) and is re-classified with classify_parameters. Memory per
+bed is fixed; nothing older than the window is kept.
+
+Feed format, one sample per line (stdin or TCP):
+
+    bed_id,heart_rate,systolic_bp,diastolic_bp
+"""
+import asyncio
+import random
+import sys
+import time
+
+import numpy as np
+
+from .core import calculate_all_parameters, check_vitals, classify_parameters
+
+
+# Samples per rolling window (60 s at 1 Hz)
+DEFAULT_WINDOW = 60
+
+class BedWindow:
+    """
+    Rolling window of one bed's vitals in fixed-size ring buffers
+    Vitals sums are exact integers; the shock-index sum is a float that is
+    re-summed from the buffer once per wrap so rounding error cannot build up.
+    """
+
+    def __init__(self, size=DEFAULT_WINDOW):
+        self.size = size
+        self.count = 0
+        self._pos = 0
+        self._vitals = np.zeros((size, 3), dtype=np.int32)
+        self._shock_index = np.zeros(size, dtype=np.float64)
+        self._vitals_sum = [0, 0, 0]
+        self._shock_index_sum = 0.0
+
+    @property
+    def nbytes(self):
+        return self._vitals.nbytes + self._shock_index.nbytes
+
+    def push(self, heart_rate, systolic_bp, diastolic_bp):
+        """Add one sample, evicting the oldest once the window is full"""
+        i = self._pos
+        sums = self._vitals_sum
+        full = self.count == self.size
+        old = self._vitals[i].tolist()
+        old_shock_index = self._shock_index[i]
+
+        # Same SBP > 0 guard as calculate_all_parameters
+        shock_index = heart_rate / systolic_bp if systolic_bp > 0 else 0
+        # Slot first: a value the buffer cannot hold raises before any sum changes
+        self._vitals[i] = (heart_rate, systolic_bp, diastolic_bp)
+        self._shock_index[i] = shock_index
+
+        if full:
+            sums[0] -= old[0]
+            sums[1] -= old[1]
+            sums[2] -= old[2]
+            self._shock_index_sum -= old_shock_index
+        else:
+            self.count += 1
+        sums[0] += heart_rate
+        sums[1] += systolic_bp
+        sums[2] += diastolic_bp
+        self._shock_index_sum += shock_index
+
+        self._pos = (i + 1) % self.size
+        if self._pos == 0:
+            self._shock_index_sum = float(self._shock_index.sum())
+
+    def means(self):
+        """Rolling (heart_rate, systolic_bp, diastolic_bp, shock_index) means"""
+        n = self.count
+        return (self._vitals_sum[0] / n, self._vitals_sum[1] / n,
+                self._vitals_sum[2] / n, self._shock_index_sum / n)
+
+    def classify(self):
+        """
+        Rolling parameters and status for the current window
+        MAP is computed from the rolling SBP/DBP (equal to the mean of the
+        per-sample MAPs); the shock index is the mean of per-sample values.
+        """
+        heart_rate, systolic_bp, diastolic_bp, shock_index = self.means()
+        heart_rate, systolic_bp, diastolic_bp = (round(heart_rate, 1), round(systolic_bp, 1),
+                                                 round(diastolic_bp, 1))
+        calculated = calculate_all_parameters(heart_rate, systolic_bp, diastolic_bp)
+        calculated['shock_index'] = round(shock_index, 2)
+        calculated['pulse_pressure'] = round(calculated['pulse_pressure'], 1)
+        calculated['rpp'] = round(calculated['rpp'])
+        status = classify_parameters(heart_rate, systolic_bp, diastolic_bp, calculated)
+        return {
+            'heart_rate': heart_rate,
+            'systolic_bp': systolic_bp,
+            'diastolic_bp': diastolic_bp,
+            **calculated,
+            **status
+        }
+
+class StreamMonitor:
+    """
+    Rolling windows for many beds, re-classified on every sample
+    ingest() returns the bed's current snapshot with 'changed' set when its
+    overall status differs from the previous sample's.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.beds = {}
+        self._overall = {}
+        self.samples = 0
+
+    def ingest(self, bed_id, heart_rate, systolic_bp, diastolic_bp):
+        bed = self.beds.get(bed_id)
+        if bed is None:
+            bed = BedWindow(self.window)
+        bed.push(heart_rate, systolic_bp, diastolic_bp)
+        # Registered only once it holds a sample, so a rejected one leaves no empty bed
+        self.beds[bed_id] = bed
+        self.samples += 1
+
+        snapshot = bed.classify()
+        previous = self._overall.get(bed_id)
+        self._overall[bed_id] = snapshot['overall']
+        snapshot['bed_id'] = bed_id
+        snapshot['samples'] = bed.count
+        snapshot['previous'] = previous
+        snapshot['changed'] = previous != snapshot['overall']
+        return snapshot
+
+    def ingest_line(self, line):
+        """
+        Parse and ingest one 'bed_id,hr,sbp,dbp' line; returns None for blank lines
+        Raises ValueError for a malformed line or vitals outside VITAL_RANGES
+        (inf and nan included), before the bed's window is touched.
+        """
+        line = line.strip()
+        if not line:
+            return None
+        bed_id, heart_rate, systolic_bp, diastolic_bp = line.split(',')
+        vitals = (float(heart_rate), float(systolic_bp), float(diastolic_bp))
+        check_vitals(*vitals)
+        return self.ingest(bed_id.strip(), *(int(round(value)) for value in vitals))
+
+    def summary(self):
+        """Current snapshot of every bed, most urgent first"""
+        snapshots = [dict(bed.classify(), bed_id=bed_id, samples=bed.count)
+                     for bed_id, bed in self.beds.items()]
+        return sorted(snapshots, key=lambda s: (s['priority'], s['bed_id']))
+
+    @property
+    def nbytes(self):
+        return sum(bed.nbytes for bed in self.beds.values())
+
+# ============================================================================
+# FEEDS
+# ============================================================================
+
+def format_snapshot(snapshot):
+    return (f"{snapshot['bed_id']:<8} {snapshot['overall']:<8} "
+            f"HR {snapshot['heart_rate']:6.1f}  BP {snapshot['systolic_bp']:5.1f}/{snapshot['diastolic_bp']:<5.1f} "
+            f"MAP {snapshot['map']:6.2f}  SI {snapshot['shock_index']:.2f}  (n={snapshot['samples']})")
+
+def _handle_line(monitor, line, on_update):
+    try:
+        snapshot = monitor.ingest_line(line)
+    except (ValueError, OverflowError):
+        print(f"skipping malformed sample: {line.strip()!r}", file=sys.stderr)
+        return
+    if snapshot is not None and on_update:
+        on_update(snapshot)
+
+def run_lines(monitor, lines, on_update=None):
+    """Ingest samples from an iterable of lines (e.g. sys.stdin)"""
+    for line in lines:
+        _handle_line(monitor, line, on_update)
+
+async def serve_tcp(monitor, host, port, on_update=None):
+    """
+    Accept any number of monitor connections and ingest their lines
+    All connections share one event loop, so the monitor needs no locking.
+    """
+    async def handle(reader, writer):
+        try:
+            while line := await reader.readline():
+                _handle_line(monitor, line.decode('utf-8', 'replace'), on_update)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+def simulate_samples(beds=24, rate=1.0, count=None, seed=None):
+    """
+    Yield 'bed_id,hr,sbp,dbp' lines: one sample per bed every 1/rate seconds
+    (rate=0: as fast as possible), for count rounds or forever.
+    Each bed random-walks around its own baseline, with occasional beds
+    drifting towards shock (rising HR, falling BP).
+    """
+    rng = random.Random(seed)
+    state = {}
+    for n in range(1, beds + 1):
+        state[f"bed-{n:02d}"] = [rng.gauss(80, 10), rng.gauss(120, 12), rng.gauss(78, 8), 0.0]
+
+    start = time.monotonic()
+    tick = 0
+    while count is None or tick < count:
+        for bed_id, vitals in state.items():
+            if vitals[3] == 0.0 and rng.random() < 0.002:
+                vitals[3] = rng.uniform(0.2, 0.6)  # start deteriorating
+            vitals[0] += rng.gauss(vitals[3], 1.5)
+            vitals[1] += rng.gauss(-vitals[3], 1.5)
+            vitals[2] += rng.gauss(-vitals[3] / 2, 1.0)
+            vitals[0] = min(max(vitals[0], 30), 200)
+            vitals[1] = min(max(vitals[1], 50), 220)
+            vitals[2] = min(max(vitals[2], 30), vitals[1] - 10)
+            yield f"{bed_id},{vitals[0]:.0f},{vitals[1]:.0f},{vitals[2]:.0f}\n"
+        tick += 1
+        if rate > 0:
+            delay = start + tick / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
@@ -0,0 +1,190 @@
+"""
+Versioned threshold table for parameter classification
+
+Every cut-off lives in one table (DEFAULT_THRESHOLDS, or a JSON file with
+the same layout). Each parameter is an ordered list of bands; a band ends
+'below' a value (exclusive) or at a 'max' (inclusive), and the last band is
+open-ended. The table is compiled once into sorted breakpoint lists so a
+lookup is a binary search: bisect for scalars, numpy.searchsorted for arrays.
+
+The active table is DEFAULT_THRESHOLDS unless HEMODYNAMIC_THRESHOLDS names a
+JSON file; set_thresholds() swaps it at runtime.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+from bisect import bisect_right
+
+
+DEFAULT_THRESHOLDS = {
+    'version': '1.0',
+    'parameters': {
+        'heart_rate': {
+            'label': 'Heart Rate', 'unit': 'BPM',
+            'bands': [{'status': 'LOW', 'below': 60}, {'status': 'NORMAL', 'max': 100}, {'status': 'HIGH'}],
+        },
+        'systolic_bp': {
+            'label': 'Systolic BP', 'unit': 'mmHg',
+            'bands': [{'status': 'LOW', 'below': 90}, {'status': 'NORMAL', 'max': 140}, {'status': 'HIGH'}],
+        },
+        'diastolic_bp': {
+            'label': 'Diastolic BP', 'unit': 'mmHg',
+            'bands': [{'status': 'LOW', 'below': 60}, {'status': 'NORMAL', 'max': 90}, {'status': 'HIGH'}],
+        },
+        'map': {
+            'label': 'MAP', 'unit': 'mmHg',
+            'bands': [{'status': 'LOW', 'below': 70}, {'status': 'NORMAL', 'max': 100}, {'status': 'HIGH'}],
+        },
+        'shock_index': {
+            'label': 'Shock Index', 'unit': '',
+            'bands': [{'status': 'LOW', 'below': 0.5}, {'status': 'NORMAL', 'max': 0.7},
+                      {'status': 'ELEVATED', 'max': 1.0}, {'status': 'CRITICAL'}],
+        },
+        # Reference ranges only; not used by classify_parameters
+        'pulse_pressure': {
+            'label': 'Pulse Pressure', 'unit': 'mmHg',
+            'bands': [{'status': 'LOW', 'below': 30}, {'status': 'NORMAL', 'max': 50}, {'status': 'HIGH'}],
+        },
+        'rpp': {
+            'label': 'RPP', 'unit': '',
+            'bands': [{'status': 'NORMAL', 'below': 10000}, {'status': 'HIGH'}],
+        },
+    },
+}
+
+# Parameters classify_parameters needs from any loaded table
+REQUIRED_PARAMETERS = ('heart_rate', 'systolic_bp', 'diastolic_bp', 'map', 'shock_index')
+
+def _format_number(value):
+    return f"{value:,g}"
+
+class ThresholdTable:
+    """
+    A compiled threshold table
+    For each parameter, edges[i] is the smallest value that falls past band i,
+    so the band of x is bisect_right(edges, x). An inclusive 'max' edge is
+    stored as the next float above it. Values that compare false with every
+    edge (NaN) land in the last band.
+    Tables compare equal, and hash alike, when their specs have the same
+    contents, so a table can key a cache whatever its version says.
+    """
+
+    def __init__(self, spec):
+        from .core import STATUS_INDEX
+
+        if not isinstance(spec, dict) or 'version' not in spec or not isinstance(spec.get('parameters'), dict):
+            raise ValueError("threshold table needs 'version' and 'parameters'")
+        self.spec = spec
+        self.version = str(spec['version'])
+        self.digest = hashlib.sha256(json.dumps(spec, sort_keys=True, default=repr).encode()).hexdigest()
+        self._edges = {}
+        self._statuses = {}
+        for name, parameter in spec['parameters'].items():
+            bands = parameter.get('bands') if isinstance(parameter, dict) else None
+            if not bands or not all(isinstance(band, dict) and 'status' in band for band in bands):
+                raise ValueError(f"{name}: expected a list of bands with a 'status' each")
+            edges = []
+            for band in bands[:-1]:
+                if 'below' in band:
+                    edges.append(float(band['below']))
+                elif 'max' in band:
+                    edges.append(math.nextafter(float(band['max']), math.inf))
+                else:
+                    raise ValueError(f"{name}: only the last band may be open-ended")
+            if 'below' in bands[-1] or 'max' in bands[-1]:
+                raise ValueError(f"{name}: the last band must be open-ended")
+            if any(b <= a for a, b in zip(edges, edges[1:])):
+                raise ValueError(f"{name}: band limits must be increasing")
+            statuses = tuple(band['status'] for band in bands)
+            unknown = [s for s in statuses if s not in STATUS_INDEX]
+            if unknown:
+                raise ValueError(f"{name}: unknown status {', '.join(unknown)}")
+            self._edges[name] = edges
+            self._statuses[name] = statuses
+        missing = [name for name in REQUIRED_PARAMETERS if name not in self._edges]
+        if missing:
+            raise ValueError(f"threshold table is missing {', '.join(missing)}")
+
+        self.ranges = {name: self._normal_range(name) for name in self._edges}
+
+    def __eq__(self, other):
+        return isinstance(other, ThresholdTable) and self.digest == other.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def classify(self, name, value):
+        """Status of one value"""
+        return self._statuses[name][bisect_right(self._edges[name], value)]
+
+    def classify_array(self, name, values):
+        """Statuses of an array of values, as a NumPy string array"""
+        import numpy as np
+
+        index = np.searchsorted(np.asarray(self._edges[name]), np.asarray(values), side='right')
+        return np.asarray(self._statuses[name])[index]
+
+    def bounds(self, name, status='NORMAL'):
+        """(lower, upper) limits of a band as written in the table; None when open"""
+        bands = self.spec['parameters'][name]['bands']
+        for i, band in enumerate(bands):
+            if band['status'] == status:
+                lower = bands[i - 1].get('below', bands[i - 1].get('max')) if i else None
+                return lower, band.get('below', band.get('max'))
+        raise KeyError(f"{name} has no {status} band")
+
+    def _normal_range(self, name):
+        lower, upper = self.bounds(name)
+        if lower is None:
+            return f"<{_format_number(upper)}"
+        if upper is None:
+            return f">{_format_number(lower)}"
+        return f"{_format_number(lower)}-{_format_number(upper)}"
+
+    def unit(self, name):
+        return self.spec['parameters'][name].get('unit', '')
+
+    def label(self, name):
+        return self.spec['parameters'][name].get('label', name)
+
+    def normal_range(self, name, with_unit=False):
+        """Normal range as text, e.g. '60-100' or '60-100 BPM'"""
+        unit = self.unit(name)
+        return f"{self.ranges[name]} {unit}" if with_unit and unit else self.ranges[name]
+
+def load_thresholds(path):
+    """Compile a threshold table from a JSON file"""
+    with open(path, encoding='utf-8') as f:
+        return ThresholdTable(json.load(f))
+
+_thresholds = None
+_thresholds_lock = threading.Lock()
+
+def get_thresholds():
+    """The active threshold table, compiled on first use"""
+    global _thresholds
+    if _thresholds is None:
+        with _thresholds_lock:
+            if _thresholds is None:
+                path = os.environ.get('HEMODYNAMIC_THRESHOLDS')
+                _thresholds = load_thresholds(path) if path else ThresholdTable(DEFAULT_THRESHOLDS)
+    return _thresholds
+
+def set_thresholds(table):
+    """
+    Make table (a ThresholdTable, a spec dict or a JSON path) the active table
+    Cached exports were rendered with the old ranges, so the export cache is cleared.
+    """
+    from .cache import get_export_cache
+
+    global _thresholds
+    if isinstance(table, dict):
+        table = ThresholdTable(table)
+    elif not isinstance(table, ThresholdTable):
+        table = load_thresholds(table)
+    with _thresholds_lock:
+        _thresholds = table
+    get_export_cache().clear()
+    return table
@@ -0,0 +1,130 @@
+"""
+Downsampled trend charts for large histories
+
+A series of any length is reduced on the server with Largest-Triangle-Three-
+Buckets (LTTB), which keeps the visual shape (peaks and dips) of the line,
+and drawn with WebGL (Scattergl). Only the points inside the requested time
+window are downsampled, so zooming in recomputes the detail for that range
+while the browser never receives more than TREND_POINTS points per series.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from .profiling import timed
+from .thresholds import get_thresholds
+
+
+# Points sent to the browser per series, whatever the history size
+TREND_POINTS = 1500
+# Series drawn by create_trend_chart: (column, threshold-table parameter, axis title)
+TREND_SERIES = [
+    ('heart_rate', 'heart_rate', 'HR (BPM)'),
+    ('map', 'map', 'MAP (mmHg)'),
+    ('shock_index', 'shock_index', 'SI'),
+]
+TREND_COLORS = ['#FF4B4B', '#667eea', '#764ba2']
+
+def lttb(x, y, points):
+    """
+    Indices of the points of (x, y) kept by Largest-Triangle-Three-Buckets
+    The first and last points are always kept; the points between are split
+    into points - 2 buckets and from each the point forming the largest
+    triangle with the previously kept point and the next bucket's mean wins.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+
+    indices = np.empty(points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    kept = 0
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 1 < points - 2:
+            next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((x[kept] - next_x) * (y[start:stop] - y[kept])
+                      - (x[kept] - x[start:stop]) * (next_y - y[kept]))
+        kept = start + int(area.argmax())
+        indices[bucket + 1] = kept
+    return indices
+
+@timed
+def downsample_trends(series, window=None, points=TREND_POINTS):
+    """
+    LTTB-downsample every TREND_SERIES column of series inside window
+    series is a dict of equal-length arrays with a sorted 'timestamp'
+    (HistoryStore.series output); window is an optional (start, end) pair of
+    datetimes. Returns ({column: (timestamps, values)}, readings in window).
+    """
+    timestamps = series['timestamp']
+    lower, upper = 0, len(timestamps)
+    if window is not None:
+        start, end = (np.datetime64(bound, 'ns') for bound in window)
+        lower = int(np.searchsorted(timestamps, start, side='left'))
+        upper = int(np.searchsorted(timestamps, end, side='right'))
+
+    stamps = timestamps[lower:upper]
+    x = stamps.astype('datetime64[ns]').astype(np.int64)
+    traces = {}
+    for column, _, _ in TREND_SERIES:
+        values = series[column][lower:upper]
+        keep = lttb(x, values, points)
+        traces[column] = (stamps[keep], values[keep])
+    return traces, upper - lower
+
+@lru_cache(maxsize=4)
+def _trend_chart_template(thresholds):
+    """
+    Figure dict of the trend chart with empty traces, built once per threshold table
+    make_subplots and the validated layout are most of the cost of a figure.
+    Keyed on the table itself, which compares by contents.
+    """
+    from plotly.subplots import make_subplots
+    import plotly.graph_objects as go
+
+    fig = make_subplots(rows=len(TREND_SERIES), cols=1, shared_xaxes=True, vertical_spacing=0.04)
+    for row, ((column, parameter, title), color) in enumerate(zip(TREND_SERIES, TREND_COLORS), start=1):
+        fig.add_trace(go.Scattergl(x=[], y=[], mode='lines', name=title,
+                                   line=dict(color=color, width=1.5)), row=row, col=1)
+        lower, upper = thresholds.bounds(parameter)
+        if lower is not None and upper is not None:
+            fig.add_hrect(y0=lower, y1=upper, fillcolor='#28a745', opacity=0.08, line_width=0, row=row, col=1)
+        fig.update_yaxes(title_text=title, row=row, col=1)
+
+    fig.update_layout(
+        template='plotly_white',
+        height=600,
+        showlegend=False,
+        margin=dict(l=60, r=20, t=30, b=40),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)'
+    )
+    return fig.to_dict()
+
+@timed
+def create_trend_chart(traces):
+    """
+    WebGL line charts of HR, MAP and SI over time, one row each with a shared
+    time axis; the normal band of each parameter is shaded
+    traces is the first item returned by downsample_trends.
+    """
+    import plotly.graph_objects as go
+
+    template = _trend_chart_template(get_thresholds())
+    data = []
+    for trace, (column, _, _) in zip(template['data'], TREND_SERIES):
+        stamps, values = traces[column]
+        data.append(dict(trace, x=stamps, y=values))
+    # Only the point arrays are new; the template was validated when it was built
+    return go.Figure({'data': data, 'layout': template['layout']}, _validate=False)
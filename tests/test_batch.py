@@ -0,0 +1,103 @@
+import io
+import math
+import random
+
+import numpy as np
+import pytest
+
+from hemodynamic_analyzer import calculate_all_parameters, classify_parameters
+from hemodynamic_analyzer.batch import _round2, analyze_vitals_batch, process_csv_in_chunks
+
+
+nan = float('nan')
+
+# Values exactly halfway between two 2-decimal results as written, where
+# float representation decides the direction (2.675 -> 2.67, 1.005 -> 1.0)
+TIE_VALUES = [0.005, 0.015, 0.125, 0.285, 1.005, 1.115, 2.675, 8.345, 93.335, 99.995, 100.005, 133.325, 299.995]
+
+READINGS = [
+    (72, 120, 80),
+    (72, 120.0, 80),
+    (59, 89, 59),
+    (60, 90, 60),
+    (100, 140, 90),
+    (101, 141, 91),
+    (130, 85, 50),
+    (120, 0, 0),
+    (0, 0, 0),
+    (80, 100.015, 70.005),
+    (80.005, 124.615, 60.015),
+    (71, 106.5, 84.5),
+    (nan, 120, 80),
+    (72, nan, 80),
+    (72, 120, nan),
+    (nan, nan, nan),
+]
+
+NUMERIC_COLUMNS = ('map', 'shock_index', 'pulse_pressure', 'rpp')
+STATUS_COLUMNS = ('hr_status', 'bp_status', 'map_status', 'si_status', 'overall', 'priority')
+
+def same(a, b):
+    return a == b or (isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b))
+
+def scalar_rows(readings):
+    rows = []
+    for heart_rate, systolic_bp, diastolic_bp in readings:
+        calculated = calculate_all_parameters(heart_rate, systolic_bp, diastolic_bp)
+        rows.append({**calculated, **classify_parameters(heart_rate, systolic_bp, diastolic_bp, calculated)})
+    return rows
+
+@pytest.mark.parametrize('value', TIE_VALUES + [-v for v in TIE_VALUES] + [nan, 0.0])
+def test_round2_matches_round_on_ties(value):
+    assert same(float(_round2([value])[0]), round(value, 2))
+
+def test_round2_matches_round_on_a_grid_of_ties():
+    values = [k / 1000 for k in range(5, 300_000, 10)]
+    assert _round2(values).tolist() == [round(v, 2) for v in values]
+
+def test_round2_matches_round_on_random_ratios():
+    rng = random.Random(7)
+    values = [rng.randint(20, 250) / rng.randint(40, 250) for _ in range(20_000)]
+    values += [rng.randint(40, 250) + rng.randint(-300, 300) / 3 for _ in range(20_000)]
+    assert _round2(values).tolist() == [round(v, 2) for v in values]
+
+def test_batch_matches_scalar_path():
+    heart_rate, systolic_bp, diastolic_bp = (np.array(column, dtype=float) for column in zip(*READINGS))
+    batch = analyze_vitals_batch(heart_rate, systolic_bp, diastolic_bp)
+    for i, (reading, expected) in enumerate(zip(READINGS, scalar_rows(READINGS))):
+        for column in NUMERIC_COLUMNS:
+            assert same(float(batch[column][i]), float(expected[column])), (reading, column)
+        for column in STATUS_COLUMNS:
+            assert batch[column][i] == expected[column], (reading, column)
+
+def test_nan_rows_land_in_the_last_band():
+    # A NaN heart rate makes the shock index NaN too, and both fall past every edge
+    batch = analyze_vitals_batch(np.array([nan]), np.array([120.0]), np.array([80.0]))
+    assert batch['hr_status'][0] == 'HIGH'
+    assert batch['si_status'][0] == 'CRITICAL'
+    assert batch['overall'][0] == 'CRITICAL'
+
+BULK_CSV = """patient_name,heart_rate,systolic_bp,diastolic_bp,age
+good,72,120,80,40
+no age,72,120,80,
+missing hr,,120,80,40
+inf,inf,120,80,40
+minus inf,72,-inf,80,40
+huge,72,1e400,80,40
+negative hr,-5,120,80,40
+huge sbp,72,70000,80,40
+text,abc,120,80,40
+old,72,120,80,40000
+negative age,72,120,80,-1
+limits,300,300,200,120
+"""
+
+def test_bulk_rows_outside_the_form_limits_are_skipped():
+    progress = []
+    chunks = list(process_csv_in_chunks(io.BytesIO(BULK_CSV.encode()), 1,
+                                        progress_callback=lambda *args: progress.append(args)))
+    scored = chunks[0]
+    assert scored['patient_name'].tolist() == ['good', 'no age', 'limits']
+    assert scored['patient_number'].tolist() == [1, 2, 3]
+    assert scored['age'].tolist()[0] == 40 and scored['age'].isna().tolist() == [False, True, False]
+    assert progress[-1] == (1.0, 3, 9)
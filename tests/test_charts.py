@@ -0,0 +1,61 @@
+import copy
+
+import pytest
+
+from hemodynamic_analyzer import calculate_all_parameters, classify_statuses
+from hemodynamic_analyzer.charts import create_chart_image, create_vitals_chart
+from hemodynamic_analyzer.service import score_reading
+from hemodynamic_analyzer.thresholds import DEFAULT_THRESHOLDS, ThresholdTable, get_thresholds, set_thresholds
+
+
+@pytest.fixture
+def restore_thresholds():
+    table = get_thresholds()
+    yield
+    set_thresholds(table)
+
+def same_version_table(heart_rate_low, heart_rate_high):
+    """DEFAULT_THRESHOLDS with another normal heart-rate band but the same version"""
+    spec = copy.deepcopy(DEFAULT_THRESHOLDS)
+    spec['parameters']['heart_rate']['bands'][0]['below'] = heart_rate_low
+    spec['parameters']['heart_rate']['bands'][1]['max'] = heart_rate_high
+    return spec
+
+def patient(heart_rate=72, systolic_bp=120, diastolic_bp=80):
+    calculated = calculate_all_parameters(heart_rate, systolic_bp, diastolic_bp)
+    record = {'patient_name': 'Test', 'patient_id': 'P-0001',
+              'heart_rate': heart_rate, 'systolic_bp': systolic_bp, 'diastolic_bp': diastolic_bp, **calculated}
+    record.update(classify_statuses(heart_rate, systolic_bp, diastolic_bp, calculated))
+    return record
+
+def normal_lines(fig):
+    return sorted(shape.y0 for shape in fig.layout.shapes)
+
+def test_tables_compare_by_contents():
+    assert ThresholdTable(DEFAULT_THRESHOLDS) == ThresholdTable(copy.deepcopy(DEFAULT_THRESHOLDS))
+    assert ThresholdTable(DEFAULT_THRESHOLDS) != ThresholdTable(same_version_table(50, 110))
+
+def test_same_version_table_is_not_served_stale(restore_thresholds):
+    set_thresholds(DEFAULT_THRESHOLDS)
+    assert normal_lines(create_vitals_chart(patient())) == [60, 100]
+    assert score_reading(105, 120, 80)['hr_status'] == 'HIGH'
+    set_thresholds(same_version_table(50, 110))
+    assert normal_lines(create_vitals_chart(patient())) == [50, 110]
+    assert score_reading(105, 120, 80)['hr_status'] == 'NORMAL'
+
+def test_each_call_returns_its_own_figure():
+    first = create_vitals_chart(patient())
+    first.update_layout(title_text='changed')
+    first.data[0].y = (0, 0, 0, 0)
+    second = create_vitals_chart(patient())
+    assert second is not first
+    assert second.layout.title.text == 'Patient Vitals Visualization'
+    assert second.data[0].y == (72, 120, 80, patient()['map'])
+
+def test_chart_image_uses_the_active_table(restore_thresholds):
+    set_thresholds(DEFAULT_THRESHOLDS)
+    before = create_chart_image(patient(), 'png', dpi=50).getvalue()
+    set_thresholds(same_version_table(50, 110))
+    after = create_chart_image(patient(), 'png', dpi=50).getvalue()
+    assert before.startswith(b'\x89PNG') and after.startswith(b'\x89PNG')
+    assert before != after
@@ -0,0 +1,71 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from hemodynamic_analyzer import cohort
+from hemodynamic_analyzer.cohort import COHORT_TASK_SIZE, build_cohort_pdf, save_cohort_pdf
+
+
+def tiny_png():
+    buffer = BytesIO()
+    Image.new('RGB', (4, 2), 'white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def drawn(monkeypatch):
+    """Records whose chart was drawn; charts are a tiny PNG so the tests stay fast"""
+    drawn = []
+
+    def page_chart_png(record, dpi=cohort.COHORT_CHART_DPI):
+        drawn.append(record['patient_id'])
+        return tiny_png()
+
+    monkeypatch.setattr(cohort, 'page_chart_png', page_chart_png)
+    return drawn
+
+def record(number, heart_rate=72):
+    systolic_bp, diastolic_bp = 120, 80
+    return {
+        'patient_id': f"P-{number:04d}", 'patient_name': f"Patient {number}", 'mrn': '', 'age': 50,
+        'timestamp': '2026-10-17 08:00:00', 'heart_rate': heart_rate, 'systolic_bp': systolic_bp,
+        'diastolic_bp': diastolic_bp, 'map': 93.33, 'shock_index': round(heart_rate / systolic_bp, 2),
+        'pulse_pressure': 40, 'rpp': heart_rate * systolic_bp,
+        'hr_status': 'NORMAL', 'bp_status': 'NORMAL', 'map_status': 'NORMAL', 'si_status': 'NORMAL',
+        'overall': 'NORMAL', 'hr_message': '', 'bp_message': '', 'map_message': '', 'si_message': '',
+        'alert': '', 'color': '#28a745', 'priority': 3,
+    }
+
+def test_records_are_read_lazily(drawn):
+    pulled = []
+
+    def records():
+        for number in range(1, 3 * COHORT_TASK_SIZE + 1):
+            pulled.append(number)
+            yield record(number, heart_rate=60 + number)
+
+    seen = []
+    pdf = build_cohort_pdf(records(), workers=0, progress=lambda pages: seen.append((pages, len(pulled))))
+    assert pdf.startswith(b'%PDF')
+    # Progress comes after each task, and each task is read just before it is built
+    assert seen == [(n * COHORT_TASK_SIZE, n * COHORT_TASK_SIZE) for n in (1, 2, 3)]
+    assert len(drawn) == 3 * COHORT_TASK_SIZE
+
+def test_max_pages_stops_reading(drawn):
+    pulled = []
+
+    def records():
+        for number in range(1, 1000):
+            pulled.append(number)
+            yield record(number, heart_rate=60 + number % 100)
+
+    pages = []
+    build_cohort_pdf(records(), workers=0, max_pages=5, progress=pages.append)
+    assert pages == [5]
+    assert len(pulled) == 5
+
+def test_identical_charts_are_drawn_once(drawn, tmp_path):
+    records = [record(number) for number in range(1, 2 * COHORT_TASK_SIZE + 2)]
+    assert save_cohort_pdf(records, tmp_path / 'cohort.pdf', workers=0) == len(records)
+    assert drawn == ['P-0001']
+    assert (tmp_path / 'cohort.pdf').read_bytes().startswith(b'%PDF')
@@ -0,0 +1,108 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from hemodynamic_analyzer.batch import score_bulk_chunk
+from hemodynamic_analyzer.core import build_patient_record, calculate_all_parameters, classify_statuses
+from hemodynamic_analyzer import store as store_module
+from hemodynamic_analyzer.history import TEXT_COLUMNS, PatientHistory
+from hemodynamic_analyzer.profiling import start_recording, stop_recording
+from hemodynamic_analyzer.store import HistoryStore
+
+
+def make_record(i):
+    heart_rate, systolic_bp, diastolic_bp = 50 + i % 90, 90 + i % 70, 50 + i % 30
+    calculated = calculate_all_parameters(heart_rate, systolic_bp, diastolic_bp)
+    status = classify_statuses(heart_rate, systolic_bp, diastolic_bp, calculated)
+    return build_patient_record(f"PAT-{i + 1:04d}", f"Patient {i % 37}", f"2024-01-01 {i // 60 % 24:02d}:{i % 60:02d}:00",
+                                None if i % 11 == 0 else 40 + i % 50, heart_rate, systolic_bp, diastolic_bp,
+                                calculated, status)
+
+def rescanned_nbytes(history):
+    """nbytes computed the slow way, by scanning every text column"""
+    total = sum(array.nbytes for array in history._columns.values())
+    for name in TEXT_COLUMNS:
+        values = history._text[name]
+        total += sys.getsizeof(values) + sum(sys.getsizeof(v) for v in set(values))
+    return total
+
+def scored_chunk(start, rows):
+    chunk = pd.DataFrame({
+        'patient_name': [f"Bulk {i % 13}" for i in range(start, start + rows)],
+        'heart_rate': [60 + i % 50 for i in range(start, start + rows)],
+        'systolic_bp': [100 + i % 60 for i in range(start, start + rows)],
+        'diastolic_bp': [60 + i % 25 for i in range(start, start + rows)],
+    })
+    return score_bulk_chunk(chunk, start + 1)
+
+def test_nbytes_tracks_appends_and_extends():
+    history = PatientHistory()
+    for i in range(300):
+        history.append(make_record(i))
+        assert history.nbytes == rescanned_nbytes(history)
+    history.extend_frame(scored_chunk(300, 500))
+    assert history.nbytes == rescanned_nbytes(history)
+    history.clear()
+    assert history.nbytes == rescanned_nbytes(history)
+
+def test_nbytes_tracks_spills(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    try:
+        history = PatientHistory(store=store, session_id='s', budget_bytes=64 * 1024)
+        for i in range(2000):
+            history.append(make_record(i))
+            if i % 100 == 0:
+                history.extend_frame(scored_chunk(10000 + i, 50))
+            assert history.nbytes == rescanned_nbytes(history)
+        assert history.spilled > 0
+        assert history.nbytes <= 64 * 1024
+        assert len(history) == 2000 + 20 * 50
+    finally:
+        store.close()
+
+def test_to_frame_views_the_columns_and_sees_new_rows():
+    history = PatientHistory()
+    for i in range(100):
+        history.append(make_record(i))
+    frame = history.to_frame()
+    assert np.shares_memory(frame['heart_rate'].to_numpy(), history.column('heart_rate'))
+    assert frame['age'].isna().sum() == 10
+
+    history.append(make_record(100))
+    assert len(frame) == 100
+    latest = history.to_frame()
+    assert len(latest) == 101
+    assert latest.iloc[-1]['patient_id'] == 'PAT-0101'
+    pd.testing.assert_frame_equal(latest.iloc[:100], frame)
+
+def test_rejected_frame_is_not_stored(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    history = PatientHistory(store=store, session_id='s')
+    history.extend_frame(scored_chunk(0, 5))
+    bad = scored_chunk(5, 5)
+    bad.loc[bad.index[2], 'systolic_bp'] = 40000
+    with pytest.raises(ValueError, match='systolic_bp'):
+        history.check_frame(bad)
+    with pytest.raises(ValueError, match='systolic_bp'):
+        history.extend_frame(bad)
+    assert len(history) == 5
+    assert store.last_id() == 5
+
+
+def test_record_generators_time_their_fetches(monkeypatch):
+    monkeypatch.setattr(store_module, 'RECORD_FETCH_SIZE', 2)
+    store = HistoryStore(':memory:')
+    store.insert_records([make_record(i) for i in range(5)])
+    start_recording()
+    try:
+        for _ in store.records():
+            # Time spent by the consumer is not the store's
+            time.sleep(0.02)
+    finally:
+        timings = stop_recording()
+    calls, total, _ = timings.stages['HistoryStore.records']
+    assert calls == 3
+    assert total < 0.02
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+
+from hemodynamic_analyzer.service import HTTPError, ScoringService, handle_score, handle_score_batch, score_reading
+
+
+def request(service, method, path, body):
+    """(status, parsed JSON) of one request over a real connection"""
+    async def run():
+        await service.start()
+        try:
+            reader, writer = await asyncio.open_connection(service.host, service.port)
+            writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode() + body)
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            await service.stop()
+
+    head, _, payload = asyncio.run(run()).partition(b'\r\n\r\n')
+    return int(head.split(b' ')[1]), json.loads(payload)
+
+BAD_BODIES = [
+    b'{"heart_rate": NaN, "systolic_bp": 120, "diastolic_bp": 80}',
+    b'{"heart_rate": 72, "systolic_bp": Infinity, "diastolic_bp": 80}',
+    b'{"heart_rate": 72, "systolic_bp": 120, "diastolic_bp": -Infinity}',
+    b'{"heart_rate": 1e400, "systolic_bp": 120, "diastolic_bp": 80}',
+    b'{"heart_rate": 72, "systolic_bp": 1e12, "diastolic_bp": 80}',
+    b'{"heart_rate": 72, "systolic_bp": 120, "diastolic_bp": 201}',
+    b'{"heart_rate": -1, "systolic_bp": 120, "diastolic_bp": 80}',
+]
+
+@pytest.mark.parametrize('body', BAD_BODIES)
+def test_score_rejects_non_finite_and_implausible_values(body):
+    with pytest.raises(HTTPError) as error:
+        handle_score(body)
+    assert error.value.status == 400
+
+@pytest.mark.parametrize('body', BAD_BODIES)
+def test_score_batch_rejects_non_finite_and_implausible_values(body):
+    batch = b'{"readings": [{"heart_rate": 72, "systolic_bp": 120, "diastolic_bp": 80}, ' + body + b']}'
+    with pytest.raises(HTTPError) as error:
+        handle_score_batch(batch)
+    assert error.value.status == 400
+
+def test_nan_reading_is_a_400_with_valid_json():
+    status, payload = request(ScoringService(port=0), 'POST', '/score', BAD_BODIES[0])
+    assert status == 400
+    assert 'error' in payload
+
+def test_score_batch_matches_scalar_scoring():
+    readings = [(72, 120, 80), (59, 89, 59), (60, 90, 60), (100, 140, 90), (101, 141, 91), (0, 0, 0),
+                (300, 300, 200), (72.5, 120.0, 80), (72, 120.0, 80), (95.0, 100.005, 60.25), (130, 100, 70)]
+    body = json.dumps({'readings': [dict(zip(('heart_rate', 'systolic_bp', 'diastolic_bp'), reading))
+                                    for reading in readings]}).encode()
+    results = handle_score_batch(body)['results']
+    assert [json.dumps(result) for result in results] == [json.dumps(score_reading(*reading))
+                                                          for reading in readings]
+
+def test_score_batch_over_http():
+    body = json.dumps({'readings': [{'heart_rate': 130, 'systolic_bp': 100, 'diastolic_bp': 70}]}).encode()
+    status, payload = request(ScoringService(port=0), 'POST', '/score/batch', body)
+    assert status == 200
+    assert payload['results'][0]['overall'] == 'CRITICAL'
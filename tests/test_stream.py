@@ -0,0 +1,57 @@
+import math
+
+import pytest
+
+from hemodynamic_analyzer.stream import BedWindow, StreamMonitor, run_lines
+
+
+def window_state(bed):
+    return bed.count, list(bed._vitals_sum), bed._shock_index_sum, bed._vitals.tolist()
+
+@pytest.mark.parametrize('line', [
+    'b1,inf,120,80',
+    'b1,80,-inf,80',
+    'b1,nan,120,80',
+    'b1,80,120,nan',
+    'b1,1e12,120,80',
+    'b1,80,1e400,80',
+    'b1,301,120,80',
+    'b1,80,120,-1',
+])
+def test_ingest_line_rejects_non_finite_and_out_of_range(line):
+    monitor = StreamMonitor(window=4)
+    monitor.ingest_line('b1,80,120,80')
+    before = window_state(monitor.beds['b1'])
+    with pytest.raises(ValueError):
+        monitor.ingest_line(line)
+    assert window_state(monitor.beds['b1']) == before
+    assert monitor.samples == 1
+
+def test_rejected_first_sample_creates_no_bed():
+    monitor = StreamMonitor()
+    with pytest.raises(ValueError):
+        monitor.ingest_line('b9,nan,120,80')
+    assert 'b9' not in monitor.beds
+    assert monitor.summary() == []
+
+def test_push_overflow_leaves_window_unchanged():
+    bed = BedWindow(size=2)
+    for sample in [(80, 120, 80), (90, 110, 70), (100, 100, 60)]:
+        bed.push(*sample)
+    before = window_state(bed)
+    with pytest.raises(OverflowError):
+        bed.push(10 ** 12, 120, 80)
+    assert window_state(bed) == before
+    assert bed.means()[:3] == (95.0, 105.0, 65.0)
+
+def test_run_lines_skips_bad_samples_and_keeps_going(capsys):
+    monitor = StreamMonitor(window=3)
+    updates = []
+    run_lines(monitor, ['b1,80,120,80\n', 'b1,inf,120,80\n', 'b1,1e12,120,80\n', 'b1,nan,1,1\n',
+                        'garbage\n', 'b1,100,100,60\n'], updates.append)
+    assert [u['samples'] for u in updates] == [1, 2]
+    assert monitor.samples == 2
+    assert capsys.readouterr().err.count('skipping malformed sample') == 4
+    heart_rate, systolic_bp, diastolic_bp, shock_index = monitor.beds['b1'].means()
+    assert (heart_rate, systolic_bp, diastolic_bp) == (90.0, 110.0, 70.0)
+    assert math.isclose(shock_index, (80 / 120 + 1.0) / 2)
@@ -0,0 +1,65 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from hemodynamic_analyzer.thresholds import DEFAULT_THRESHOLDS, ThresholdTable
+
+
+TABLE = ThresholdTable(DEFAULT_THRESHOLDS)
+PARAMETERS = list(DEFAULT_THRESHOLDS['parameters'])
+
+def edge_cases(name):
+    """(value, expected status) on and either side of every band edge of a parameter"""
+    bands = DEFAULT_THRESHOLDS['parameters'][name]['bands']
+    cases = []
+    for band, next_band in zip(bands, bands[1:]):
+        if 'below' in band:
+            # 'below' is exclusive: the edge itself belongs to the next band
+            edge = band['below']
+            cases += [(edge, next_band['status']), (math.nextafter(edge, -math.inf), band['status'])]
+        else:
+            # 'max' is inclusive: the edge itself belongs to this band
+            edge = band['max']
+            cases += [(edge, band['status']), (math.nextafter(edge, math.inf), next_band['status'])]
+        if float(edge).is_integer():
+            # Integer vitals must land where the same float does
+            cases.append((int(edge), cases[-2][1]))
+    return cases
+
+@pytest.mark.parametrize('name', PARAMETERS)
+def test_classify_on_band_edges(name):
+    for value, status in edge_cases(name):
+        assert TABLE.classify(name, value) == status, (name, value)
+
+@pytest.mark.parametrize('name', PARAMETERS)
+def test_classify_array_on_band_edges(name):
+    values, statuses = zip(*edge_cases(name))
+    assert TABLE.classify_array(name, np.array(values, dtype=float)).tolist() == list(statuses)
+
+@pytest.mark.parametrize('name', PARAMETERS)
+def test_nan_lands_in_the_last_band(name):
+    last = DEFAULT_THRESHOLDS['parameters'][name]['bands'][-1]['status']
+    assert TABLE.classify(name, float('nan')) == last
+    assert TABLE.classify_array(name, np.array([float('nan'), 0.0]))[0] == last
+
+@pytest.mark.parametrize('name', PARAMETERS)
+def test_scalar_and_array_agree(name):
+    rng = random.Random(name)
+    values = [rng.uniform(-10, 20_000) if name == 'rpp' else rng.uniform(-1, 250) for _ in range(2_000)]
+    values += [round(v, 2) for v in values] + [value for value, _ in edge_cases(name)] + [float('nan'), -math.inf, math.inf]
+    assert TABLE.classify_array(name, np.array(values)).tolist() == [TABLE.classify(name, v) for v in values]
+    ints = [int(v) for v in values if math.isfinite(v)]
+    assert TABLE.classify_array(name, np.array(ints)).tolist() == [TABLE.classify(name, v) for v in ints]
+
+@pytest.mark.parametrize('bands, message', [
+    ([{'status': 'LOW', 'below': 60}, {'status': 'NORMAL', 'max': 100}], 'open-ended'),
+    ([{'status': 'LOW'}, {'status': 'HIGH'}], 'only the last band'),
+    ([{'status': 'LOW', 'below': 60}, {'status': 'NORMAL', 'max': 50}, {'status': 'HIGH'}], 'increasing'),
+    ([{'status': 'LOW', 'below': 60}, {'status': 'BAD'}], 'unknown status'),
+])
+def test_invalid_bands_are_rejected(bands, message):
+    spec = {**DEFAULT_THRESHOLDS, 'parameters': {**DEFAULT_THRESHOLDS['parameters'], 'heart_rate': {'bands': bands}}}
+    with pytest.raises(ValueError, match=message):
+        ThresholdTable(spec)